@@ -0,0 +1,255 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from records import TransactionRecord
+
+# Period codes accepted by the group-by helpers (numpy datetime64 units)
+PERIODS = {"D", "W", "M", "Y"}
+
+
+def to_epoch_seconds(value: Optional[datetime]) -> int:
+    """Convert a datetime to epoch seconds, treating naive values as UTC."""
+    if value is None:
+        return 0
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+class Codebook:
+    """Maps string values (category, account or payee IDs) to dense integer codes."""
+
+    def __init__(self):
+        self.values: List[Optional[str]] = []
+        self.codes: Dict[Optional[str], int] = {}
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def encode(self, value: Optional[str]) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+
+class TransactionColumns:
+    """Columnar, in-memory store of a budget's transactions.
+
+    Dates are kept as datetime64[s], amounts as int64 cents and category,
+    account and payee as integer codes into a Codebook, so reports become
+    vectorized group-bys instead of Python loops over documents. Rows can be
+    upserted and removed incrementally.
+    """
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.dates = np.empty(0, dtype="datetime64[s]")
+        self.amounts = np.empty(0, dtype=np.int64)
+        self.category_codes = np.empty(0, dtype=np.int32)
+        self.account_codes = np.empty(0, dtype=np.int32)
+        self.payee_codes = np.empty(0, dtype=np.int32)
+        self.categories = Codebook()
+        self.accounts = Codebook()
+        self.payees = Codebook()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def upsert(self, records: Iterable[TransactionRecord]) -> int:
+        """Insert new records and overwrite existing rows with the same ID.
+
+        Returns:
+            int: Number of rows inserted or updated
+        """
+        new_records = []
+        updated = 0
+        for record in records:
+            row = self.rows.get(record.id)
+            if row is None:
+                self.rows[record.id] = len(self.ids) + len(new_records)
+                new_records.append(record)
+            elif row >= len(self.ids):
+                # Repeated ID within the same batch, keep the latest version
+                new_records[row - len(self.ids)] = record
+            else:
+                self._write_row(row, record)
+                updated += 1
+
+        if new_records:
+            count = len(new_records)
+            self.ids.extend(r.id for r in new_records)
+            self.dates = np.concatenate([self.dates, np.fromiter(
+                (to_epoch_seconds(r.date) for r in new_records), dtype=np.int64, count=count
+            ).astype("datetime64[s]")])
+            self.amounts = np.concatenate([self.amounts, np.fromiter(
+                (r.amount for r in new_records), dtype=np.int64, count=count
+            )])
+            self.category_codes = np.concatenate([
+                self.category_codes, self._encode(self.categories, (r.category_id for r in new_records), count)
+            ])
+            self.account_codes = np.concatenate([
+                self.account_codes, self._encode(self.accounts, (r.account_id for r in new_records), count)
+            ])
+            self.payee_codes = np.concatenate([
+                self.payee_codes, self._encode(self.payees, (r.payee for r in new_records), count)
+            ])
+
+        return updated + len(new_records)
+
+    def remove(self, ids: Iterable[str]) -> int:
+        """Drop rows by transaction ID.
+
+        Returns:
+            int: Number of rows removed
+        """
+        drop = [self.rows[i] for i in ids if i in self.rows]
+        if not drop:
+            return 0
+        keep = np.ones(len(self.ids), dtype=bool)
+        keep[drop] = False
+        self.ids = [i for i, k in zip(self.ids, keep) if k]
+        self.rows = {i: row for row, i in enumerate(self.ids)}
+        self.dates = self.dates[keep]
+        self.amounts = self.amounts[keep]
+        self.category_codes = self.category_codes[keep]
+        self.account_codes = self.account_codes[keep]
+        self.payee_codes = self.payee_codes[keep]
+        return len(drop)
+
+    def mask(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> np.ndarray:
+        """Boolean row mask for start <= date < end."""
+        selected = np.ones(len(self.ids), dtype=bool)
+        if start is not None:
+            selected &= self.dates >= np.datetime64(to_epoch_seconds(start), "s")
+        if end is not None:
+            selected &= self.dates < np.datetime64(to_epoch_seconds(end), "s")
+        return selected
+
+    def group_by_period(
+        self, period: str = "M", start: Optional[datetime] = None, end: Optional[datetime] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Assign every selected row to a period.
+
+        Returns:
+            Tuple of (period keys, inverse index per selected row, row mask)
+        """
+        if period not in PERIODS:
+            raise ValueError(f"Invalid period: {period}. Must be one of {sorted(PERIODS)}")
+        selected = self.mask(start, end)
+        periods = self.dates[selected].astype(f"datetime64[{period}]")
+        keys, inverse = np.unique(periods, return_inverse=True)
+        return keys, inverse, selected
+
+    def income_expense_by_period(
+        self, period: str = "M", start: Optional[datetime] = None, end: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """Income, expenses and net in cents for each period."""
+        keys, inverse, selected = self.group_by_period(period, start, end)
+        amounts = self.amounts[selected]
+        income = np.zeros(len(keys), dtype=np.int64)
+        expenses = np.zeros(len(keys), dtype=np.int64)
+        np.add.at(income, inverse, np.where(amounts > 0, amounts, 0))
+        np.add.at(expenses, inverse, np.where(amounts < 0, -amounts, 0))
+        return [
+            {
+                "period": str(key),
+                "income": int(income[i]),
+                "expenses": int(expenses[i]),
+                "net": int(income[i] - expenses[i]),
+            }
+            for i, key in enumerate(keys)
+        ]
+
+    def category_matrix(
+        self, period: str = "M", start: Optional[datetime] = None, end: Optional[datetime] = None
+    ) -> Tuple[List[str], List[Optional[str]], np.ndarray]:
+        """Per-period, per-category totals in cents.
+
+        Returns:
+            Tuple of (period labels, category IDs, int64 matrix of shape
+            [periods, categories])
+        """
+        keys, inverse, selected = self.group_by_period(period, start, end)
+        matrix = np.zeros((len(keys), len(self.categories)), dtype=np.int64)
+        np.add.at(matrix, (inverse, self.category_codes[selected]), self.amounts[selected])
+        return [str(key) for key in keys], list(self.categories.values), matrix
+
+    def spending_trend(
+        self,
+        period: str = "M",
+        category_id: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """Spending (absolute value of negative amounts) per period.
+
+        Args:
+            period: One of D, W, M, Y
+            category_id: Optionally restrict to one category
+        """
+        labels, categories, matrix = self.category_matrix(period, start, end)
+        spending = -np.minimum(matrix, 0)
+        if category_id is not None:
+            code = self.categories.codes.get(category_id)
+            series = spending[:, code] if code is not None else np.zeros(len(labels), dtype=np.int64)
+        else:
+            series = spending.sum(axis=1)
+        return [{"period": label, "spent": int(value)} for label, value in zip(labels, series)]
+
+    def category_deltas(self, month: str) -> List[Dict[str, Any]]:
+        """Month-over-month change of each category's total.
+
+        Args:
+            month: Month in YYYY-MM format, compared against the previous month
+        """
+        current = np.datetime64(month, "M")
+        months = self.dates.astype("datetime64[M]")
+        selected = (months == current) | (months == current - 1)
+        totals = np.zeros((2, len(self.categories)), dtype=np.int64)
+        np.add.at(
+            totals,
+            ((months[selected] == current).astype(np.int64), self.category_codes[selected]),
+            self.amounts[selected]
+        )
+
+        deltas = []
+        for code, category_id in enumerate(self.categories.values):
+            before, after = int(totals[0, code]), int(totals[1, code])
+            if before or after:
+                deltas.append({
+                    "category_id": category_id,
+                    "previous": before,
+                    "current": after,
+                    "delta": after - before,
+                })
+        deltas.sort(key=lambda d: abs(d["delta"]), reverse=True)
+        return deltas
+
+    def top_payees(
+        self, limit: int = 10, start: Optional[datetime] = None, end: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """Payees with the highest spending in the range."""
+        selected = self.mask(start, end) & (self.amounts < 0)
+        spent = np.zeros(len(self.payees), dtype=np.int64)
+        counts = np.bincount(self.payee_codes[selected], minlength=len(self.payees))
+        np.add.at(spent, self.payee_codes[selected], -self.amounts[selected])
+        order = np.argsort(spent)[::-1][:limit]
+        return [
+            {"payee": self.payees.values[code], "spent": int(spent[code]), "transactions": int(counts[code])}
+            for code in order if spent[code] > 0
+        ]
+
+    def _write_row(self, row: int, record: TransactionRecord) -> None:
+        self.dates[row] = np.datetime64(to_epoch_seconds(record.date), "s")
+        self.amounts[row] = record.amount
+        self.category_codes[row] = self.categories.encode(record.category_id)
+        self.account_codes[row] = self.accounts.encode(record.account_id)
+        self.payee_codes[row] = self.payees.encode(record.payee)
+
+    @staticmethod
+    def _encode(codebook: Codebook, values: Iterable[Optional[str]], count: int) -> np.ndarray:
+        return np.fromiter((codebook.encode(v) for v in values), dtype=np.int32, count=count)
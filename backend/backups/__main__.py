@@ -0,0 +1,73 @@
+"""Back up Firestore collections and restore them.
+
+Run from the backend directory:
+
+    python -m backups backup ~/budget-backups/2024-06-01
+    python -m backups backup ~/budget-backups/2024-06-02 --base ~/budget-backups/2024-06-01
+    python -m backups backup ~/budget-backups/budget-abc --budget abc --codec zstd
+    python -m backups restore ~/budget-backups/2024-06-01 ~/budget-backups/2024-06-02
+
+`--base` makes an incremental backup of the changes since the base
+backup. zstd shards need the zstandard package (`pip install -e .[backup]`).
+Restore takes a full backup followed by its incremental backups,
+in order. Set FIRESTORE_EMULATOR_HOST to run against the emulator.
+"""
+import argparse
+from datetime import datetime
+
+from backups.backup import BackupRunner, load_manifest
+from backups.restore import RestoreRunner
+from backups.shards import CODECS
+from firebase_app import get_firestore_client
+from logger import configure_logging
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m backups", description="Firestore backup and restore")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backup = commands.add_parser("backup", help="Write a backup directory")
+    backup.add_argument("output_dir", help="Directory to write the backup to")
+    backup.add_argument("--base", type=str, help="Previous backup; only changes since it are backed up")
+    backup.add_argument("--since", type=datetime.fromisoformat, help="Back up changes since this UTC time instead")
+    backup.add_argument("--budget", type=str, help="Only back up this budget")
+    backup.add_argument("--collection", action="append", help="Collection to back up; repeat for several (default: all)")
+    backup.add_argument("--codec", choices=list(CODECS), default="gzip", help="Shard compression")
+    backup.add_argument("--parallelism", type=int, default=8, help="Partitions read at the same time")
+    backup.add_argument("--page-size", type=int, default=1000, help="Documents read per query")
+
+    restore = commands.add_parser("restore", help="Restore a full backup and its incremental backups")
+    restore.add_argument("backup_dirs", nargs="+", help="Backup directories, the full backup first")
+    restore.add_argument("--collection", action="append", help="Collection to restore; repeat for several (default: all)")
+    restore.add_argument("--parallelism", type=int, default=8, help="Shards restored at the same time")
+    restore.add_argument("--initial-ops-per-second", type=int, default=500, help="Starting write rate")
+    restore.add_argument("--max-ops-per-second", type=int, default=5000, help="Write rate to ramp up to")
+    args = parser.parse_args()
+
+    configure_logging()
+    db = get_firestore_client()
+    if args.command == "backup":
+        since = args.since
+        budget_id = args.budget
+        if args.base:
+            if since:
+                parser.error("Pass either --base or --since")
+            base = load_manifest(args.base)
+            since = datetime.fromisoformat(base["watermark"])
+            budget_id = budget_id or base["budget_id"]
+            if budget_id != base["budget_id"]:
+                parser.error(f"{args.base} backs up another budget")
+        runner = BackupRunner(db, args.output_dir, codec=args.codec, parallelism=args.parallelism, page_size=args.page_size)
+        runner.run(collections=args.collection, since=since, budget_id=budget_id)
+    else:
+        runner = RestoreRunner(
+            db,
+            parallelism=args.parallelism,
+            initial_ops_per_second=args.initial_ops_per_second,
+            max_ops_per_second=args.max_ops_per_second,
+        )
+        runner.run(args.backup_dirs, collections=args.collection)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""Streaming backups of Firestore collections into compressed NDJSON shards.
+
+`BackupRunner` writes a backup directory: one or more shards per collection
+(see backups/shards.py) and a `manifest.json` written last, so a directory
+without a manifest is an incomplete backup.
+
+- A full backup splits each collection with
+  `CollectionGroup.get_partitions()`. Partitions are read concurrently by up
+  to `parallelism` workers, `page_size` documents at a time, and each
+  partition streams into its own shard, so memory stays constant whatever
+  the collection size.
+- An incremental backup, given `since`, holds the documents whose
+  `updated_at` is later (`deleted_at` for tombstones) and one deletion record
+  per tombstone written since. Documents without `updated_at` are only in
+  full backups. Pass the manifest's `watermark` as the next backup's
+  `since`; like delta sync, it trails the start of the backup by
+  WATERMARK_LAG, so a few documents appear in two consecutive backups.
+- A budget backup holds the budget, its child documents and its owner's
+  payees, and can be incremental too.
+
+Documents are read while the database keeps changing, so a backup is not a
+point-in-time snapshot of the whole database; writes made during the run
+may or may not be included. Incremental and budget backups query
+(`budget_id`/`user_id`, `updated_at`), which needs composite indexes on
+the backed up collections; frontend/firestore.indexes.json declares them
+for every collection of a budget backup.
+"""
+import json
+import os
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from firebase_admin import firestore
+from backups.shards import ShardWriter
+from logger import get_logger
+from services.base_service import TOMBSTONES_COLLECTION
+from services.budget_changes_service import WATERMARK_LAG
+from services.budget_deletion_service import BUDGET_CHILD_COLLECTIONS
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+DELETIONS = "deletions"
+
+FULL = "full"
+INCREMENTAL = "incremental"
+
+# Field compared with `since` in incremental backups
+CHANGED_AT_FIELDS = {TOMBSTONES_COLLECTION: "deleted_at"}
+DEFAULT_CHANGED_AT_FIELD = "updated_at"
+
+# Field scoping each collection of a budget backup. Payees belong to the
+# user, so a budget backup holds its owner's payees.
+BUDGET_SCOPED_FIELDS = {
+    **{collection: "budget_id" for collection in BUDGET_CHILD_COLLECTIONS},
+    "payees": "user_id",
+}
+
+
+def load_manifest(directory: str) -> Dict[str, Any]:
+    """Read the manifest of a backup directory.
+
+    Raises:
+        FileNotFoundError: If the directory holds no complete backup
+    """
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No {MANIFEST_FILE} in {directory}, the backup is missing or incomplete")
+    with open(path) as f:
+        return json.load(f)
+
+
+class BackupRunner:
+    """Exports collections into a backup directory."""
+
+    def __init__(
+        self,
+        db: firestore.Client,
+        output_dir: str,
+        codec: str = "gzip",
+        parallelism: int = 8,
+        partitions_per_worker: int = 4,
+        page_size: int = 1000,
+        progress_callback: Optional[Callable[[str, int], None]] = None
+    ):
+        """Initialize the runner.
+
+        Args:
+            db: Firestore client instance
+            output_dir: Directory the backup is written to, created if missing
+            codec: Shard compression, "gzip" or "zstd"
+            parallelism: Partitions or queries read at the same time
+            partitions_per_worker: Partitions requested per worker, so fast
+                workers pick up the work of slow ones
+            page_size: Documents read per query
+            progress_callback: Receives the collection and the documents
+                written by the run so far after each page
+        """
+        self.db = db
+        self.output_dir = output_dir
+        self.codec = codec
+        self.parallelism = parallelism
+        self.partitions_per_worker = partitions_per_worker
+        self.page_size = page_size
+        self.progress_callback = progress_callback
+        self.logger = get_logger(__name__)
+        self._written = 0
+        self._lock = threading.Lock()
+
+    def run(
+        self,
+        collections: Optional[List[str]] = None,
+        since: Optional[datetime] = None,
+        budget_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Back up collections, all of them or those changed since a watermark.
+
+        Args:
+            collections: Collections to back up, None for every top-level
+                collection (or every collection of the budget)
+            since: Watermark of the previous backup, as naive UTC, for an
+                incremental backup
+            budget_id: Only back up this budget
+
+        Returns:
+            Dict: The backup's manifest
+
+        Raises:
+            FileExistsError: If output_dir already holds a backup
+            ValueError: If the budget doesn't exist
+        """
+        if os.path.exists(os.path.join(self.output_dir, MANIFEST_FILE)):
+            raise FileExistsError(f"{self.output_dir} already holds a backup")
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        started_at = datetime.utcnow()
+        tasks = self._plan(collections, since, budget_id)
+        self.logger.info(
+            f"Backing up {len({collection for collection, _, _ in tasks})} collections "
+            f"to {self.output_dir} in {len(tasks)} shards"
+            + (f", changes since {since.isoformat()}" if since else "")
+        )
+
+        stop = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=self.parallelism, thread_name_prefix="backup")
+        try:
+            futures = [pool.submit(scan, collection, name, stop) for collection, name, scan in tasks]
+            wait(futures, return_when=FIRST_EXCEPTION)
+            shards = [future.result() for future in futures]
+        except BaseException:
+            stop.set()
+            pool.shutdown(wait=True, cancel_futures=True)
+            self.logger.error(f"Backup to {self.output_dir} failed, its shards are incomplete")
+            raise
+        pool.shutdown()
+
+        manifest: Dict[str, Any] = {
+            "format": FORMAT_VERSION,
+            "type": INCREMENTAL if since is not None else FULL,
+            "budget_id": budget_id,
+            "since": since.isoformat() if since is not None else None,
+            "watermark": (started_at - WATERMARK_LAG).isoformat(),
+            "started_at": started_at.isoformat(),
+            "completed_at": datetime.utcnow().isoformat(),
+            "codec": self.codec,
+            "collections": {},
+            "deletions": [],
+        }
+        for (collection, _, _), shard in zip(tasks, shards):
+            if shard is None:
+                continue
+            if collection == DELETIONS:
+                manifest["deletions"].append(shard)
+                continue
+            entry = manifest["collections"].setdefault(collection, {"documents": 0, "shards": []})
+            entry["documents"] += shard["documents"]
+            entry["shards"].append(shard)
+
+        # Written last: a manifest marks the backup as complete
+        path = os.path.join(self.output_dir, MANIFEST_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(path + ".tmp", path)
+        self.logger.info(
+            f"Backup to {self.output_dir} finished: {self._written} documents, "
+            f"{sum(shard['deletions'] for shard in manifest['deletions'])} deletions"
+        )
+        return manifest
+
+    def _plan(
+        self, collections: Optional[List[str]], since: Optional[datetime], budget_id: Optional[str]
+    ) -> List[Tuple[str, str, Callable[[str, str, threading.Event], Optional[Dict[str, Any]]]]]:
+        """The shards to write: (collection, shard name, function writing the shard)."""
+        tasks = []
+        if budget_id is not None:
+            budget = self.db.collection("budgets").document(budget_id).get()
+            if not budget.exists:
+                raise ValueError(f"Budget not found: {budget_id}")
+            scopes = {"budget_id": budget_id, "user_id": budget.to_dict()["user_id"]}
+            for collection in collections or ["budgets", *BUDGET_SCOPED_FIELDS]:
+                if collection == "budgets":
+                    tasks.append((collection, "budgets-0000", lambda c, n, s: self._write_document(c, n, budget, since)))
+                    continue
+                field = BUDGET_SCOPED_FIELDS.get(collection)
+                if field is None:
+                    raise ValueError(f"{collection} isn't part of a budget backup")
+                query = self.db.collection(collection).where(field, "==", scopes[field])
+                tasks.append((collection, f"{collection}-0000", self._query_scan(query, since)))
+            deletion_scopes = [f"budget:{budget_id}", f"user:{scopes['user_id']}"]
+        else:
+            for collection in collections or sorted(c.id for c in self.db.collections()):
+                if since is not None:
+                    tasks.append((collection, f"{collection}-0000", self._query_scan(self.db.collection(collection), since)))
+                    continue
+                requested = self.parallelism * self.partitions_per_worker
+                boundaries = [
+                    (partition.start_at, partition.end_at)
+                    for partition in self.db.collection_group(collection).get_partitions(requested)
+                ] or [(None, None)]
+                for index, (start, end) in enumerate(boundaries):
+                    tasks.append((collection, f"{collection}-{index:04d}", self._partition_scan(start, end)))
+            deletion_scopes = None
+
+        if since is not None:
+            tasks.append((DELETIONS, f"{DELETIONS}-0000", lambda c, n, s: self._write_deletions(n, since, deletion_scopes, s)))
+        return tasks
+
+    def _partition_scan(self, start: Any, end: Any):
+        def scan(collection: str, name: str, stop: threading.Event) -> Optional[Dict[str, Any]]:
+            query = self.db.collection_group(collection).order_by("__name__")
+            if start is not None:
+                query = query.start_at({"__name__": start})
+            if end is not None:
+                query = query.end_before({"__name__": end})
+            return self._write_pages(collection, name, query, stop)
+        return scan
+
+    def _query_scan(self, query: Any, since: Optional[datetime]):
+        def scan(collection: str, name: str, stop: threading.Event) -> Optional[Dict[str, Any]]:
+            if since is None:
+                paged = query.order_by("__name__")
+            else:
+                field = CHANGED_AT_FIELDS.get(collection, DEFAULT_CHANGED_AT_FIELD)
+                paged = query.where(field, ">", since).order_by(field).order_by("__name__")
+            return self._write_pages(collection, name, paged, stop)
+        return scan
+
+    def _write_pages(self, collection: str, name: str, query: Any, stop: threading.Event) -> Optional[Dict[str, Any]]:
+        """Stream a query into a shard, page by page."""
+        writer = ShardWriter(self.output_dir, name, self.codec)
+        try:
+            last = None
+            while not stop.is_set():
+                page_query = query.start_after(last) if last is not None else query
+                page = list(page_query.limit(self.page_size).stream())
+                written = writer.documents
+                for doc in page:
+                    # A collection group also matches subcollections with the same name
+                    if doc.reference.parent.path == collection:
+                        writer.write_document(doc.reference.path, doc.to_dict())
+                self._progress(collection, writer.documents - written)
+                if len(page) < self.page_size:
+                    break
+                last = page[-1]
+        finally:
+            shard = writer.close()
+        return self._keep(writer, shard)
+
+    def _write_document(self, collection: str, name: str, doc: Any, since: Optional[datetime]) -> Optional[Dict[str, Any]]:
+        writer = ShardWriter(self.output_dir, name, self.codec)
+        data = doc.to_dict()
+        updated_at = data.get(DEFAULT_CHANGED_AT_FIELD)
+        if since is None or (updated_at is not None and updated_at.replace(tzinfo=None) > since):
+            writer.write_document(doc.reference.path, data)
+        shard = writer.close()
+        self._progress(collection, writer.documents)
+        return self._keep(writer, shard)
+
+    def _write_deletions(
+        self, name: str, since: datetime, scopes: Optional[List[str]], stop: threading.Event
+    ) -> Optional[Dict[str, Any]]:
+        """Write a deletion record for every tombstone since the watermark."""
+        query = self.db.collection(TOMBSTONES_COLLECTION)
+        if scopes is not None:
+            query = query.where("scope", "in", scopes)
+        query = query.where("deleted_at", ">", since).order_by("deleted_at").order_by("__name__")
+        writer = ShardWriter(self.output_dir, name, self.codec)
+        try:
+            last = None
+            while not stop.is_set():
+                page_query = query.start_after(last) if last is not None else query
+                page = list(page_query.limit(self.page_size).stream())
+                for doc in page:
+                    tombstone = doc.to_dict()
+                    writer.write_deletion(f"{tombstone['collection']}/{tombstone['document_id']}")
+                if len(page) < self.page_size:
+                    break
+                last = page[-1]
+        finally:
+            shard = writer.close()
+        return self._keep(writer, shard)
+
+    def _keep(self, writer: ShardWriter, shard: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The shard's manifest entry, or None after removing it if it is empty."""
+        if writer.documents or writer.deletions:
+            return shard
+        os.remove(writer.path)
+        return None
+
+    def _progress(self, collection: str, documents: int) -> None:
+        with self._lock:
+            self._written += documents
+            written = self._written
+        if self.progress_callback:
+            self.progress_callback(collection, written)
@@ -0,0 +1,212 @@
+"""Restore of backups written by BackupRunner.
+
+`RestoreRunner` applies a chain of backups in order: a full backup followed
+by the incremental backups taken after it. For each backup the deletions
+are applied first, then the documents are written, so a document deleted
+and recreated between two backups ends up restored. Documents are written
+whole with `set()`, replacing what the database holds.
+
+Shards are read concurrently by up to `parallelism` workers, each writing
+through its own `BulkWriter`. The writers start at `initial_ops_per_second`
+and ramp up towards `max_ops_per_second` as Firestore recommends for new
+traffic (the 500/50/5 rule), both split across the workers.
+"""
+import os
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from firebase_admin import firestore
+from google.cloud.firestore_v1.bulk_writer import BulkWriterOptions, SendMode
+from backups.backup import BUDGET_SCOPED_FIELDS, FULL, FORMAT_VERSION, load_manifest
+from backups.shards import decode_value, read_shard
+from logger import get_logger
+
+# Attempts of a failed bulk write before it is counted as failed
+MAX_WRITE_ATTEMPTS = 5
+
+
+class RestoreRunner:
+    """Writes a chain of backups back into Firestore."""
+
+    def __init__(
+        self,
+        db: firestore.Client,
+        parallelism: int = 8,
+        page_size: int = 500,
+        initial_ops_per_second: int = 500,
+        max_ops_per_second: int = 5000,
+        progress_callback: Optional[Callable[[Dict[str, int]], None]] = None
+    ):
+        """Initialize the runner.
+
+        Args:
+            db: Firestore client instance to restore into
+            parallelism: Shards restored at the same time
+            page_size: Documents read per query when deleting a budget's documents
+            initial_ops_per_second: Starting write rate of the whole restore
+            max_ops_per_second: Write rate the restore ramps up to
+            progress_callback: Receives the counts after each shard
+        """
+        self.db = db
+        self.parallelism = parallelism
+        self.page_size = page_size
+        self.initial_ops_per_second = initial_ops_per_second
+        self.max_ops_per_second = max_ops_per_second
+        self.progress_callback = progress_callback
+        self.logger = get_logger(__name__)
+        self._counts = {"written": 0, "deleted": 0, "failed": 0}
+        self._lock = threading.Lock()
+
+    def run(self, directories: List[str], collections: Optional[List[str]] = None) -> Dict[str, int]:
+        """Restore a full backup and the incremental backups following it.
+
+        Args:
+            directories: Backup directories, the full backup first
+            collections: Only restore these collections, None for all
+
+        Returns:
+            Dict: Documents written, deleted and failed
+
+        Raises:
+            ValueError: If the backups don't form a chain
+        """
+        manifests = [load_manifest(directory) for directory in directories]
+        self._check_chain(directories, manifests)
+
+        for directory, manifest in zip(directories, manifests):
+            self.logger.info(
+                f"Restoring {manifest['type']} backup {directory} "
+                f"({sum(c['documents'] for c in manifest['collections'].values())} documents)"
+            )
+            codec = manifest["codec"]
+            if manifest["deletions"]:
+                self._run_shards([
+                    lambda stop, shard=shard: self._delete_shard(directory, codec, shard, collections, stop)
+                    for shard in manifest["deletions"]
+                ])
+            self._run_shards([
+                lambda stop, shard=shard: self._write_shard(directory, codec, shard, stop)
+                for collection, entry in manifest["collections"].items()
+                if collections is None or collection in collections
+                for shard in entry["shards"]
+            ])
+
+        self.logger.info(f"Restore finished: {self._counts}")
+        return dict(self._counts)
+
+    def _check_chain(self, directories: List[str], manifests: List[Dict[str, Any]]) -> None:
+        """Each backup must start where the previous one ended, for the same budget."""
+        if not manifests:
+            raise ValueError("No backups to restore")
+        for directory, manifest in zip(directories, manifests):
+            if manifest["format"] > FORMAT_VERSION:
+                raise ValueError(f"{directory} was written by a newer version (format {manifest['format']})")
+        if manifests[0]["type"] != FULL:
+            raise ValueError(f"{directories[0]} is incremental, the chain must start with a full backup")
+        for previous, (directory, manifest) in zip(manifests, zip(directories[1:], manifests[1:])):
+            if manifest["type"] == FULL:
+                raise ValueError(f"{directory} is a full backup, only the first backup of a chain can be")
+            if datetime.fromisoformat(manifest["since"]) > datetime.fromisoformat(previous["watermark"]):
+                raise ValueError(f"{directory} starts after the previous backup's watermark, changes would be missed")
+            if manifest["budget_id"] != previous["budget_id"]:
+                raise ValueError(f"{directory} backs up another budget than the previous backup")
+
+    def _run_shards(self, tasks: List[Callable[[threading.Event], None]]) -> None:
+        stop = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=self.parallelism, thread_name_prefix="restore")
+        try:
+            futures = [pool.submit(task, stop) for task in tasks]
+            wait(futures, return_when=FIRST_EXCEPTION)
+            for future in futures:
+                future.result()
+        except BaseException:
+            stop.set()
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise
+        pool.shutdown()
+
+    def _bulk_writer(self) -> Any:
+        workers = max(1, self.parallelism)
+        writer = self.db.bulk_writer(options=BulkWriterOptions(
+            initial_ops_per_second=max(1, self.initial_ops_per_second // workers),
+            max_ops_per_second=max(1, self.max_ops_per_second // workers),
+            mode=SendMode.parallel
+        ))
+        writer.on_write_error(self._on_write_error)
+        return writer
+
+    def _write_shard(self, directory: str, codec: str, shard: Dict[str, Any], stop: threading.Event) -> None:
+        writer = self._bulk_writer()
+        written = 0
+        try:
+            for record in read_shard(os.path.join(directory, shard["file"]), codec, shard["sha256"]):
+                if stop.is_set():
+                    return
+                writer.set(self.db.document(record["path"]), decode_value(record["data"], self.db))
+                written += 1
+        finally:
+            writer.close()
+        self._add(written=written)
+
+    def _delete_shard(
+        self,
+        directory: str,
+        codec: str,
+        shard: Dict[str, Any],
+        collections: Optional[List[str]],
+        stop: threading.Event
+    ) -> None:
+        writer = self._bulk_writer()
+        deleted = 0
+        try:
+            for record in read_shard(os.path.join(directory, shard["file"]), codec, shard["sha256"]):
+                if stop.is_set():
+                    return
+                collection, document_id = record["path"].split("/", 1)
+                if collections is not None and collection not in collections:
+                    continue
+                writer.delete(self.db.document(record["path"]))
+                deleted += 1
+                if collection == "budgets":
+                    # Child documents of a deleted budget have no tombstones of their own
+                    deleted += self._delete_budget_documents(writer, document_id, collections)
+        finally:
+            writer.close()
+        self._add(deleted=deleted)
+
+    def _delete_budget_documents(self, writer: Any, budget_id: str, collections: Optional[List[str]]) -> int:
+        deleted = 0
+        for collection, field in BUDGET_SCOPED_FIELDS.items():
+            if field != "budget_id" or (collections is not None and collection not in collections):
+                continue
+            query = self.db.collection(collection)\
+                .where("budget_id", "==", budget_id)\
+                .order_by("__name__")\
+                .select([])\
+                .limit(self.page_size)
+            last = None
+            while True:
+                page = list((query.start_after(last) if last is not None else query).stream())
+                for doc in page:
+                    writer.delete(doc.reference)
+                deleted += len(page)
+                if len(page) < self.page_size:
+                    break
+                last = page[-1]
+        return deleted
+
+    def _on_write_error(self, failure: Any) -> bool:
+        if failure.attempts < MAX_WRITE_ATTEMPTS:
+            return True
+        self.logger.error(f"Giving up on restoring {failure.reference.path}: {failure.message}")
+        self._add(failed=1)
+        return False
+
+    def _add(self, **increments: int) -> None:
+        with self._lock:
+            for field, value in increments.items():
+                self._counts[field] += value
+            counts = dict(self._counts)
+        if self.progress_callback:
+            self.progress_callback(counts)
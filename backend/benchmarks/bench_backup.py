@@ -0,0 +1,164 @@
+"""Backup and restore round trip.
+
+Seeds a database with generate_dataset(), takes a full backup, changes it
+(updates, inserts and deletions with tombstones), takes an incremental
+backup, then restores both into an empty database and checks it matches
+the source document for document. Reports shard sizes and documents per
+second of each step.
+
+Runs against FakeFirestore by default, or against the Firestore emulator
+with --emulator (see benchmarks/emulator.py for its requirements).
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_backup --codec zstd
+    python -m benchmarks.bench_backup --emulator
+
+Exits with status 1 if the restored database differs from the source.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Tuple
+
+from backups.backup import BackupRunner
+from backups.restore import RestoreRunner
+from backups.shards import CODECS
+from benchmarks.data import generate_dataset
+from benchmarks.fake_firestore import FakeFirestore
+from benchmarks.harness import save_results, use_firestore_client
+from services.transaction_service import TransactionService
+
+
+def dump(db) -> Dict[str, Dict[str, Any]]:
+    """Every document of every top-level collection, by path."""
+    return {
+        doc.reference.path: doc.to_dict()
+        for collection in db.collections()
+        for doc in collection.stream()
+    }
+
+
+def change(db, dataset, changes: int) -> Dict[str, int]:
+    """Update, insert and delete `changes` transactions each, as the API would."""
+    with use_firestore_client(db):
+        service = TransactionService(db)
+    budget_id = dataset.budget_ids[0]
+    now = datetime.utcnow()
+    batch = db.batch()
+    for t in range(changes):
+        batch.update(db.collection("transactions").document(f"{budget_id}-txn-{t}"), {"amount": t, "updated_at": now})
+        batch.set(db.collection("transactions").document(f"{budget_id}-new-{t}"), {
+            "budget_id": budget_id, "account_id": dataset.account_ids[budget_id][0], "amount": -t,
+            "date": now, "payee": "New payee", "category_id": None, "cleared": False,
+            "created_at": now, "updated_at": now,
+        })
+        if len(batch) >= 400:
+            batch.commit()
+            batch = db.batch()
+    batch.commit()
+    for t in range(changes, 2 * changes):
+        ref = db.collection("transactions").document(f"{budget_id}-txn-{t}")
+        service.delete_with_tombstone(ref, ref.get().to_dict())
+    return {"updated": changes, "inserted": changes, "deleted": changes}
+
+
+def timed(call: Callable[[], Any]) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    result = call()
+    return result, time.perf_counter() - start
+
+
+def backup_stats(manifest: Dict[str, Any], seconds: float) -> Dict[str, Any]:
+    shards = [shard for entry in manifest["collections"].values() for shard in entry["shards"]] + manifest["deletions"]
+    documents = sum(shard["documents"] for shard in shards)
+    return {
+        "documents": documents,
+        "deletions": sum(shard["deletions"] for shard in shards),
+        "shards": len(shards),
+        "bytes": sum(shard["bytes"] for shard in shards),
+        "seconds": round(seconds, 3),
+        "documents_per_second": round(documents / seconds) if seconds else None,
+    }
+
+
+def run(source, target_factory: Callable[[Any], Any], args: argparse.Namespace, directory: str) -> Dict[str, Any]:
+    dataset, seconds = timed(lambda: generate_dataset(
+        source, users=args.users, transactions_per_month=args.transactions_per_month
+    ))
+    results: Dict[str, Any] = {"codec": args.codec, "seed_seconds": round(seconds, 3)}
+
+    full_dir, incremental_dir = os.path.join(directory, "full"), os.path.join(directory, "incremental")
+    full, seconds = timed(lambda: BackupRunner(
+        source, full_dir, codec=args.codec, parallelism=args.parallelism
+    ).run())
+    results["full_backup"] = backup_stats(full, seconds)
+
+    results["changes"] = change(source, dataset, args.changes)
+    incremental, seconds = timed(lambda: BackupRunner(
+        source, incremental_dir, codec=args.codec, parallelism=args.parallelism
+    ).run(since=datetime.fromisoformat(full["watermark"])))
+    results["incremental_backup"] = backup_stats(incremental, seconds)
+
+    expected = dump(source)
+    target = target_factory(source)
+    counts, seconds = timed(lambda: RestoreRunner(
+        target, parallelism=args.parallelism, max_ops_per_second=args.max_ops_per_second
+    ).run([full_dir, incremental_dir]))
+    results["restore"] = {
+        **counts,
+        "seconds": round(seconds, 3),
+        "documents_per_second": round(counts["written"] / seconds) if seconds else None,
+    }
+
+    restored = dump(target)
+    differing = sorted(path for path in expected.keys() | restored.keys() if expected.get(path) != restored.get(path))
+    results["documents"] = len(expected)
+    results["differing_documents"] = len(differing)
+    results["differing_sample"] = differing[:10]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backup and restore round trip benchmark")
+    parser.add_argument("--emulator", action="store_true", help="Run against the Firestore emulator")
+    parser.add_argument("--codec", choices=list(CODECS), default="zstd", help="Shard compression")
+    parser.add_argument("--users", type=int, default=2, help="Users in the dataset, one budget each")
+    parser.add_argument("--transactions-per-month", type=int, default=300, help="Transactions per budget and month")
+    parser.add_argument("--changes", type=int, default=200, help="Transactions updated, inserted and deleted each")
+    parser.add_argument("--parallelism", type=int, default=8, help="Readers and writers at the same time")
+    parser.add_argument("--max-ops-per-second", type=int, default=5000, help="Restore write rate to ramp up to")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench-backup-") as directory:
+        if args.emulator:
+            from google.cloud import firestore as gcloud_firestore
+            from benchmarks.emulator import PROJECT_ID, FirestoreEmulator
+
+            with FirestoreEmulator() as emulator:
+                emulator.reset()
+                db = gcloud_firestore.Client(project=PROJECT_ID)
+
+                def empty_emulator(source):
+                    # The source is dumped before this, so restore into the same, emptied emulator
+                    emulator.reset()
+                    return source
+
+                results = run(db, empty_emulator, args, directory)
+        else:
+            results = run(FakeFirestore(), lambda source: FakeFirestore(), args, directory)
+    results["target"] = "emulator" if args.emulator else "fake"
+
+    path = save_results("backup", results)
+    print(json.dumps(results, indent=2))
+    print(f"Saved to {path}")
+    if results["differing_documents"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Duplicate check of an import: one query per row vs the fingerprint index.
+
+Seeds an account with transactions, then checks a statement of which
+`--overlap` rows are already in the account, some shifted by a day and
+renamed as a bank would. The baseline queries the account's transactions
+of the same amount within the date window for each row; the index is
+checked cold (shards built from the transactions), from the stored shards
+and from the process cache.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_dedupe --existing 5000 --rows 1000 --rpc-latency-ms 5
+"""
+import argparse
+import json
+import random
+import time
+from datetime import timedelta
+from typing import Any, Dict, List
+
+import services.duplicate_service as duplicate_service
+from benchmarks.data import make_transaction_dicts
+from benchmarks.fake_firestore import FakeFirestore
+from benchmarks.harness import use_firestore_client
+from dedupe import DATE_WINDOW_DAYS
+from services.duplicate_service import DuplicateService
+
+
+def make_statement(existing: List[Dict[str, Any]], rows: int, overlap: float, seed: int = 7) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    statement = []
+    for i, data in enumerate(rng.sample(existing, int(rows * overlap))):
+        shifted = i % 4 == 0
+        statement.append({
+            "date": data["date"] + timedelta(days=1 if shifted else 0),
+            "amount": data["amount"],
+            "payee": f"{data['payee'].upper()} #{i}" if shifted else data["payee"],
+        })
+    fresh = make_transaction_dicts(rows - len(statement), seed=seed)
+    statement.extend({"date": data["date"], "amount": data["amount"] - 7, "payee": data["payee"]} for data in fresh)
+    rng.shuffle(statement)
+    return statement
+
+
+def check_with_queries(db: FakeFirestore, account_id: str, statement: List[Dict[str, Any]]) -> int:
+    window = timedelta(days=DATE_WINDOW_DAYS)
+    found = 0
+    for row in statement:
+        docs = db.collection("transactions")\
+            .where("account_id", "==", account_id)\
+            .where("amount", "==", row["amount"])\
+            .where("date", ">=", row["date"] - window)\
+            .where("date", "<=", row["date"] + window)\
+            .get()
+        found += bool(docs)
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import duplicate check benchmark")
+    parser.add_argument("--existing", type=int, default=5000, help="Transactions already in the account")
+    parser.add_argument("--rows", type=int, default=1000, help="Rows of the imported statement")
+    parser.add_argument("--overlap", type=float, default=0.3, help="Share of the rows already in the account")
+    parser.add_argument("--rpc-latency-ms", type=float, default=5.0, help="Simulated Firestore round trip")
+    args = parser.parse_args()
+
+    db = FakeFirestore(rpc_latency=args.rpc_latency_ms / 1000)
+    existing = make_transaction_dicts(args.existing)
+    for data in existing:
+        db.collection("transactions").document(data["id"]).set({**data, "account_id": "acc-0"})
+    statement = make_statement(existing, args.rows, args.overlap)
+
+    def run(check) -> Dict[str, Any]:
+        db.reset_ops()
+        start = time.perf_counter()
+        found = check()
+        elapsed = time.perf_counter() - start
+        return {"ms": round(elapsed * 1000, 1), "duplicates": found, "ops": db.reset_ops()}
+
+    def check_with_index() -> int:
+        return sum(match is not None for match in service.find_duplicates("budget-1", "acc-0", statement))
+
+    with use_firestore_client(db):
+        service = DuplicateService(db)
+        results = {"queries": run(lambda: check_with_queries(db, "acc-0", statement))}
+        results["index_cold"] = run(check_with_index)
+        duplicate_service._cache.clear()
+        results["index_stored"] = run(check_with_index)
+        results["index_cached"] = run(check_with_index)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
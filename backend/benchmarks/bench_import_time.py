@@ -0,0 +1,92 @@
+"""Cold-start benchmark: import time of the application module.
+
+Imports `main` in fresh interpreters with `-X importtime`, without any
+Firebase credentials in the environment, and reports the total import time
+and the most expensive modules. Fails if the best run exceeds the target or
+if importing initialized Firebase.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_import_time --runs 5 --target-ms 1500
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+from benchmarks.harness import save_results
+
+# Default cold-start budget for `import main`, in milliseconds
+COLD_START_TARGET_MS = 1500
+
+# Fails the run if the import initialized Firebase
+IMPORT_CHECK = "import main, firebase_admin; assert not firebase_admin._apps, 'Firebase initialized at import'"
+
+
+def import_profile() -> Tuple[float, List[Tuple[str, float, float]]]:
+    """Import main in a fresh interpreter.
+
+    Returns:
+        Tuple of (total milliseconds, [(module, self ms, cumulative ms)])
+    """
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {k: v for k, v in os.environ.items() if not k.startswith(("FIREBASE_", "GOOGLE_APPLICATION"))}
+    env["LOG_LEVEL"] = "WARNING"
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_CHECK],
+        cwd=backend_dir, env=env, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+
+    modules = []
+    total = 0.0
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        modules.append((name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000))
+        if name.strip() == "main":
+            total = int(cumulative_us) / 1000
+    return total, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time cold start benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to start (best is kept)")
+    parser.add_argument("--target-ms", type=float, default=COLD_START_TARGET_MS, help="Cold-start budget")
+    parser.add_argument("--top", type=int, default=15, help="Modules to list")
+    args = parser.parse_args()
+
+    runs = [import_profile() for _ in range(args.runs)]
+    best_total, modules = min(runs, key=lambda run: run[0])
+
+    # Top-level packages by cumulative time, submodules by self time
+    packages: Dict[str, float] = {}
+    for name, _, cumulative in modules:
+        if "." not in name:
+            packages[name] = max(packages.get(name, 0.0), cumulative)
+    slowest_self = sorted(modules, key=lambda module: module[1], reverse=True)[:args.top]
+
+    results = {
+        "import_main_ms": round(best_total, 1),
+        "target_ms": args.target_ms,
+        "runs_ms": [round(total, 1) for total, _ in runs],
+        "top_packages_ms": {
+            name: round(ms, 1) for name, ms in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]
+        },
+        "top_modules_self_ms": {name: round(self_ms, 1) for name, self_ms, _ in slowest_self},
+    }
+    path = save_results("import_time", results)
+    print(json.dumps(results, indent=2))
+    print(f"Saved to {path}")
+
+    if best_total > args.target_ms:
+        print(f"import main took {best_total:.0f} ms, target is {args.target_ms:.0f} ms", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
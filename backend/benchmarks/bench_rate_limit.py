@@ -0,0 +1,218 @@
+"""Latency of well-behaved users while one user floods the API.
+
+Well-behaved users each send interactive requests (the categories
+of a month) at a steady rate, open loop, so queueing shows up in their
+latency. In the abuse scenarios one more user requests full monthly
+reports at --abuse-rate, ten times the per-user limit by default, over
+--abuse-connections connections and ignoring 429s. Each scenario runs
+against a fresh single-worker gunicorn serving benchmarks.fake_server:app,
+whose Firestore calls block for --rpc-latency-ms:
+
+- baseline: well-behaved users only, no rate limiting
+- abuse: with the abusive user, no rate limiting
+- abuse_protected: with the abusive user and RateLimitMiddleware
+
+The load generator shares the machine with the server. The abusive user
+sends its requests with a bare HTTP/1.1 client, so on few cores its flood
+takes little CPU from the server.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_rate_limit --duration 10
+
+Results (well-behaved p50/p99 and the abuser's accepted and throttled
+requests per scenario) are printed and saved to
+benchmarks/results/rate_limit-<revision>.json.
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+import httpx
+
+from benchmarks.bench_workers import _free_port, start_server, stop_server, wait_until_ready
+from benchmarks.harness import save_results
+from benchmarks.load_profile import percentile
+
+INTERACTIVE_PATH = "/api/budgets/{budget_id}/categories?month=2024-{month:02d}"
+ABUSIVE_PATH = "/api/budgets/{budget_id}/reports/monthly/2024-{month:02d}"
+
+
+async def steady_user(
+    client: httpx.AsyncClient, user_id: str, budget_id: str, rate: float, deadline: float, latencies: List[float],
+    statuses: Counter
+) -> None:
+    """Send `rate` requests per second, each in its own task, until the deadline."""
+
+    async def request(month: int) -> None:
+        start = time.perf_counter()
+        response = await client.get(
+            INTERACTIVE_PATH.format(budget_id=budget_id, month=month),
+            headers={"Authorization": f"Bearer {user_id}"}
+        )
+        latencies.append(time.perf_counter() - start)
+        statuses[response.status_code] += 1
+
+    tasks = []
+    month = 0
+    next_at = time.perf_counter()
+    while next_at < deadline:
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+        tasks.append(asyncio.create_task(request(month % 12 + 1)))
+        month += 1
+        next_at += 1 / rate
+    await asyncio.gather(*tasks)
+
+
+class RawConnection:
+    """Keep-alive HTTP/1.1 connection sending bare GET requests.
+
+    Costs a fraction of the CPU httpx takes per request, so the abusive
+    user's request rate doesn't take the server's CPU on a shared machine.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str):
+        self.reader = reader
+        self.writer = writer
+        self.host = host
+
+    @classmethod
+    async def open(cls, base_url: str) -> "RawConnection":
+        url = httpx.URL(base_url)
+        reader, writer = await asyncio.open_connection(url.host, url.port)
+        return cls(reader, writer, f"{url.host}:{url.port}")
+
+    async def get(self, path: str, token: str) -> int:
+        """Send a GET, read the whole response and return its status."""
+        self.writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\nAuthorization: Bearer {token}\r\n\r\n".encode()
+        )
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        await self.reader.readexactly(length)
+        return status
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+async def abusive_user(
+    base_url: str, user_id: str, budget_id: str, rate: float, connections: int, deadline: float, statuses: Counter
+) -> None:
+    """Send `rate` requests per second over `connections` connections, ignoring 429s.
+
+    A request is not sent when every connection is busy, so the backlog of
+    an overloaded server stays bounded.
+    """
+    idle: asyncio.Queue = asyncio.Queue()
+    for _ in range(connections):
+        idle.put_nowait(await RawConnection.open(base_url))
+
+    async def request(connection: RawConnection, month: int) -> None:
+        try:
+            statuses[await connection.get(ABUSIVE_PATH.format(budget_id=budget_id, month=month), user_id)] += 1
+        finally:
+            idle.put_nowait(connection)
+
+    tasks = []
+    month = 0
+    next_at = time.perf_counter()
+    while next_at < deadline:
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+        if idle.empty():
+            statuses["not_sent"] += 1
+        else:
+            tasks.append(asyncio.create_task(request(idle.get_nowait(), month % 12 + 1)))
+        month += 1
+        next_at += 1 / rate
+    await asyncio.gather(*tasks)
+    while not idle.empty():
+        idle.get_nowait().close()
+
+
+async def run_scenario(
+    base_url: str, budgets: List[Tuple[str, str]], args: argparse.Namespace, abuse: bool
+) -> Dict[str, Any]:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    abuser_statuses: Counter = Counter()
+    (abuser_id, abuser_budget), *steady = budgets
+    deadline = time.perf_counter() + args.duration
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        tasks = [
+            steady_user(client, user_id, budget_id, args.rate, deadline, latencies, statuses)
+            for user_id, budget_id in steady
+        ]
+        if abuse:
+            tasks.append(abusive_user(
+                base_url, abuser_id, abuser_budget, args.abuse_rate, args.abuse_connections, deadline, abuser_statuses
+            ))
+        await asyncio.gather(*tasks)
+
+    return {
+        "requests": len(latencies),
+        "statuses": dict(statuses),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+        "abuser_statuses": dict(abuser_statuses),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rate limiting under abuse")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per scenario")
+    parser.add_argument("--users", type=int, default=4, help="Well-behaved users")
+    parser.add_argument("--rate", type=float, default=5.0, help="Requests per second of each well-behaved user")
+    parser.add_argument("--abuse-rate", type=float, default=200.0, help="Requests per second of the abusive user")
+    parser.add_argument("--abuse-connections", type=int, default=32, help="Connections of the abusive user")
+    parser.add_argument("--transactions-per-month", type=int, default=100, help="Transactions per budget and month")
+    parser.add_argument("--rpc-latency-ms", type=float, default=5.0, help="Simulated Firestore RPC latency")
+    parser.add_argument("--max-concurrency", type=int, default=16, help="Admission control concurrency limit")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    # Read by start_server(); the abusive user is user-0
+    args.users += 1
+    args.years = 1
+
+    # IDs generate_dataset() assigns to the first budget of every user
+    budgets = [(f"user-{u}", f"budget-{u}-0") for u in range(args.users)]
+    results: Dict[str, Any] = {"config": vars(args)}
+    for name, abuse, rate_limit in (
+        ("baseline", False, False),
+        ("abuse", True, False),
+        ("abuse_protected", True, True),
+    ):
+        port = _free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = start_server(1, port, args, {
+            "BENCH_RATE_LIMIT": str(rate_limit).lower(),
+            "BENCH_ADMISSION_MAX_CONCURRENCY": str(args.max_concurrency),
+        })
+        try:
+            wait_until_ready(server, base_url, budgets[-1], timeout=120)
+            results[name] = asyncio.run(run_scenario(base_url, budgets, args, abuse))
+        finally:
+            stop_server(server)
+        print(f"{name:16} p50 {results[name]['p50_ms']:8} ms  p99 {results[name]['p99_ms']:9} ms  "
+              f"abuser {results[name]['abuser_statuses']}")
+
+    path = save_results("rate_limit", results)
+    print(json.dumps(results, indent=2))
+    print(f"Saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Memory and aggregation benchmark of TransactionRecord vs dicts and models.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_records --rows 100000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from benchmarks.data import make_transaction_dicts
+from models import Transaction
+from records import TransactionRecord
+
+
+def measure_memory(build: Callable[[], List[Any]]) -> Tuple[List[Any], int]:
+    tracemalloc.start()
+    items = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return items, size
+
+
+def sum_by_category(items: Iterable[Any], get: Callable[[Any, str], Any]) -> Dict[str, int]:
+    totals: Dict[str, int] = {}
+    for item in items:
+        category_id = get(item, "category_id")
+        totals[category_id] = totals.get(category_id, 0) + get(item, "amount")
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregation record type benchmark")
+    parser.add_argument("--rows", type=int, default=100000, help="Transactions to aggregate")
+    args = parser.parse_args()
+
+    raw = make_transaction_dicts(args.rows)
+    variants = {
+        "dict": (lambda: [dict(data) for data in raw], lambda item, field: item.get(field)),
+        "pydantic": (lambda: [Transaction.model_validate(data) for data in raw], getattr),
+        "record": (lambda: [TransactionRecord.from_dict(data["id"], data) for data in raw], getattr),
+    }
+
+    results = {}
+    for name, (build, get) in variants.items():
+        items, size = measure_memory(build)
+        start = time.perf_counter()
+        sum_by_category(items, get)
+        elapsed = time.perf_counter() - start
+        results[name] = {
+            "bytes_per_transaction": round(size / args.rows),
+            "aggregation_ms": round(elapsed * 1000, 2),
+        }
+        del items
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Benchmark of report totals: Decimal(str()) per row vs integer cents.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_report_totals --rows 100000
+"""
+import argparse
+import json
+import time
+from decimal import Decimal
+from typing import Callable, Dict, List
+
+from benchmarks.data import make_transaction_dicts
+from records import TransactionRecord, summarize_records
+
+
+def decimal_totals(records: List[TransactionRecord]) -> Dict[str, Decimal]:
+    """The previous BudgetReportService arithmetic."""
+    category_amounts: Dict[str, Decimal] = {}
+    for record in records:
+        category_amounts[record.category_id] = (
+            category_amounts.get(record.category_id, Decimal("0")) + Decimal(str(record.amount))
+        )
+    total_income = Decimal(str(sum(r.amount for r in records if r.amount > 0)))
+    total_expenses = Decimal(str(sum(r.amount for r in records if r.amount < 0)))
+    return {"income": total_income, "expenses": abs(total_expenses), "net": total_income + total_expenses}
+
+
+def best_of(func: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report totals benchmark")
+    parser.add_argument("--rows", type=int, default=100000, help="Transactions to aggregate")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement (best is kept)")
+    args = parser.parse_args()
+
+    records = [TransactionRecord.from_dict(data["id"], data) for data in make_transaction_dicts(args.rows)]
+
+    results = {
+        "decimal_ms": best_of(lambda: decimal_totals(records), args.repeat),
+        "int_single_pass_ms": best_of(lambda: summarize_records(records), args.repeat),
+    }
+    print(json.dumps({"rows": args.rows, **{k: round(v * 1000, 2) for k, v in results.items()}}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Service-level scenario benchmarks on the in-memory Firestore fake.
+
+Run with pytest-benchmark from the backend directory:
+
+    pytest benchmarks --benchmark-autosave
+
+Runs are saved as JSON under .benchmarks/ (with the commit ID), compare
+them with `pytest benchmarks --benchmark-compare`. Firestore operation
+counts of one run of each scenario are stored in the `extra_info` of the
+results.
+"""
+import asyncio
+import random
+from datetime import datetime
+
+import pytest
+
+from benchmarks.data import generate_dataset
+from benchmarks.fake_firestore import FakeFirestore
+from benchmarks.harness import use_firestore_client
+from models import Transaction
+
+
+@pytest.fixture(scope="module")
+def db():
+    fake = FakeFirestore()
+    with use_firestore_client(fake):
+        fake.dataset = generate_dataset(fake, users=2, years=2, transactions_per_month=300)
+        fake.reset_ops()
+        yield fake
+
+
+def record_ops(benchmark, db, func):
+    """Run func once outside the timed loop and attach its Firestore op counts."""
+    db.reset_ops()
+    func()
+    benchmark.extra_info["firestore_ops"] = db.reset_ops()
+
+
+def test_monthly_data(benchmark, db):
+    from services.budget_report_service import BudgetReportService
+    from services.budget_service import BudgetService
+    from services.category_service import CategoryService
+    from services.transaction_service import TransactionService
+
+    service = BudgetReportService(db, BudgetService(db), CategoryService(db), TransactionService(db))
+    budget_id = db.dataset.budget_ids[0]
+
+    def run():
+        return asyncio.run(service.get_monthly_budget_data(budget_id, 2024, 6, include_transactions=False))
+
+    record_ops(benchmark, db, run)
+    report = benchmark(run)
+    assert report.category_totals
+
+
+def test_monthly_data_with_transactions(benchmark, db):
+    from services.budget_report_service import BudgetReportService
+    from services.budget_service import BudgetService
+    from services.category_service import CategoryService
+    from services.transaction_service import TransactionService
+
+    service = BudgetReportService(db, BudgetService(db), CategoryService(db), TransactionService(db))
+    budget_id = db.dataset.budget_ids[0]
+
+    def run():
+        return asyncio.run(service.get_monthly_budget_data(budget_id, 2024, 6))
+
+    record_ops(benchmark, db, run)
+    report = benchmark(run)
+    assert report.transactions
+
+
+def test_import_transactions(benchmark, db):
+    """Import 500 transactions one by one through TransactionService."""
+    from services.transaction_service import TransactionService
+
+    service = TransactionService(db)
+    budget_id = db.dataset.budget_ids[0]
+    accounts = db.dataset.account_ids[budget_id]
+    categories = db.dataset.category_ids[budget_id]
+    rng = random.Random(7)
+    rows = [
+        Transaction(
+            budget_id=budget_id,
+            account_id=rng.choice(accounts),
+            amount=rng.randint(-50000, 20000),
+            date=datetime(2024, rng.randint(1, 12), rng.randint(1, 28)),
+            payee=f"Imported payee {rng.randrange(50)}",
+            category_id=rng.choice(categories),
+            notes=None,
+        )
+        for _ in range(500)
+    ]
+
+    async def import_rows():
+        for row in rows:
+            await service.create_transaction(row.model_copy())
+
+    def run():
+        asyncio.run(import_rows())
+
+    record_ops(benchmark, db, run)
+    benchmark.pedantic(run, rounds=5, iterations=1)
+
+
+def test_payee_search(benchmark, db):
+    from services.payee_service import PayeeService
+
+    service = PayeeService(db)
+    user_id = db.dataset.user_ids[0]
+
+    def run():
+        return service.search_payees("Payee 0-1", user_id)
+
+    record_ops(benchmark, db, run)
+    result = benchmark(run)
+    assert result.total_count > 0
+
+
+def test_transfer(benchmark, db):
+    """Move money between two accounts of different budgets.
+
+    CrossBudgetTransferService.create_transfer doesn't match the
+    CrossBudgetTransfer model yet, so this runs the two transactional
+    balance updates it is made of.
+    """
+    from services.account_service import AccountService
+
+    service = AccountService(db)
+    source = db.dataset.account_ids[db.dataset.budget_ids[0]][0]
+    destination = db.dataset.account_ids[db.dataset.budget_ids[-1]][0]
+
+    def run():
+        service.update_balance(source, -1000)
+        service.update_balance(destination, 1000)
+
+    record_ops(benchmark, db, run)
+    benchmark(run)
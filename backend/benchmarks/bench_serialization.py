@@ -0,0 +1,88 @@
+"""CPU benchmark of the default FastAPI response path vs ORJSONResponse.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_serialization --rows 10000
+"""
+import argparse
+import json
+import time
+from decimal import Decimal
+from typing import Any, Callable, Dict, List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from benchmarks.data import make_transactions
+from models import Budget, Transaction
+from responses import ORJSONResponse
+from services.budget_report_service import (
+    BudgetPeriod, BudgetSummary, CategoryTotal, MonthlyBudgetReport
+)
+
+
+def make_report(transactions: List[Transaction]) -> MonthlyBudgetReport:
+    return MonthlyBudgetReport(
+        budget=Budget(id="budget-1", user_id="user-1", name="Benchmark", currency="EUR"),
+        period=BudgetPeriod(year=2024, month=1),
+        transactions=transactions,
+        category_totals=[
+            CategoryTotal(category_id=f"cat-{i}", category_name=f"Category {i}", total_amount=Decimal(i * 100))
+            for i in range(40)
+        ],
+        summary=BudgetSummary(total_income=Decimal(1), total_expenses=Decimal(2), net=Decimal(-1)),
+    )
+
+
+def default_path(response_type: Any) -> Callable[[Any], bytes]:
+    """What FastAPI does for a route returning models with a response_model."""
+    adapter = TypeAdapter(response_type)
+
+    def render(content: Any) -> bytes:
+        validated = adapter.validate_python(jsonable_encoder(content))
+        return JSONResponse(jsonable_encoder(validated)).body
+    return render
+
+
+def lean_path(content: Any) -> bytes:
+    return ORJSONResponse(content).body
+
+
+def measure(render: Callable[[Any], bytes], content: Any, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.process_time()
+        render(content)
+        timings.append(time.process_time() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Response serialization CPU benchmark")
+    parser.add_argument("--rows", type=int, default=10000, help="Transactions per payload")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement (best is kept)")
+    args = parser.parse_args()
+
+    transactions = make_transactions(args.rows)
+    endpoints: Dict[str, Any] = {
+        "GET /api/budgets/{budget_id}/transactions": (List[Transaction], transactions),
+        "GET /api/budgets/{budget_id}/reports/monthly/{month}": (MonthlyBudgetReport, make_report(transactions)),
+    }
+
+    results = {}
+    for endpoint, (response_type, content) in endpoints.items():
+        default_cpu = measure(default_path(response_type), content, args.repeat)
+        lean_cpu = measure(lean_path, content, args.repeat)
+        results[endpoint] = {
+            "rows": args.rows,
+            "default_cpu_ms": round(default_cpu * 1000, 2),
+            "orjson_cpu_ms": round(lean_cpu * 1000, 2),
+            "speedup": round(default_cpu / lean_cpu, 1) if lean_cpu else None,
+        }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Payload size and serialization time of the negotiated wire formats.
+
+Serializes a month of transactions, as the transaction list and as the
+monthly report, in each format the list and report routes can return
+(JSON or MessagePack, rows or columnar layout) and compresses each payload
+with gzip and brotli at the levels CompressionMiddleware uses.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_wire_formats --rows 10000
+"""
+import argparse
+import json
+import time
+import zlib
+from typing import Any, Callable, Dict, Tuple
+
+import brotli
+
+from benchmarks.bench_serialization import make_report
+from benchmarks.data import make_transactions
+from benchmarks.harness import save_results
+from compression import BROTLI_QUALITY, GZIP_LEVEL
+from responses import MsgPackResponse, ORJSONResponse, to_columnar
+
+FORMATS: Dict[str, Tuple[Callable[[Any], bytes], bool]] = {
+    "json": (lambda content: ORJSONResponse(content).body, False),
+    "json_columnar": (lambda content: ORJSONResponse(content).body, True),
+    "msgpack": (lambda content: MsgPackResponse(content).body, False),
+    "msgpack_columnar": (lambda content: MsgPackResponse(content).body, True),
+}
+
+
+def best_cpu_ms(call: Callable[[], Any], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.process_time()
+        call()
+        timings.append(time.process_time() - start)
+    return round(min(timings) * 1000, 2)
+
+
+def gzip(payload: bytes) -> bytes:
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(payload) + compressor.flush()
+
+
+def measure_format(content: Any, render: Callable[[Any], bytes], columnar: bool, repeat: int) -> Dict[str, Any]:
+    serialize = (lambda: render(to_columnar(content))) if columnar else (lambda: render(content))
+    payload = serialize()
+    gzipped = gzip(payload)
+    brotlied = brotli.compress(payload, quality=BROTLI_QUALITY)
+    return {
+        "bytes": len(payload),
+        "gzip_bytes": len(gzipped),
+        "br_bytes": len(brotlied),
+        "serialize_cpu_ms": best_cpu_ms(serialize, repeat),
+        "gzip_cpu_ms": best_cpu_ms(lambda: gzip(payload), repeat),
+        "br_cpu_ms": best_cpu_ms(lambda: brotli.compress(payload, quality=BROTLI_QUALITY), repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wire format payload size and serialization benchmark")
+    parser.add_argument("--rows", type=int, default=10000, help="Transactions in the month")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement (best is kept)")
+    args = parser.parse_args()
+
+    transactions = make_transactions(args.rows)
+    payloads = {
+        "GET /api/budgets/{budget_id}/transactions": transactions,
+        "GET /api/budgets/{budget_id}/reports/monthly/{month}": make_report(transactions),
+    }
+
+    results: Dict[str, Any] = {"rows": args.rows}
+    for endpoint, content in payloads.items():
+        formats = {
+            name: measure_format(content, render, columnar, args.repeat)
+            for name, (render, columnar) in FORMATS.items()
+        }
+        baseline = formats["json"]["bytes"]
+        for measured in formats.values():
+            measured["vs_json"] = round(measured["bytes"] / baseline, 3)
+            measured["br_vs_json"] = round(measured["br_bytes"] / baseline, 3)
+        results[endpoint] = formats
+
+    path = save_results("wire_formats", results)
+    print(json.dumps(results, indent=2))
+    print(f"Saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Throughput of the gunicorn server profile as workers are added.
+
+For each worker count, starts gunicorn with gunicorn.conf.py serving
+benchmarks.fake_server:app, drives it with the load profile from several
+client processes and records throughput and latency. Each worker count runs
+against a fresh server.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_workers --workers 1 2 4 8 --rpc-latency-ms 20
+
+With --rpc-latency-ms 0 requests are pure CPU, so throughput scales with
+workers only up to the number of cores. With a latency, Firestore calls
+block a worker's event loop like the real client does, and extra workers
+also overlap that wait. The load generator shares the machine with the
+server; use --clients to keep it from being the bottleneck.
+
+Results are saved to benchmarks/results/workers-<revision>.json.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.harness import save_results
+from benchmarks.load_profile import run_profile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(
+    workers: int, port: int, args: argparse.Namespace, extra_env: Optional[Dict[str, str]] = None
+) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        LOG_LEVEL="WARNING",
+        BENCH_USERS=str(args.users),
+        BENCH_YEARS=str(args.years),
+        BENCH_TRANSACTIONS_PER_MONTH=str(args.transactions_per_month),
+        BENCH_RPC_LATENCY_MS=str(args.rpc_latency_ms),
+        BENCH_SEED=str(args.seed),
+        **(extra_env or {}),
+    )
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+            "--workers", str(workers), "--bind", f"127.0.0.1:{port}",
+            "benchmarks.fake_server:app",
+        ],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_until_ready(server: subprocess.Popen, base_url: str, budget: Tuple[str, str], timeout: float) -> None:
+    user_id, budget_id = budget
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {server.returncode}")
+        try:
+            response = httpx.get(
+                f"{base_url}/api/budgets/{budget_id}/reports/monthly/2024-01?include_transactions=false",
+                headers={"Authorization": f"Bearer {user_id}"},
+            )
+            if response.status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server not ready after {timeout}s")
+
+
+def stop_server(server: subprocess.Popen) -> None:
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+def _run_client(job: Tuple[int, float, str, List[Tuple[str, str]], int]) -> Dict[str, Any]:
+    concurrency, duration, base_url, budgets, seed = job
+    return asyncio.run(run_profile(concurrency, duration, base_url, None, budgets, seed))
+
+
+def merge_clients(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine the load profiles of the client processes of one run."""
+    endpoints: Dict[str, Dict[str, Any]] = {}
+    for result in results:
+        for name, stats in result["endpoints"].items():
+            merged = endpoints.setdefault(name, {"requests": 0, "errors": 0, "p50_ms": 0.0, "p95_ms": 0.0})
+            merged["requests"] += stats["requests"]
+            merged["errors"] += stats["errors"]
+            # Request-weighted mean of the medians, worst p95 of any client
+            merged["p50_ms"] += stats["p50_ms"] * stats["requests"]
+            merged["p95_ms"] = max(merged["p95_ms"], stats["p95_ms"])
+    for stats in endpoints.values():
+        stats["p50_ms"] = round(stats["p50_ms"] / max(stats["requests"], 1), 2)
+    return {
+        "requests": sum(result["requests"] for result in results),
+        "throughput_rps": round(sum(result["throughput_rps"] for result in results), 1),
+        "errors": sum(stats["errors"] for stats in endpoints.values()),
+        "endpoints": dict(sorted(endpoints.items())),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server throughput by number of workers")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to run")
+    parser.add_argument("--clients", type=int, default=2, help="Load-generating processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent requests per client")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per worker count")
+    parser.add_argument("--rpc-latency-ms", type=float, default=20.0, help="Simulated Firestore RPC latency")
+    parser.add_argument("--users", type=int, default=2, help="Generated users")
+    parser.add_argument("--years", type=int, default=1, help="Years of transactions per budget")
+    parser.add_argument("--transactions-per-month", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    # IDs generate_dataset() assigns to the first budget of every user
+    budgets = [(f"user-{u}", f"budget-{u}-0") for u in range(args.users)]
+
+    runs = []
+    for workers in args.workers:
+        port = _free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = start_server(workers, port, args)
+        try:
+            wait_until_ready(server, base_url, budgets[0], timeout=120)
+            jobs = [
+                (args.concurrency, args.duration, base_url, budgets, args.seed + i)
+                for i in range(args.clients)
+            ]
+            with ProcessPoolExecutor(max_workers=args.clients) as pool:
+                run = merge_clients(list(pool.map(_run_client, jobs)))
+        finally:
+            stop_server(server)
+
+        run["workers"] = workers
+        run["speedup"] = round(run["throughput_rps"] / runs[0]["throughput_rps"], 2) if runs else 1.0
+        runs.append(run)
+        print(f"{workers:3} workers  {run['throughput_rps']:8} req/s  x{run['speedup']:<5}  "
+              f"{run['requests']} requests, {run['errors']} errors")
+
+    results = {
+        "cpus": os.cpu_count(),
+        "clients": args.clients,
+        "concurrency_per_client": args.concurrency,
+        "rpc_latency_ms": args.rpc_latency_ms,
+        "runs": runs,
+    }
+    path = save_results("workers", results)
+    print(f"Saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
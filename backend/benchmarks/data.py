@@ -0,0 +1,171 @@
+"""Deterministic synthetic data shared by the benchmarks."""
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from models import Transaction
+
+
+def make_transaction_dicts(rows: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """Transactions shaped like Firestore documents of a single month."""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            "id": f"txn-{i}",
+            "budget_id": "budget-1",
+            "account_id": f"acc-{rng.randrange(5)}",
+            "amount": rng.randint(-50000, 20000),
+            "date": start + timedelta(minutes=rng.randrange(60 * 24 * 30)),
+            "payee": f"Payee {rng.randrange(200)}",
+            "category_id": f"cat-{rng.randrange(40)}",
+            "cleared": rng.random() < 0.8,
+            "notes": None,
+            "pending": False,
+            "created_at": start,
+            "updated_at": start,
+        }
+        for i in range(rows)
+    ]
+
+
+def make_transactions(rows: int, seed: int = 42) -> List[Transaction]:
+    return [Transaction.model_validate(data) for data in make_transaction_dicts(rows, seed)]
+
+
+class Dataset:
+    """IDs of the documents written by generate_dataset()."""
+
+    def __init__(self):
+        self.user_ids: List[str] = []
+        self.budget_ids: List[str] = []
+        self.budget_owners: Dict[str, str] = {}
+        self.account_ids: Dict[str, List[str]] = {}
+        self.category_ids: Dict[str, List[str]] = {}
+        self.payee_names: Dict[str, List[str]] = {}
+        self.transaction_count = 0
+
+
+def generate_dataset(
+    db,
+    users: int = 2,
+    budgets_per_user: int = 1,
+    accounts_per_budget: int = 4,
+    groups_per_budget: int = 6,
+    categories_per_group: int = 6,
+    payees_per_user: int = 150,
+    years: int = 2,
+    transactions_per_month: int = 300,
+    end: datetime = datetime(2024, 12, 31),
+    seed: int = 42
+) -> Dataset:
+    """Write realistically shaped budgets into a Firestore client (usually FakeFirestore).
+
+    Every budget gets accounts, category groups and categories, and
+    `transactions_per_month` transactions for each of the `years` years up to
+    `end`. Writes go through batches of 500, like an import would.
+
+    Returns:
+        Dataset: IDs of the generated documents
+    """
+    rng = random.Random(seed)
+    dataset = Dataset()
+    batch = _BatchedWriter(db)
+    start = datetime(end.year - years + 1, 1, 1)
+    days = (end - start).days + 1
+
+    for u in range(users):
+        user_id = f"user-{u}"
+        dataset.user_ids.append(user_id)
+        batch.set("users", user_id, {
+            "id": user_id, "email": f"{user_id}@example.com", "name": f"User {u}",
+            "created_at": start, "updated_at": start,
+        })
+
+        payee_names = [f"Payee {u}-{p}" for p in range(payees_per_user)]
+        dataset.payee_names[user_id] = payee_names
+        for p, name in enumerate(payee_names):
+            batch.set("payees", f"payee-{u}-{p}", {
+                "user_id": user_id, "name": name, "aliases": [name.upper(), f"POS {name.upper()}"],
+                "imported_aliases": [name.upper()], "default_category_id": None,
+                "merchant_type": "retail", "last_used": None, "created_at": start, "updated_at": start,
+            })
+
+        for b in range(budgets_per_user):
+            budget_id = f"budget-{u}-{b}"
+            dataset.budget_ids.append(budget_id)
+            dataset.budget_owners[budget_id] = user_id
+            batch.set("budgets", budget_id, {
+                "user_id": user_id, "name": f"Budget {b}", "currency": "EUR",
+                "created_at": start, "updated_at": start,
+            })
+
+            account_ids = [f"{budget_id}-acc-{a}" for a in range(accounts_per_budget)]
+            dataset.account_ids[budget_id] = account_ids
+            for a, account_id in enumerate(account_ids):
+                batch.set("accounts", account_id, {
+                    "budget_id": budget_id, "user_id": user_id, "name": f"Account {a}",
+                    "account_type": rng.choice(["checking", "savings", "credit card", "cash"]),
+                    "balance": rng.randint(0, 5_000_00), "currency": "EUR",
+                    "created_at": start, "updated_at": start,
+                })
+
+            category_ids = []
+            for g in range(groups_per_budget):
+                group_id = f"{budget_id}-grp-{g}"
+                batch.set("category_groups", group_id, {
+                    "user_id": user_id, "budget_id": budget_id, "name": f"Group {g}",
+                    "created_at": start + timedelta(seconds=g), "updated_at": start,
+                })
+                for c in range(categories_per_group):
+                    category_id = f"{group_id}-cat-{c}"
+                    category_ids.append(category_id)
+                    batch.set("categories", category_id, {
+                        "group_id": group_id, "budget_id": budget_id, "name": f"Category {g}.{c}",
+                        "cash_left_over": 0, "assigned_amounts": {}, "notes": "",
+                        "created_at": start + timedelta(seconds=c), "updated_at": start,
+                    })
+            dataset.category_ids[budget_id] = category_ids
+
+            count = transactions_per_month * 12 * years
+            for t in range(count):
+                date = start + timedelta(days=rng.randrange(days), minutes=rng.randrange(24 * 60))
+                batch.set("transactions", f"{budget_id}-txn-{t}", {
+                    "budget_id": budget_id,
+                    "account_id": rng.choice(account_ids),
+                    "amount": rng.randint(-50000, 20000) if rng.random() < 0.9 else rng.randint(100000, 400000),
+                    "date": date,
+                    "payee": rng.choice(payee_names),
+                    "category_id": rng.choice(category_ids),
+                    "cleared": rng.random() < 0.8,
+                    "notes": None,
+                    "pending": False,
+                    "created_at": date,
+                    "updated_at": date,
+                })
+            dataset.transaction_count += count
+
+    batch.flush()
+    return dataset
+
+
+class _BatchedWriter:
+    """Writes documents in batches of 500, the Firestore commit limit."""
+
+    def __init__(self, db, size: int = 500):
+        self.db = db
+        self.size = size
+        self.batch = db.batch()
+        self.pending = 0
+
+    def set(self, collection: str, document_id: str, data: Dict[str, Any]) -> None:
+        self.batch.set(self.db.collection(collection).document(document_id), data)
+        self.pending += 1
+        if self.pending >= self.size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.pending:
+            self.batch.commit()
+            self.batch = self.db.batch()
+            self.pending = 0
@@ -0,0 +1,300 @@
+"""Performance regression harness running against the local Firestore emulator.
+
+Some behaviour only shows up with real Firestore semantics: transaction
+contention in AccountService.update_balance, query execution and batch
+commits over gRPC. This harness starts the emulator (or reuses the one in
+$FIRESTORE_EMULATOR_HOST), seeds it with generate_dataset(), then:
+
+- counts Firestore round trips and documents read per endpoint,
+- measures endpoint latency percentiles,
+- runs concurrent balance updates on one account and checks the number of
+  transaction attempts and the final balance.
+
+benchmarks/emulator_thresholds.json holds the workload: dataset size,
+endpoints and repetitions. Limits (`max_rpcs`, `max_documents_read`,
+`max_p95_ms`, `max_attempts_per_update`) are only enforced where the file
+sets them; set them from measured runs. Error responses, failed balance
+updates and an inconsistent balance always fail the run.
+
+Requires the Firestore emulator (`gcloud emulators firestore` or the
+Firebase CLI, which uses frontend/firebase.json) and Java. A `demo-` project ID is used, so no cloud project or
+credentials are needed. Note the emulator doesn't enforce composite indexes.
+
+Run from the backend directory:
+
+    python -m benchmarks.emulator
+
+Exits with status 1 if a check fails or a limit is exceeded. Results are saved to
+benchmarks/results/emulator-<revision>.json.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from typing import Any, Dict, List, Optional
+
+import httpx
+from google.cloud import firestore as gcloud_firestore
+
+from benchmarks.data import generate_dataset
+from benchmarks.harness import build_app, save_results, use_firestore_client
+from benchmarks.load_profile import percentile
+from metrics import BACKGROUND_ROUTE, FIRESTORE_DOCUMENTS_READ, FIRESTORE_OPERATIONS, instrument_client
+
+PROJECT_ID = "demo-budget-api"
+# Must match emulators.firestore in FIREBASE_CONFIG, which the Firebase CLI reads
+DEFAULT_HOST = "localhost:8086"
+FIREBASE_CONFIG = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "..", "frontend", "firebase.json"))
+THRESHOLDS_FILE = os.path.join(os.path.dirname(__file__), "emulator_thresholds.json")
+
+
+class FirestoreEmulator:
+    """Starts the Firestore emulator for the duration of a `with` block.
+
+    If FIRESTORE_EMULATOR_HOST is already set, that emulator is reused and
+    left running.
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, startup_timeout: float = 60.0):
+        self.host = os.getenv("FIRESTORE_EMULATOR_HOST", host)
+        self.startup_timeout = startup_timeout
+        self.process: Optional[subprocess.Popen] = None
+
+    def __enter__(self) -> "FirestoreEmulator":
+        if os.getenv("FIRESTORE_EMULATOR_HOST"):
+            self._wait_until_ready()
+            return self
+
+        self.process = subprocess.Popen(
+            self._command(),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        os.environ["FIRESTORE_EMULATOR_HOST"] = self.host
+        self._wait_until_ready()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.process is not None:
+            os.killpg(self.process.pid, signal.SIGTERM)
+            self.process.wait(timeout=30)
+            os.environ.pop("FIRESTORE_EMULATOR_HOST", None)
+
+    def reset(self) -> None:
+        """Delete every document in the emulator."""
+        request = urllib.request.Request(
+            f"http://{self.host}/emulator/v1/projects/{PROJECT_ID}/databases/(default)/documents",
+            method="DELETE",
+        )
+        urllib.request.urlopen(request).close()
+
+    def _command(self) -> List[str]:
+        if shutil.which("gcloud"):
+            return ["gcloud", "emulators", "firestore", "start", f"--host-port={self.host}"]
+        if shutil.which("firebase"):
+            return [
+                "firebase", "emulators:start", "--only", "firestore", "--project", PROJECT_ID,
+                "--config", FIREBASE_CONFIG,
+            ]
+        raise RuntimeError("Neither gcloud nor the Firebase CLI is installed, can't start the Firestore emulator")
+
+    def _wait_until_ready(self) -> None:
+        hostname, port = self.host.rsplit(":", 1)
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process is not None and self.process.poll() is not None:
+                raise RuntimeError(f"Firestore emulator exited with status {self.process.returncode}")
+            try:
+                socket.create_connection((hostname, int(port)), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.5)
+        raise RuntimeError(f"Firestore emulator not reachable on {self.host} after {self.startup_timeout}s")
+
+
+def route_usage(route: str) -> Dict[str, float]:
+    """Current Firestore RPC and document counters of a route."""
+    rpcs = sum(value for (label, _), value in FIRESTORE_OPERATIONS.values.items() if label == route)
+    operations = {
+        operation: value for (label, operation), value in FIRESTORE_OPERATIONS.values.items() if label == route
+    }
+    return {
+        "rpcs": rpcs,
+        "documents_read": FIRESTORE_DOCUMENTS_READ.values.get((route,), 0),
+        **operations,
+    }
+
+
+async def measure_round_trips(
+    client: httpx.AsyncClient, app, budget_id: str, user_id: str, checks: Dict[str, Dict[str, Any]]
+) -> Dict[str, Dict[str, Any]]:
+    """Issue each request once, sequentially, and read its Firestore usage from the route counters."""
+    results = {}
+    for name, check in checks.items():
+        path = check["path"].format(budget_id=budget_id)
+        route = _route_template(app, path)
+        before = route_usage(route)
+        response = await client.get(path, headers={"Authorization": f"Bearer {user_id}"})
+        after = route_usage(route)
+        results[name] = {
+            "status": response.status_code,
+            "rpcs": int(after["rpcs"] - before["rpcs"]),
+            "documents_read": int(after["documents_read"] - before["documents_read"]),
+        }
+    return results
+
+
+async def measure_latency(
+    client: httpx.AsyncClient, budget_id: str, user_id: str, checks: Dict[str, Dict[str, Any]], repeat: int
+) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name, check in checks.items():
+        path = check["path"].format(budget_id=budget_id)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await client.get(path, headers={"Authorization": f"Bearer {user_id}"})
+            timings.append(time.perf_counter() - start)
+        results[name] = {
+            "p50_ms": round(percentile(timings, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(timings, 0.95) * 1000, 2),
+        }
+    return results
+
+
+def run_contention(db, account_id: str, writers: int, updates_per_writer: int) -> Dict[str, Any]:
+    """Concurrently apply +1 balance updates to one account from several threads."""
+    from services.account_service import AccountService
+
+    service = AccountService(db)
+    initial = db.collection("accounts").document(account_id).get().to_dict()["balance"]
+    before = route_usage(BACKGROUND_ROUTE)
+    failures: List[str] = []
+
+    def write():
+        for _ in range(updates_per_writer):
+            try:
+                service.update_balance(account_id, 1)
+            except Exception as e:
+                failures.append(str(e))
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=write) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    after = route_usage(BACKGROUND_ROUTE)
+    succeeded = writers * updates_per_writer - len(failures)
+    final = db.collection("accounts").document(account_id).get().to_dict()["balance"]
+    attempts = after.get("transaction", 0) - before.get("transaction", 0)
+    return {
+        "updates": writers * updates_per_writer,
+        "failed": len(failures),
+        "seconds": round(elapsed, 3),
+        "attempts_per_update": round(attempts / max(succeeded, 1), 2),
+        "balance_consistent": final == initial + succeeded,
+    }
+
+
+def check_thresholds(results: Dict[str, Any], thresholds: Dict[str, Any]) -> List[str]:
+    """Return a message for every failed check and exceeded limit; missing limits aren't checked."""
+    violations = []
+    for name, result in results["round_trips"].items():
+        check = thresholds["round_trips"][name]
+        if result["status"] >= 400:
+            violations.append(f"{name}: HTTP {result['status']}")
+        if check.get("max_rpcs") is not None and result["rpcs"] > check["max_rpcs"]:
+            violations.append(f"{name}: {result['rpcs']} RPCs > {check['max_rpcs']}")
+        limit = check.get("max_documents_read")
+        if limit is not None and result["documents_read"] > limit:
+            violations.append(f"{name}: {result['documents_read']} documents read > {limit}")
+
+    for name, limit in thresholds["latency"].get("max_p95_ms", {}).items():
+        p95 = results["latency"][name]["p95_ms"]
+        if p95 > limit:
+            violations.append(f"{name}: p95 {p95} ms > {limit} ms")
+
+    contention = results["contention"]
+    if contention["failed"]:
+        violations.append(f"contention: {contention['failed']} balance updates failed")
+    if not contention["balance_consistent"]:
+        violations.append("contention: final balance doesn't match the applied updates")
+    limit = thresholds["contention"].get("max_attempts_per_update")
+    if limit is not None and contention["attempts_per_update"] > limit:
+        violations.append(f"contention: {contention['attempts_per_update']} attempts per update > {limit}")
+    return violations
+
+
+def _route_template(app, path: str) -> str:
+    from starlette.routing import Match
+
+    scope = {"type": "http", "path": path.split("?")[0], "method": "GET"}
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    raise ValueError(f"No route matches {path}")
+
+
+async def run_http_checks(app, budget_id: str, user_id: str, thresholds: Dict[str, Any]) -> Dict[str, Any]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://emulator", timeout=60) as client:
+        round_trips = await measure_round_trips(client, app, budget_id, user_id, thresholds["round_trips"])
+        latency_checks = {name: thresholds["round_trips"][name] for name in thresholds["latency"]["endpoints"]}
+        latency = await measure_latency(client, budget_id, user_id, latency_checks, thresholds["latency"]["repeat"])
+    return {"round_trips": round_trips, "latency": latency}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Firestore emulator performance checks")
+    parser.add_argument("--thresholds", default=THRESHOLDS_FILE, help="Thresholds JSON file")
+    parser.add_argument("--keep-data", action="store_true", help="Don't clear the emulator before seeding")
+    args = parser.parse_args()
+
+    with open(args.thresholds) as file:
+        thresholds = json.load(file)
+
+    with FirestoreEmulator() as emulator:
+        if not args.keep_data:
+            emulator.reset()
+        db = instrument_client(gcloud_firestore.Client(project=PROJECT_ID))
+
+        with use_firestore_client(db):
+            seed_start = time.perf_counter()
+            dataset = generate_dataset(db, **thresholds["dataset"])
+            seed_seconds = time.perf_counter() - seed_start
+
+            budget_id = dataset.budget_ids[0]
+            user_id = dataset.budget_owners[budget_id]
+            results = asyncio.run(run_http_checks(build_app(db), budget_id, user_id, thresholds))
+            results["contention"] = run_contention(
+                db, dataset.account_ids[budget_id][0],
+                thresholds["contention"]["writers"], thresholds["contention"]["updates_per_writer"]
+            )
+            results["seed"] = {"documents": dataset.transaction_count, "seconds": round(seed_seconds, 2)}
+
+    violations = check_thresholds(results, thresholds)
+    results["violations"] = violations
+    path = save_results("emulator", results)
+
+    print(json.dumps(results, indent=2))
+    print(f"Saved to {path}")
+    if violations:
+        print("Checks failed:\n  " + "\n  ".join(violations), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,645 @@
+"""Deterministic in-memory stand-in for the Firestore client.
+
+Implements the subset of google.cloud.firestore.Client the services use:
+collections and documents, where/order_by/limit/offset/select/cursors,
+stream/get, get_all, collection group partitions, batches, bulk writers, transactions (including the
+`firestore.transactional` decorator) and on_snapshot listeners, which are
+notified synchronously after every commit. Every operation is counted in
+`FakeFirestore.ops`, so benchmarks can report round trips alongside time.
+An optional per-RPC latency makes each round trip block like a network call.
+
+Documents are kept as plain dicts; reads return deep copies like the real
+client does. Auto IDs come from a seeded generator, so runs are repeatable.
+"""
+import copy
+import random
+import string
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from google.api_core.exceptions import AlreadyExists, NotFound
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.watch import ChangeType, DocumentChange
+
+# Firestore limit on writes in a single commit
+MAX_WRITES_PER_COMMIT = 500
+
+_ID_ALPHABET = string.ascii_letters + string.digits
+
+
+def _get_field(data: Dict[str, Any], field_path: str) -> Any:
+    value: Any = data
+    for part in field_path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            raise KeyError(field_path)
+        value = value[part]
+    return value
+
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    """Order values of mixed types the way Firestore does (nulls first, then by type)."""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, datetime):
+        return (3, value.replace(tzinfo=None))
+    if isinstance(value, str):
+        return (4, value)
+    return (5, str(value))
+
+
+def _matches(data: Dict[str, Any], field: str, op: str, value: Any) -> bool:
+    try:
+        actual = _get_field(data, field)
+    except KeyError:
+        return False
+    if op == "==":
+        return actual == value
+    if op == "!=":
+        return actual is not None and actual != value
+    if op in ("<", "<=", ">", ">="):
+        if actual is None or value is None or _sort_key(actual)[0] != _sort_key(value)[0]:
+            return False
+        left, right = _sort_key(actual)[1], _sort_key(value)[1]
+        return {"<": left < right, "<=": left <= right, ">": left > right, ">=": left >= right}[op]
+    if op == "in":
+        return actual in value
+    if op == "not-in":
+        return actual is not None and actual not in value
+    if op == "array_contains":
+        return isinstance(actual, list) and value in actual
+    if op == "array_contains_any":
+        return isinstance(actual, list) and any(v in actual for v in value)
+    raise ValueError(f"Unsupported operator: {op}")
+
+
+def _apply_write(current: Optional[Dict[str, Any]], data: Dict[str, Any], merge: bool) -> Dict[str, Any]:
+    """Apply set/update data, resolving sentinels and dotted field paths."""
+    result = copy.deepcopy(current) if (merge and current is not None) else {}
+    for key, value in data.items():
+        target = result
+        parts = key.split(".") if merge else [key]
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        field = parts[-1]
+        if value is transforms.DELETE_FIELD:
+            target.pop(field, None)
+        elif value is transforms.SERVER_TIMESTAMP:
+            target[field] = datetime.utcnow()
+        elif isinstance(value, transforms.Increment):
+            target[field] = target.get(field, 0) + value.value
+        elif isinstance(value, transforms.ArrayUnion):
+            existing = list(target.get(field) or [])
+            target[field] = existing + [v for v in value.values if v not in existing]
+        elif isinstance(value, transforms.ArrayRemove):
+            target[field] = [v for v in target.get(field) or [] if v not in value.values]
+        else:
+            target[field] = copy.deepcopy(value)
+    return result
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, reference: "FakeDocumentReference", data: Optional[Dict[str, Any]]):
+        self.reference = reference
+        self._data = data
+
+    @property
+    def id(self) -> str:
+        return self.reference.id
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str) -> Any:
+        if self._data is None:
+            return None
+        return copy.deepcopy(_get_field(self._data, field_path))
+
+
+class FakeDocumentReference:
+    def __init__(self, client: "FakeFirestore", path: str):
+        self._client = client
+        self.path = path
+
+    @property
+    def id(self) -> str:
+        return self.path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self) -> "FakeCollectionReference":
+        return FakeCollectionReference(self._client, self.path.rsplit("/", 1)[0])
+
+    def collection(self, collection_id: str) -> "FakeCollectionReference":
+        return FakeCollectionReference(self._client, f"{self.path}/{collection_id}")
+
+    def get(self, field_paths: Optional[List[str]] = None, transaction=None) -> FakeDocumentSnapshot:
+        self._client._round_trip()
+        self._client.ops["document_gets"] += 1
+        self._client.ops["documents_read"] += 1
+        data = self._client._documents(self.parent.path).get(self.id)
+        return FakeDocumentSnapshot(self, copy.deepcopy(data))
+
+    def set(self, document_data: Dict[str, Any], merge: bool = False) -> None:
+        self._client._commit([("set", self, document_data, merge)])
+
+    def create(self, document_data: Dict[str, Any]) -> None:
+        self._client._commit([("create", self, document_data, False)])
+
+    def update(self, field_updates: Dict[str, Any]) -> None:
+        self._client._commit([("update", self, field_updates, True)])
+
+    def delete(self) -> None:
+        self._client._commit([("delete", self, None, False)])
+
+    def on_snapshot(self, callback) -> "FakeWatch":
+        def current() -> List[FakeDocumentSnapshot]:
+            data = self._client._documents(self.parent.path).get(self.id)
+            return [FakeDocumentSnapshot(self, copy.deepcopy(data))] if data is not None else []
+        return FakeWatch(self._client, self.parent.path, current, callback)
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, FakeDocumentReference) and other.path == self.path
+
+    def __hash__(self) -> int:
+        return hash(self.path)
+
+
+class FakeQuery:
+    def __init__(self, client: "FakeFirestore", path: str):
+        self._client = client
+        self._path = path
+        self._filters: List[Tuple[str, str, Any]] = []
+        self._orders: List[Tuple[str, str]] = []
+        self._limit: Optional[int] = None
+        self._offset = 0
+        self._projection: Optional[List[str]] = None
+        self._start: Optional[Tuple[Any, bool]] = None
+        self._end: Optional[Tuple[Any, bool]] = None
+
+    def _copy(self) -> "FakeQuery":
+        query = copy.copy(self)
+        query._filters = list(self._filters)
+        query._orders = list(self._orders)
+        return query
+
+    def where(self, field_path: Optional[str] = None, op_string: Optional[str] = None,
+              value: Any = None, *, filter: Optional[FieldFilter] = None) -> "FakeQuery":
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        query = self._copy()
+        query._filters.append((field_path, op_string, value))
+        return query
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING") -> "FakeQuery":
+        query = self._copy()
+        query._orders.append((field_path, direction))
+        return query
+
+    def limit(self, count: int) -> "FakeQuery":
+        query = self._copy()
+        query._limit = count
+        return query
+
+    def offset(self, num_to_skip: int) -> "FakeQuery":
+        query = self._copy()
+        query._offset = num_to_skip
+        return query
+
+    def select(self, field_paths: List[str]) -> "FakeQuery":
+        query = self._copy()
+        query._projection = list(field_paths)
+        return query
+
+    def start_at(self, document_fields_or_snapshot: Any) -> "FakeQuery":
+        return self._cursor("_start", document_fields_or_snapshot, True)
+
+    def start_after(self, document_fields_or_snapshot: Any) -> "FakeQuery":
+        return self._cursor("_start", document_fields_or_snapshot, False)
+
+    def end_at(self, document_fields_or_snapshot: Any) -> "FakeQuery":
+        return self._cursor("_end", document_fields_or_snapshot, True)
+
+    def end_before(self, document_fields_or_snapshot: Any) -> "FakeQuery":
+        return self._cursor("_end", document_fields_or_snapshot, False)
+
+    def _cursor(self, attribute: str, cursor: Any, inclusive: bool) -> "FakeQuery":
+        query = self._copy()
+        setattr(query, attribute, (cursor, inclusive))
+        return query
+
+    def _order_key(self, doc_id: str, data: Dict[str, Any]) -> Tuple:
+        key = []
+        for field, _ in self._orders:
+            if field == "__name__":
+                key.append(_sort_key(doc_id))
+            else:
+                try:
+                    key.append(_sort_key(_get_field(data, field)))
+                except KeyError:
+                    key.append(_sort_key(None))
+        key.append(_sort_key(doc_id))
+        return tuple(key)
+
+    def _cursor_key(self, cursor: Any) -> Tuple:
+        if isinstance(cursor, FakeDocumentSnapshot):
+            return self._order_key(cursor.id, cursor._data or {})
+        return tuple(
+            _sort_key(cursor[field].id if field == "__name__" else cursor.get(field))
+            for field, _ in self._orders
+        )
+
+    def on_snapshot(self, callback) -> "FakeWatch":
+        return FakeWatch(self._client, self._path, self._matching, callback)
+
+    def _run(self) -> List[FakeDocumentSnapshot]:
+        snapshots = self._matching()
+        self._client._round_trip()
+        self._client.ops["queries"] += 1
+        self._client.ops["documents_read"] += max(len(snapshots), 1)
+        return snapshots
+
+    def _matching(self) -> List[FakeDocumentSnapshot]:
+        documents = self._client._documents(self._path)
+        rows = [
+            (doc_id, data) for doc_id, data in documents.items()
+            if all(_matches(data, f, op, v) for f, op, v in self._filters)
+        ]
+        # Firestore excludes documents missing an order_by field
+        for field, _ in self._orders:
+            if field != "__name__":
+                rows = [(i, d) for i, d in rows if self._has_field(d, field)]
+
+        # Sort by each order field (last first), keeping the ID as tiebreaker
+        rows.sort(key=lambda row: _sort_key(row[0]))
+        for field, direction in reversed(self._orders):
+            rows.sort(
+                key=lambda row: _sort_key(row[0]) if field == "__name__" else self._field_key(row[1], field),
+                reverse=direction == "DESCENDING"
+            )
+
+        if self._start is not None or self._end is not None:
+            rows = [row for row in rows if self._within_cursors(row)]
+
+        rows = rows[self._offset:]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+
+        collection = FakeCollectionReference(self._client, self._path)
+        return [
+            FakeDocumentSnapshot(collection.document(doc_id), self._project(data))
+            for doc_id, data in rows
+        ]
+
+    @staticmethod
+    def _has_field(data: Dict[str, Any], field: str) -> bool:
+        try:
+            _get_field(data, field)
+            return True
+        except KeyError:
+            return False
+
+    @staticmethod
+    def _field_key(data: Dict[str, Any], field: str) -> Tuple[int, Any]:
+        return _sort_key(_get_field(data, field))
+
+    def _within_cursors(self, row: Tuple[str, Dict[str, Any]]) -> bool:
+        key = self._order_key(*row)
+        if self._start is not None:
+            cursor, inclusive = self._start
+            compared = self._compare(key, self._cursor_key(cursor))
+            if compared < 0 or (compared == 0 and not inclusive):
+                return False
+        if self._end is not None:
+            cursor, inclusive = self._end
+            compared = self._compare(key, self._cursor_key(cursor))
+            if compared > 0 or (compared == 0 and not inclusive):
+                return False
+        return True
+
+    def _compare(self, key: Tuple, bound: Tuple) -> int:
+        """Compare a row key with a cursor in query order (direction of the first order_by)."""
+        key = key[:len(bound)]
+        result = (key > bound) - (key < bound)
+        descending = bool(self._orders) and self._orders[0][1] == "DESCENDING"
+        return -result if descending else result
+
+    def _project(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        if self._projection is None:
+            return copy.deepcopy(data)
+        projected: Dict[str, Any] = {}
+        for field in self._projection:
+            if self._has_field(data, field):
+                projected[field] = copy.deepcopy(_get_field(data, field))
+        return projected
+
+    def stream(self, transaction=None) -> Iterator[FakeDocumentSnapshot]:
+        return iter(self._run())
+
+    def get(self, transaction=None) -> List[FakeDocumentSnapshot]:
+        return self._run()
+
+
+class FakeCollectionReference(FakeQuery):
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def id(self) -> str:
+        return self._path.rsplit("/", 1)[-1]
+
+    def document(self, document_id: Optional[str] = None) -> FakeDocumentReference:
+        if document_id is None:
+            document_id = self._client._auto_id()
+        return FakeDocumentReference(self._client, f"{self._path}/{document_id}")
+
+    def add(self, document_data: Dict[str, Any]) -> Tuple[datetime, FakeDocumentReference]:
+        ref = self.document()
+        ref.set(document_data)
+        return datetime.utcnow(), ref
+
+    def list_documents(self) -> List[FakeDocumentReference]:
+        return [self.document(doc_id) for doc_id in self._client._documents(self._path)]
+
+
+class FakeQueryPartition:
+    def __init__(self, query: "FakeCollectionGroup", start_at: Optional[FakeDocumentReference],
+                 end_at: Optional[FakeDocumentReference]):
+        self._query = query
+        self.start_at = start_at
+        self.end_at = end_at
+
+    def query(self) -> FakeQuery:
+        query = self._query.order_by("__name__")
+        if self.start_at is not None:
+            query = query.start_at({"__name__": self.start_at})
+        if self.end_at is not None:
+            query = query.end_before({"__name__": self.end_at})
+        return query
+
+
+class FakeCollectionGroup(FakeQuery):
+    """Collection group query; only top-level collections exist in the fake."""
+
+    def get_partitions(self, partition_count: int) -> Iterator[FakeQueryPartition]:
+        self._client._round_trip()
+        self._client.ops["queries"] += 1
+        doc_ids = sorted(self._client._documents(self._path), key=_sort_key)
+        collection = FakeCollectionReference(self._client, self._path)
+        step = max(1, -(-len(doc_ids) // partition_count))
+        start_at = None
+        for index in range(step, len(doc_ids), step):
+            end_at = collection.document(doc_ids[index])
+            yield FakeQueryPartition(self, start_at, end_at)
+            start_at = end_at
+        yield FakeQueryPartition(self, start_at, None)
+
+
+class FakeWatch:
+    """Snapshot listener calling back with the changes of every commit to its collection.
+
+    Like the real listener, the first callback delivers the current documents
+    as ADDED. Every delivered change is counted as a document read.
+    """
+
+    def __init__(self, client: "FakeFirestore", path: str, current, callback):
+        self._client = client
+        self._path = path
+        self._current = current
+        self._callback = callback
+        self._documents: Dict[str, FakeDocumentSnapshot] = {}
+        client._watches.append(self)
+        self._notify(initial=True)
+
+    def unsubscribe(self) -> None:
+        if self in self._client._watches:
+            self._client._watches.remove(self)
+
+    def _notify(self, initial: bool = False) -> None:
+        current = {snapshot.id: snapshot for snapshot in self._current()}
+        changes = []
+        for index, (doc_id, snapshot) in enumerate(current.items()):
+            previous = self._documents.get(doc_id)
+            if previous is None:
+                changes.append(DocumentChange(ChangeType.ADDED, snapshot, -1, index))
+            elif previous._data != snapshot._data:
+                changes.append(DocumentChange(ChangeType.MODIFIED, snapshot, index, index))
+        for doc_id, previous in self._documents.items():
+            if doc_id not in current:
+                changes.append(DocumentChange(ChangeType.REMOVED, previous, -1, -1))
+        self._documents = current
+        if changes or initial:
+            self._client.ops["listener_reads"] += len(changes)
+            self._callback(list(current.values()), changes, datetime.now(timezone.utc))
+
+
+class FakeWriteBatch:
+    def __init__(self, client: "FakeFirestore"):
+        self._client = client
+        self._writes: List[Tuple[str, FakeDocumentReference, Any, bool]] = []
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+    def set(self, reference: FakeDocumentReference, document_data: Dict[str, Any], merge: bool = False) -> None:
+        self._writes.append(("set", reference, document_data, merge))
+
+    def create(self, reference: FakeDocumentReference, document_data: Dict[str, Any]) -> None:
+        self._writes.append(("create", reference, document_data, False))
+
+    def update(self, reference: FakeDocumentReference, field_updates: Dict[str, Any]) -> None:
+        self._writes.append(("update", reference, field_updates, True))
+
+    def delete(self, reference: FakeDocumentReference) -> None:
+        self._writes.append(("delete", reference, None, False))
+
+    def commit(self) -> List[None]:
+        writes, self._writes = self._writes, []
+        self._client._commit(writes)
+        return [None] * len(writes)
+
+
+class FakeBulkWriter(FakeWriteBatch):
+    """Applies writes in batches of MAX_WRITES_PER_COMMIT on flush/close."""
+
+    def __init__(self, client: "FakeFirestore", options: Any = None):
+        super().__init__(client)
+        self._on_write_error = None
+
+    def on_write_error(self, callback) -> None:
+        # Fake writes don't fail
+        self._on_write_error = callback
+
+    def _maybe_flush(self) -> None:
+        if len(self._writes) >= MAX_WRITES_PER_COMMIT:
+            self.flush()
+
+    def set(self, *args, **kwargs) -> None:
+        super().set(*args, **kwargs)
+        self._maybe_flush()
+
+    def create(self, *args, **kwargs) -> None:
+        super().create(*args, **kwargs)
+        self._maybe_flush()
+
+    def update(self, *args, **kwargs) -> None:
+        super().update(*args, **kwargs)
+        self._maybe_flush()
+
+    def delete(self, *args, **kwargs) -> None:
+        super().delete(*args, **kwargs)
+        self._maybe_flush()
+
+    def flush(self) -> None:
+        if self._writes:
+            self.commit()
+
+    def close(self) -> None:
+        self.flush()
+
+
+class FakeTransaction(FakeWriteBatch):
+    """Buffers writes until commit; implements the hooks firestore.transactional calls."""
+
+    def __init__(self, client: "FakeFirestore", max_attempts: int = 5, read_only: bool = False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id: Optional[bytes] = None
+
+    @property
+    def in_progress(self) -> bool:
+        return self._id is not None
+
+    def _clean_up(self) -> None:
+        self._writes = []
+        self._id = None
+
+    def _begin(self, retry_id: Optional[bytes] = None) -> None:
+        self._client.ops["transactions"] += 1
+        self._id = self._client._auto_id().encode()
+
+    def _commit(self) -> List[None]:
+        result = self.commit()
+        self._clean_up()
+        return result
+
+    def _rollback(self) -> None:
+        self._clean_up()
+
+    def get(self, ref_or_query: Union[FakeDocumentReference, FakeQuery]):
+        if isinstance(ref_or_query, FakeDocumentReference):
+            return iter([ref_or_query.get(transaction=self)])
+        return ref_or_query.stream(transaction=self)
+
+    def get_all(self, references: List[FakeDocumentReference]):
+        return self._client.get_all(references, transaction=self)
+
+
+class FakeFirestore:
+    """In-memory Firestore client counting reads, queries, writes and commits.
+
+    Args:
+        seed: Seed of the auto-ID generator
+        rpc_latency: Seconds every read, query and commit blocks the calling
+            thread, to simulate the network round trip of the real client
+    """
+
+    def __init__(self, seed: int = 0, rpc_latency: float = 0.0):
+        self._store: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._rng = random.Random(seed)
+        self.rpc_latency = rpc_latency
+        self.ops: Counter = Counter()
+        self._watches: List[FakeWatch] = []
+
+    def collection(self, collection_path: str) -> FakeCollectionReference:
+        return FakeCollectionReference(self, collection_path)
+
+    def document(self, document_path: str) -> FakeDocumentReference:
+        return FakeDocumentReference(self, document_path)
+
+    def collection_group(self, collection_id: str) -> FakeCollectionGroup:
+        return FakeCollectionGroup(self, collection_id)
+
+    def collections(self) -> List[FakeCollectionReference]:
+        """Top-level collections holding at least one document."""
+        return [
+            FakeCollectionReference(self, path) for path, documents in self._store.items()
+            if "/" not in path and documents
+        ]
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    def bulk_writer(self, options: Any = None) -> FakeBulkWriter:
+        return FakeBulkWriter(self, options)
+
+    def transaction(self, max_attempts: int = 5, read_only: bool = False) -> FakeTransaction:
+        return FakeTransaction(self, max_attempts, read_only)
+
+    def get_all(self, references, field_paths: Optional[List[str]] = None, transaction=None):
+        references = list(references)
+        self._round_trip()
+        self.ops["batch_gets"] += 1
+        self.ops["documents_read"] += len(references)
+        for ref in references:
+            data = self._documents(ref.parent.path).get(ref.id)
+            yield FakeDocumentSnapshot(ref, copy.deepcopy(data))
+
+    def reset_ops(self) -> Dict[str, int]:
+        """Return the operation counts so far and start counting from zero."""
+        ops, self.ops = dict(self.ops), Counter()
+        return ops
+
+    def document_count(self, collection_path: str) -> int:
+        return len(self._documents(collection_path))
+
+    def _documents(self, collection_path: str) -> Dict[str, Dict[str, Any]]:
+        return self._store.setdefault(collection_path, {})
+
+    def _round_trip(self) -> None:
+        if self.rpc_latency:
+            time.sleep(self.rpc_latency)
+
+    def _auto_id(self) -> str:
+        return "".join(self._rng.choice(_ID_ALPHABET) for _ in range(20))
+
+    def _commit(self, writes: List[Tuple[str, FakeDocumentReference, Any, bool]]) -> None:
+        if len(writes) > MAX_WRITES_PER_COMMIT:
+            raise ValueError(f"A commit may contain at most {MAX_WRITES_PER_COMMIT} writes, got {len(writes)}")
+
+        # Validate everything first so a failing write leaves the store untouched
+        staged: Dict[str, Optional[Dict[str, Any]]] = {}
+        for kind, ref, data, merge in writes:
+            current = staged[ref.path] if ref.path in staged else self._documents(ref.parent.path).get(ref.id)
+            if kind == "create" and current is not None:
+                raise AlreadyExists(f"Document already exists: {ref.path}")
+            if kind == "update" and current is None:
+                raise NotFound(f"No document to update: {ref.path}")
+            staged[ref.path] = None if kind == "delete" else _apply_write(current, data, merge)
+
+        for path, data in staged.items():
+            collection_path, doc_id = path.rsplit("/", 1)
+            if data is None:
+                self._documents(collection_path).pop(doc_id, None)
+            else:
+                self._documents(collection_path)[doc_id] = data
+
+        self._round_trip()
+        self.ops["commits"] += 1
+        self.ops["writes"] += len(writes)
+
+        touched = {path.rsplit("/", 1)[0] for path in staged}
+        for watch in list(self._watches):
+            if watch._path in touched:
+                watch._notify()
@@ -0,0 +1,41 @@
+"""The API routers served from a seeded FakeFirestore, for running under a real server.
+
+    BENCH_RPC_LATENCY_MS=20 gunicorn -c gunicorn.conf.py benchmarks.fake_server:app
+
+The dataset is generated at import. With preload_app the master seeds it
+once and every worker gets a copy-on-write copy; writes stay local to the
+worker that made them. Settings come from the environment:
+
+    BENCH_USERS, BENCH_YEARS, BENCH_TRANSACTIONS_PER_MONTH  dataset size
+    BENCH_RPC_LATENCY_MS  time every Firestore call blocks, as a network RPC would
+    BENCH_SEED            seed of the dataset
+    BENCH_RATE_LIMIT      "true" to add RateLimitMiddleware with its default limits
+    BENCH_ADMISSION_MAX_CONCURRENCY  its admission control concurrency limit
+"""
+import contextlib
+import os
+
+from benchmarks.data import generate_dataset
+from benchmarks.fake_firestore import FakeFirestore
+from benchmarks.harness import build_app, use_firestore_client
+from rate_limit import AdmissionController
+
+USERS = int(os.getenv("BENCH_USERS", "2"))
+YEARS = int(os.getenv("BENCH_YEARS", "2"))
+TRANSACTIONS_PER_MONTH = int(os.getenv("BENCH_TRANSACTIONS_PER_MONTH", "300"))
+SEED = int(os.getenv("BENCH_SEED", "42"))
+
+db = FakeFirestore(seed=SEED)
+# Kept open for the life of the process
+_patches = contextlib.ExitStack()
+_patches.enter_context(use_firestore_client(db))
+
+dataset = generate_dataset(db, users=USERS, years=YEARS, transactions_per_month=TRANSACTIONS_PER_MONTH, seed=SEED)
+db.reset_ops()
+# Only requests pay the simulated latency, not seeding
+db.rpc_latency = float(os.getenv("BENCH_RPC_LATENCY_MS", "0")) / 1000
+
+rate_limit = None
+if os.getenv("BENCH_RATE_LIMIT", "false").lower() == "true":
+    rate_limit = {"admission": AdmissionController(int(os.getenv("BENCH_ADMISSION_MAX_CONCURRENCY", "64")))}
+app = build_app(db, rate_limit=rate_limit)
@@ -0,0 +1,86 @@
+"""Wiring that runs services and the FastAPI routers on a FakeFirestore."""
+import contextlib
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional
+from unittest import mock
+
+from fastapi import FastAPI
+from firebase_admin import auth, firestore
+
+import firebase_app
+
+# Directory the load profile and the emulator harness write results to
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+@contextlib.contextmanager
+def use_firestore_client(db: Any) -> Iterator[Any]:
+    """Make firestore.client() return db (a FakeFirestore or an emulator client) and accept any bearer token.
+
+    The token itself is used as the user ID, so requests authenticate as a
+    generated user with `Authorization: Bearer user-0`.
+    """
+    with mock.patch.object(firebase_app, "initialize_firebase", lambda: None), \
+            mock.patch.object(firestore, "client", lambda *args, **kwargs: db), \
+            mock.patch.object(auth, "verify_id_token", lambda token, *args, **kwargs: {"uid": token}):
+        yield db
+
+
+def build_app(db: Any, rate_limit: Optional[Dict[str, Any]] = None) -> FastAPI:
+    """Build an app with the API routers and the middleware of main.create_app(), served from db.
+
+    main.create_app() isn't used so the app stays limited to the routers
+    being measured. Call it inside use_firestore_client(db), which is how the
+    routers' get_db() resolves to db.
+
+    Rate limiting is off unless rate_limit, the RateLimitMiddleware
+    arguments, is given: load profiles drive a few users far above the
+    per-user limits.
+    """
+    from compression import CompressionMiddleware
+    from idempotency import IdempotencyMiddleware
+    from metrics import MetricsMiddleware
+    from rate_limit import RateLimitMiddleware
+    from routers import analytics, batch, categories, changes, events, jobs, reports, transactions, users
+
+    app = FastAPI()
+    app.add_middleware(IdempotencyMiddleware, db_provider=lambda: db)
+    if rate_limit is not None:
+        app.add_middleware(RateLimitMiddleware, **rate_limit)
+    app.add_middleware(MetricsMiddleware)
+    app.add_middleware(CompressionMiddleware)
+    for module in (users, transactions, categories, reports, analytics, events, changes, batch, jobs):
+        app.include_router(module.router)
+    return app
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_results(name: str, results: Dict[str, Any]) -> str:
+    """Write results to benchmarks/results/<name>-<revision>.json with run metadata.
+
+    Returns:
+        str: Path of the written file
+    """
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    revision = git_revision()
+    path = os.path.join(RESULTS_DIR, f"{name}-{revision}.json")
+    payload = {
+        "name": name,
+        "revision": revision,
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "results": results,
+    }
+    with open(path, "w") as file:
+        json.dump(payload, file, indent=2, default=str)
+    return path
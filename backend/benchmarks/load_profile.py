@@ -0,0 +1,144 @@
+"""HTTP load profile against the FastAPI app.
+
+By default the app runs in-process on a FakeFirestore seeded by
+generate_dataset(), so the numbers measure the API layer (routing,
+validation, services, serialization) without network or Firestore latency.
+Pass --base-url to drive a running server instead; the generated user IDs
+are then sent as bearer tokens and must be valid there.
+
+Run from the backend directory:
+
+    python -m benchmarks.load_profile --concurrency 20 --duration 30
+
+Results (latency percentiles per endpoint, Firestore operations) are
+printed and saved to benchmarks/results/load_profile-<revision>.json.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.data import generate_dataset
+from benchmarks.fake_firestore import FakeFirestore
+from benchmarks.harness import build_app, save_results, use_firestore_client
+
+# (weight, endpoint name, path template) of the request mix
+PROFILE = [
+    (40, "monthly_report", "/api/budgets/{budget_id}/reports/monthly/{month}?include_transactions=false"),
+    (20, "monthly_report_full", "/api/budgets/{budget_id}/reports/monthly/{month}"),
+    (15, "transactions", "/api/budgets/{budget_id}/transactions?start_date={month}-01T00:00:00"),
+    (10, "range_report", "/api/budgets/{budget_id}/reports/range?from=2024-01&to=2024-12"),
+    (15, "income_expense", "/api/budgets/{budget_id}/analytics/income-expense"),
+]
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def worker(
+    client: httpx.AsyncClient,
+    budgets: List[Tuple[str, str]],
+    deadline: float,
+    rng: random.Random,
+    latencies: Dict[str, List[float]],
+    errors: Dict[str, int]
+) -> None:
+    weights = [weight for weight, _, _ in PROFILE]
+    while time.perf_counter() < deadline:
+        _, name, template = rng.choices(PROFILE, weights=weights)[0]
+        user_id, budget_id = rng.choice(budgets)
+        path = template.format(user_id=user_id, budget_id=budget_id, month=f"2024-{rng.randint(1, 12):02d}")
+
+        start = time.perf_counter()
+        response = await client.get(path, headers={"Authorization": f"Bearer {user_id}"})
+        latencies[name].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            errors[name] += 1
+
+
+async def run_profile(
+    concurrency: int,
+    duration: float,
+    base_url: Optional[str],
+    db: Optional[FakeFirestore],
+    budgets: List[Tuple[str, str]],
+    seed: int
+) -> Dict:
+    if base_url:
+        client = httpx.AsyncClient(base_url=base_url, timeout=30)
+    else:
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=build_app(db)), base_url="http://bench")
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    started = time.perf_counter()
+    async with client:
+        await asyncio.gather(*(
+            worker(client, budgets, started + duration, random.Random(seed + i), latencies, errors)
+            for i in range(concurrency)
+        ))
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(values) for values in latencies.values())
+    endpoints = {
+        name: {
+            "requests": len(values),
+            "errors": errors[name],
+            "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+            "mean_ms": round(statistics.mean(values) * 1000, 2),
+        }
+        for name, values in sorted(latencies.items())
+    }
+    return {
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 1),
+        "endpoints": endpoints,
+        "firestore_ops": dict(db.ops) if db is not None else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP load profile")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run")
+    parser.add_argument("--users", type=int, default=2, help="Generated users")
+    parser.add_argument("--years", type=int, default=2, help="Years of transactions per budget")
+    parser.add_argument("--transactions-per-month", type=int, default=300)
+    parser.add_argument("--base-url", help="Target a running server instead of the in-process app")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    db = FakeFirestore(seed=args.seed)
+    with use_firestore_client(db):
+        dataset = generate_dataset(
+            db, users=args.users, years=args.years,
+            transactions_per_month=args.transactions_per_month, seed=args.seed
+        )
+        db.reset_ops()
+        budgets = [(user_id, budget_id) for budget_id, user_id in dataset.budget_owners.items()]
+        results = asyncio.run(run_profile(
+            args.concurrency, args.duration, args.base_url,
+            None if args.base_url else db, budgets, args.seed
+        ))
+
+    path = save_results("load_profile", results)
+    for name, stats in results["endpoints"].items():
+        print(f"{name:22} {stats['requests']:6} req  p50 {stats['p50_ms']:8} ms  "
+              f"p95 {stats['p95_ms']:8} ms  p99 {stats['p99_ms']:8} ms  errors {stats['errors']}")
+    print(f"{results['requests']} requests, {results['throughput_rps']} req/s, saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
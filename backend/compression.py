@@ -0,0 +1,133 @@
+"""Response compression negotiated with Accept-Encoding.
+
+Brotli is preferred over gzip when the client accepts both: at quality 4
+it is 5-15% smaller on JSON list payloads and no slower (see
+benchmarks/bench_wire_formats.py).
+Responses below `minimum_size` are sent as they are, since headers and
+framing outweigh the savings. Streaming responses are compressed chunk by
+chunk and flushed after every chunk, so NDJSON and similar streams still
+reach the client as they are produced. Server-Sent Events are never
+compressed; proxies and browsers buffer compressed event streams.
+"""
+import zlib
+from typing import Iterable, Optional
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+
+from responses import parse_qvalues
+
+# Responses smaller than this many bytes aren't compressed
+DEFAULT_MINIMUM_SIZE = 1024
+GZIP_LEVEL = 6
+# Brotli's default of 11 is an order of magnitude slower for a few percent less
+BROTLI_QUALITY = 4
+EXCLUDED_MEDIA_TYPES = ("text/event-stream",)
+
+
+def select_encoding(accept_encoding: str) -> Optional[str]:
+    """The encoding to use for an Accept-Encoding header, "br", "gzip" or None."""
+    accepted = parse_qvalues(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    candidates = [(accepted.get(coding, wildcard), coding) for coding in ("br", "gzip")]
+    q, coding = max(candidates, key=lambda candidate: candidate[0])
+    return coding if q > 0 else None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._gzip = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data: bytes) -> bytes:
+        """Compress data and flush it, so it can be decoded without what follows."""
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._gzip.compress(data) + self._gzip.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._gzip.compress(data) + self._gzip.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses with brotli or gzip.
+
+    Add it outside any middleware that stores response bodies, such as
+    IdempotencyMiddleware, so those keep the uncompressed body.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = DEFAULT_MINIMUM_SIZE,
+        excluded_media_types: Iterable[str] = EXCLUDED_MEDIA_TYPES
+    ):
+        """
+        Args:
+            app: ASGI application
+            minimum_size: Smallest response body, in bytes, that is compressed
+            excluded_media_types: Content types never compressed
+        """
+        self.app = app
+        self.minimum_size = minimum_size
+        self.excluded_media_types = tuple(excluded_media_types)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = select_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message.get("headers", []))
+                media_type = headers.get("content-type", "").split(";")[0].strip()
+                if "content-encoding" in headers or media_type in self.excluded_media_types:
+                    passthrough = True
+                    await send(message)
+                else:
+                    # Held back until the first body chunk shows whether to compress
+                    start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start_message is not None:
+                headers = MutableHeaders(scope=start_message)
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding)
+                body = compressor.chunk(body) if more_body else compressor.finish(body)
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(body))
+                await send(start_message)
+                start_message = None
+            else:
+                body = compressor.chunk(body) if more_body else compressor.finish(body)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,39 @@
+import functools
+import json
+import os
+from dataclasses import dataclass
+from typing import FrozenSet, Optional
+
+# Directory of this file, so data files resolve regardless of the working directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Application settings, read once from the environment.
+
+    Attributes:
+        firebase_credentials_path: Service account JSON file. When unset,
+            Application Default Credentials are used.
+        firebase_project_id: Firebase / Google Cloud project ID
+        currency_file: JSON list of valid ISO 4217 currency codes
+    """
+    firebase_credentials_path: Optional[str]
+    firebase_project_id: str
+    currency_file: str
+
+
+@functools.lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    return Settings(
+        firebase_credentials_path=os.getenv("FIREBASE_CREDENTIALS_PATH") or None,
+        firebase_project_id=os.getenv("FIREBASE_PROJECT_ID", "budgetapp-449511"),
+        currency_file=os.getenv("CURRENCY_FILE", os.path.join(BASE_DIR, "data", "valid_currencies.json")),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_valid_currencies() -> FrozenSet[str]:
+    """Valid currency codes, loaded from the currency file on first use."""
+    with open(get_settings().currency_file, "r") as file:
+        return frozenset(json.load(file))
@@ -0,0 +1,209 @@
+"""Transaction fingerprints and the index duplicates are checked against.
+
+A transaction has two 64-bit fingerprints: one of its date, amount and
+normalized payee, and one of the bank's ID of the transaction, when the
+statement provides one. A new transaction is an exact duplicate of an
+indexed one sharing either fingerprint, and a possible duplicate of one
+with the same amount dated at most DATE_WINDOW_DAYS apart, which catches a
+bank posting a manually entered transaction a few days later under
+another payee name.
+
+`FingerprintIndex` keeps its entries in a NumPy structured array sorted by
+(amount, day), ENTRY_DTYPE.itemsize bytes per transaction, which is also
+how it is stored. Exact matches are dict lookups, O(1) per checked
+transaction; possible duplicates are found with one vectorized binary
+search of all checked transactions over the sorted entries.
+"""
+import hashlib
+import re
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence
+import numpy as np
+
+# Possible duplicates are dated at most this many days apart
+DATE_WINDOW_DAYS = 3
+# Bank fingerprint of transactions without a bank ID
+NO_BANK_ID = 0
+
+ENTRY_DTYPE = np.dtype([
+    ("amount", "<i8"),  # Cents
+    ("day", "<i4"),  # Days since 1970-01-01, UTC
+    ("fingerprint", "<u8"),
+    ("bank_fingerprint", "<u8"),
+])
+# Sort key amount * _DAY_SPAN + day orders entries by amount, then day
+_DAY_SPAN = 1 << 20
+_SEPARATORS = re.compile(r"[\W_]+")
+
+
+class DuplicateMatch(NamedTuple):
+    transaction_id: str  # The indexed transaction matched
+    exact: bool  # Same bank ID, or same date, amount and payee; else a possible duplicate
+
+
+def normalize_payee(payee: Optional[str]) -> str:
+    """Case-folded words of a payee, without punctuation or words containing digits.
+
+    Card numbers, store numbers and references vary between statements of
+    the same transaction, e.g. "AMAZON MKTPLACE*2K4 8RT" and "Amazon Mktplace"
+    both normalize to "amazon mktplace".
+    """
+    if not payee:
+        return ""
+    words = _SEPARATORS.split(payee.casefold())
+    return " ".join(word for word in words if word and not any(c.isdigit() for c in word))
+
+
+def day_number(value: datetime) -> int:
+    """Days since 1970-01-01 of a datetime's UTC date, treating naive values as UTC."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.toordinal() - 719163
+
+
+def _hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+
+
+def fingerprint(day: int, amount: int, payee: Optional[str]) -> int:
+    return _hash(f"{day}|{amount}|{normalize_payee(payee)}")
+
+
+def bank_fingerprint(bank_id: Optional[str]) -> int:
+    return _hash(f"bank|{bank_id}") if bank_id else NO_BANK_ID
+
+
+def build_entries(
+    dates: Sequence[datetime],
+    amounts: Sequence[int],
+    payees: Sequence[Optional[str]],
+    bank_ids: Sequence[Optional[str]]
+) -> np.ndarray:
+    """Index entries of transactions given column by column, in input order."""
+    entries = np.empty(len(dates), dtype=ENTRY_DTYPE)
+    for row, (date, amount, payee, bank_id) in enumerate(zip(dates, amounts, payees, bank_ids)):
+        day = day_number(date)
+        entries[row] = (amount, day, fingerprint(day, amount, payee), bank_fingerprint(bank_id))
+    return entries
+
+
+def _keys(entries: np.ndarray) -> np.ndarray:
+    return entries["amount"] * _DAY_SPAN + entries["day"]
+
+
+class FingerprintIndex:
+    """Fingerprints of a set of transactions, with their IDs."""
+
+    def __init__(self, entries: Optional[np.ndarray] = None, ids: Optional[List[str]] = None):
+        entries = np.empty(0, dtype=ENTRY_DTYPE) if entries is None else entries
+        ids = ids or []
+        order = np.argsort(_keys(entries), kind="stable")
+        self.entries = entries[order]
+        self.ids = [ids[row] for row in order]
+        self._keys = _keys(self.entries)
+        self._by_fingerprint: Optional[Dict[int, List[int]]] = None
+        self._by_bank_fingerprint: Optional[Dict[int, List[int]]] = None
+        self._banks: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def merge(cls, indexes: Iterable["FingerprintIndex"]) -> "FingerprintIndex":
+        indexes = list(indexes)
+        if not indexes:
+            return cls()
+        return cls(
+            np.concatenate([index.entries for index in indexes]),
+            [transaction_id for index in indexes for transaction_id in index.ids]
+        )
+
+    @classmethod
+    def unpack(cls, data: bytes, ids: List[str]) -> "FingerprintIndex":
+        return cls(np.frombuffer(data, dtype=ENTRY_DTYPE).copy(), ids)
+
+    def pack(self) -> bytes:
+        return self.entries.tobytes()
+
+    def add(self, entries: np.ndarray, ids: List[str]) -> "FingerprintIndex":
+        """A new index holding these entries too; an ID already indexed is replaced."""
+        replaced = set(ids)
+        keep = [row for row, transaction_id in enumerate(self.ids) if transaction_id not in replaced]
+        return FingerprintIndex(
+            np.concatenate([self.entries[keep], entries]),
+            [self.ids[row] for row in keep] + list(ids)
+        )
+
+    def find_duplicates(
+        self, entries: np.ndarray, ignore_prefix: Optional[str] = None
+    ) -> List[Optional[DuplicateMatch]]:
+        """Match each entry to an indexed transaction it likely duplicates.
+
+        An indexed transaction matches at most one entry, so a statement
+        listing two identical coffees flags two entries only if two such
+        coffees are indexed. Exact matches are assigned before possible
+        duplicates, and a possible duplicate goes to the closest date.
+        Transactions with different bank IDs never match.
+
+        Args:
+            entries: ENTRY_DTYPE entries of the transactions to check
+            ignore_prefix: Indexed IDs starting with this never match, e.g. the
+                transactions an interrupted import already wrote
+
+        Returns:
+            A DuplicateMatch or None per entry, in input order
+        """
+        self._build_lookups()
+        used = set()
+        if ignore_prefix:
+            used.update(row for row, transaction_id in enumerate(self.ids) if transaction_id.startswith(ignore_prefix))
+        matches: List[Optional[DuplicateMatch]] = [None] * len(entries)
+
+        banks = entries["bank_fingerprint"].tolist()
+        for position, (value, bank) in enumerate(zip(entries["fingerprint"].tolist(), banks)):
+            row = None
+            if bank != NO_BANK_ID:
+                row = self._first_unused(self._by_bank_fingerprint.get(bank), used, bank)
+            if row is None:
+                row = self._first_unused(self._by_fingerprint.get(value), used, bank)
+            if row is not None:
+                used.add(row)
+                matches[position] = DuplicateMatch(self.ids[row], True)
+
+        unmatched = np.array([position for position, match in enumerate(matches) if match is None], dtype=np.int64)
+        if len(unmatched) and len(self.ids):
+            keys = _keys(entries[unmatched])
+            starts = np.searchsorted(self._keys, keys - DATE_WINDOW_DAYS, side="left")
+            ends = np.searchsorted(self._keys, keys + DATE_WINDOW_DAYS, side="right")
+            for position, key, start, end in zip(unmatched.tolist(), keys.tolist(), starts.tolist(), ends.tolist()):
+                bank = banks[position]
+                candidates = [row for row in range(start, end) if row not in used and self._compatible(row, bank)]
+                if candidates:
+                    row = min(candidates, key=lambda row: abs(int(self._keys[row]) - int(key)))
+                    used.add(row)
+                    matches[position] = DuplicateMatch(self.ids[row], False)
+        return matches
+
+    def _build_lookups(self) -> None:
+        if self._by_fingerprint is not None:
+            return
+        by_fingerprint: Dict[int, List[int]] = {}
+        by_bank_fingerprint: Dict[int, List[int]] = {}
+        self._banks = self.entries["bank_fingerprint"].tolist()
+        for row, (value, bank_value) in enumerate(zip(self.entries["fingerprint"].tolist(), self._banks)):
+            by_fingerprint.setdefault(value, []).append(row)
+            if bank_value != NO_BANK_ID:
+                by_bank_fingerprint.setdefault(bank_value, []).append(row)
+        self._by_fingerprint = by_fingerprint
+        self._by_bank_fingerprint = by_bank_fingerprint
+
+    def _compatible(self, row: int, bank: int) -> bool:
+        """Transactions with different bank IDs are never duplicates of each other."""
+        indexed = self._banks[row]
+        return bank == NO_BANK_ID or indexed == NO_BANK_ID or indexed == bank
+
+    def _first_unused(self, rows: Optional[List[int]], used: set, bank: int) -> Optional[int]:
+        for row in rows or ():
+            if row not in used and self._compatible(row, bank):
+                return row
+        return None
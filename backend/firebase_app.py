@@ -0,0 +1,44 @@
+import threading
+import firebase_admin
+from firebase_admin import credentials, firestore
+from config import get_settings
+from metrics import instrument_client
+
+_init_lock = threading.Lock()
+
+
+def initialize_firebase() -> firebase_admin.App:
+    """Initialize the default Firebase app once, from the environment settings.
+
+    Called from the application lifespan at startup and on first use of
+    get_firestore_client(), so importing modules never touches credentials.
+
+    Returns:
+        firebase_admin.App: The default app
+    """
+    if firebase_admin._apps:
+        return firebase_admin.get_app()
+    with _init_lock:
+        if firebase_admin._apps:
+            return firebase_admin.get_app()
+        settings = get_settings()
+        if settings.firebase_credentials_path:
+            cred = credentials.Certificate(settings.firebase_credentials_path)
+        else:
+            cred = credentials.ApplicationDefault()
+        return firebase_admin.initialize_app(cred, {
+            "projectId": settings.firebase_project_id,
+        })
+
+
+def get_firestore_client() -> firestore.Client:
+    """Return the shared, instrumented Firestore client, initializing Firebase if needed."""
+    initialize_firebase()
+    return instrument_client(firestore.client())
+
+
+class LazyFirestoreClient:
+    """Module-level stand-in for a Firestore client, resolved on first attribute access."""
+
+    def __getattr__(self, name: str):
+        return getattr(get_firestore_client(), name)
@@ -1,28 +1,13 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_app import LazyFirestoreClient
 from typing import List, Optional, Dict, Any
 from models import User, Budget, Account, Transaction, RecurringTransaction, Currency, CategoryGroup, Category
+from services.category_tree_service import CategoryTreeService
 import logging
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
-
 logger = logging.getLogger(__name__)  # Use a named logger
 
-# Path to your Firebase service account key JSON file
-FIREBASE_CREDENTIALS_PATH = "/Users/lidiafreitas/programming/keys/budgetapp-449511-firebase-adminsdk-fbsvc-80fc508f2e.json"
-
-if not firebase_admin._apps:
-    cred = credentials.Certificate(FIREBASE_CREDENTIALS_PATH)
-    firebase_admin.initialize_app(cred, {
-        "projectId": "budgetapp-449511",
-    })
-
-# Use the correct Firestore database
-db = firestore.client()
+# Resolved on first use, importing this module doesn't initialize Firebase
+db = LazyFirestoreClient()
 
 # # User operations
 # def create_user(user: User) -> None:
@@ -125,7 +110,6 @@ def get_budget(budget_id: str) -> Optional[Dict[str, Any]]:
         
         if budget_ref.exists:
             budget_data = budget_ref.to_dict()
-            logger.debug(f"Found budget data: {budget_data}")
             logger.info(f"Successfully retrieved budget: {budget_id}")
             return budget_data
         else:
@@ -199,7 +183,6 @@ def get_account(account_id: str) -> Optional[Dict[str, Any]]:
         
         if account_ref.exists:
             account_data = account_ref.to_dict()
-            logger.debug(f"Found account data: {account_data}")
             logger.info(f"Successfully retrieved account: {account_id}")
             return account_data
         else:
@@ -245,7 +228,6 @@ def get_transaction(transaction_id: str) -> Optional[Dict[str, Any]]:
         
         if transaction_ref.exists:
             transaction_data = transaction_ref.to_dict()
-            logger.debug(f"Found transaction data: {transaction_data}")
             logger.info(f"Successfully retrieved transaction: {transaction_id}")
             return transaction_data
         else:
@@ -282,7 +264,6 @@ def get_recurring_transaction(recurring_id: str) -> Optional[Dict[str, Any]]:
 def update_currency_rates(currency: Currency) -> None:
     logger.debug(f"Updating currency rates for {currency.currency_code}")
     try:
-        logger.debug(f"Currency data: {currency.dict()}")
         currency_ref = db.collection("currencies").document(currency.currency_code)
         currency_ref.set(currency.dict())
         logger.info(f"Successfully updated currency rates for {currency.currency_code}")
@@ -298,7 +279,6 @@ def get_currency_rate(currency_code: str) -> Optional[Dict[str, Any]]:
         
         if currency_ref.exists:
             currency_data = currency_ref.to_dict()
-            logger.debug(f"Found currency data: {currency_data}")
             logger.info(f"Successfully retrieved currency rate for {currency_code}")
             return currency_data
         else:
@@ -527,6 +507,22 @@ def delete_category(category_id: str) -> None:
         logger.error(f"Error deleting category {category_id}: {e}")
         raise
 
+def get_budget_category_tree(budget_id: str) -> Dict[str, Any]:
+    """
+    Retrieve the category groups of a budget with their categories.
+    
+    Args:
+        budget_id (str): The ID of the budget
+        
+    Returns:
+        Dict[str, Any]: Category tree with ordered groups, each holding its categories
+    """
+    try:
+        return CategoryTreeService(db).get_tree(budget_id)
+    except Exception as e:
+        logger.error(f"Error fetching category tree for budget {budget_id}: {e}")
+        raise
+
 def get_monthly_budget_data(budget_id: str, month: str) -> Dict[str, Any]:
     """
     Get monthly budget data including transactions and category totals.
@@ -570,22 +566,15 @@ def get_monthly_budget_data(budget_id: str, month: str) -> Dict[str, Any]:
             transactions.append(trans_data)
             
             # Calculate totals
+            # The dicts are returned, so sum from them rather than building records
             amount = trans_data.get("amount", 0)
             category_id = trans_data.get("category_id")
             if category_id:
                 category_totals[category_id] = category_totals.get(category_id, 0) + amount
             monthly_total += amount
         
-        # Get category groups and their categories
-        category_groups = get_budget_category_groups(budget_id)
-        groups_with_categories = []
-        
-        for group in category_groups:
-            group_dict = group.dict()
-            # Get categories for this group
-            categories = get_group_categories(group.group_id)
-            group_dict['categories'] = [cat.dict() for cat in categories]
-            groups_with_categories.append(group_dict)
+        # Get category groups and their categories from the category tree
+        groups_with_categories = get_budget_category_tree(budget_id)["groups"]
         
         # Structure the response
         response = {
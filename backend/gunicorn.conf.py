@@ -0,0 +1,66 @@
+"""Gunicorn settings for production serving.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+Every setting can be overridden from the environment, see below. Values
+passed on the command line take precedence over this file.
+"""
+import os
+
+
+def _cpu_count() -> int:
+    # Cores this process may run on, which respects container CPU pinning
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# Cloud Run and most platforms pass the port in $PORT
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+
+# Firestore calls are synchronous and block a worker's event loop for the
+# duration of the RPC, so more workers than cores keeps the CPUs busy while
+# some workers wait on the network.
+workers = int(os.getenv("WEB_CONCURRENCY", 2 * _cpu_count() + 1))
+worker_class = "workers.UvicornWorker"
+
+# Import the app once in the master and fork it into the workers. Importing
+# doesn't initialize Firebase; each worker creates its own client and gRPC
+# channel in the app lifespan, after the fork.
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# Keep idle client connections open longer than the load balancer does, so
+# the proxy never reuses a connection the server has just closed
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "75"))
+
+# Seconds a silent worker lives before the master restarts it
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+
+# On SIGTERM, workers stop accepting connections and get this long to finish
+# in-flight requests. Cloud Run kills the container 10 seconds after SIGTERM.
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "8"))
+
+# Recycle workers periodically to bound memory growth; the jitter keeps them
+# from restarting at the same time
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "1000"))
+
+# Heartbeat files on tmpfs; a disk-backed /tmp can stall workers in containers
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+# Trust X-Forwarded-* from the platform's proxy
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "*")
+
+# Request latency is recorded by MetricsMiddleware, no access log needed
+accesslog = os.getenv("GUNICORN_ACCESS_LOG") or None
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+
+
+def post_fork(server, worker):
+    # The log listener thread started while preloading the app doesn't
+    # survive the fork, so every worker starts its own
+    from logger import configure_logging
+
+    configure_logging()
@@ -0,0 +1,322 @@
+"""Idempotency keys for write requests.
+
+Clients send an `Idempotency-Key` header (a UUID per logical operation) on
+POST and PATCH requests and reuse it when retrying. The first request with a
+key runs normally and its response is stored; a retry with the same key and
+the same request gets the stored response replayed, with an
+`Idempotent-Replayed: true` header, without running the route or the
+services again. Only final responses are stored (see STORED_STATUSES);
+after any other the key is released and a retry runs again.
+
+Stored responses live in the `idempotency_keys` collection, keyed by a hash
+of the user and the key, and in an in-process LRU in front of it. Every
+record has an `expires_at` timestamp; enable the Firestore TTL policy on it
+so expired records are deleted:
+
+    gcloud firestore fields ttls update expires_at \
+        --collection-group=idempotency_keys --enable-ttl
+
+TTL deletion can lag by a day, so expiry is also checked on read.
+"""
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from google.api_core.exceptions import AlreadyExists
+from starlette.responses import JSONResponse
+
+from firebase_app import get_firestore_client
+from logger import get_logger
+from request_cache import shared_request_cache
+from utils import verify_token
+
+logger = get_logger(__name__)
+
+COLLECTION = "idempotency_keys"
+IDEMPOTENCY_HEADER = b"idempotency-key"
+REPLAYED_HEADER = b"idempotent-replayed"
+
+# Seconds a key and its stored response are kept
+DEFAULT_TTL = 24 * 3600
+# Seconds an unfinished request holds its key before a retry may take over,
+# e.g. after the worker running it died
+LOCK_TIMEOUT = 60
+MAX_KEY_LENGTH = 255
+# Larger responses aren't stored, Firestore documents are limited to 1 MiB
+MAX_STORED_BODY = 512 * 1024
+# Response headers replayed with the stored body
+STORED_HEADERS = {b"content-type", b"location"}
+# Statuses worth replaying: successes and client errors a retry would only
+# repeat. Anything else releases the key so the retry runs again: server
+# errors, throttling, conflicts and plain 400s, which handle_exceptions
+# returns for every failure, transient Firestore errors included.
+STORED_STATUSES = frozenset(range(200, 300)) | {403, 404, 410, 422}
+
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+
+
+class _ResponseCache:
+    """Thread-safe LRU of completed records, evicting expired entries on read."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, record_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._entries.get(record_id)
+            if record is None:
+                return None
+            if _is_expired(record, datetime.now(timezone.utc)):
+                del self._entries[record_id]
+                return None
+            self._entries.move_to_end(record_id)
+            return record
+
+    def put(self, record_id: str, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[record_id] = record
+            self._entries.move_to_end(record_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+def _is_expired(record: Dict[str, Any], now: datetime) -> bool:
+    expires_at = record.get("expires_at")
+    return expires_at is not None and expires_at <= now
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def request_fingerprint(method: str, path: str, query_string: bytes, body: bytes) -> str:
+    """Hash of everything that makes two requests the same operation."""
+    digest = hashlib.sha256()
+    for part in (method.encode(), path.encode(), query_string, body):
+        digest.update(hashlib.sha256(part).digest())
+    return digest.hexdigest()
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware replaying stored responses for repeated Idempotency-Keys.
+
+    Requests without the header, and methods other than `methods`, pass
+    through untouched. Keys are scoped to the authenticated user, so two
+    users can't collide or read each other's responses. Requests with an
+    invalid token pass through too and are rejected by the route.
+    """
+
+    def __init__(
+        self,
+        app,
+        db_provider: Callable[[], Any] = get_firestore_client,
+        ttl: int = DEFAULT_TTL,
+        methods: Iterable[str] = ("POST", "PATCH"),
+        cache_size: int = 1024
+    ):
+        """
+        Args:
+            app: ASGI application
+            db_provider: Returns the Firestore client storing the keys
+            ttl: Seconds a key and its response are kept
+            methods: HTTP methods that accept an Idempotency-Key
+            cache_size: Completed responses kept in the in-process LRU
+        """
+        self.app = app
+        self.db_provider = db_provider
+        self.ttl = ttl
+        self.methods = set(methods)
+        self.cache = _ResponseCache(cache_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in self.methods:
+            await self.app(scope, receive, send)
+            return
+
+        key = _header(scope, IDEMPOTENCY_HEADER)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > MAX_KEY_LENGTH:
+            response = JSONResponse(
+                {"detail": f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"}, status_code=400
+            )
+            await response(scope, receive, send)
+            return
+
+        # The token verified here is reused by the route
+        with shared_request_cache():
+            await self._handle(key, scope, receive, send)
+
+    async def _handle(self, key: str, scope, receive, send) -> None:
+        user_id = await self._authenticate(scope)
+        if user_id is None:
+            await self.app(scope, receive, send)
+            return
+
+        body = await _read_body(receive)
+        fingerprint = request_fingerprint(scope["method"], scope["path"], scope.get("query_string", b""), body)
+        record_id = hashlib.sha256(f"{user_id}\0{key}".encode()).hexdigest()
+
+        existing = self.cache.get(record_id)
+        if existing is not None:
+            await self._respond_with_record(existing, fingerprint, scope, receive, send)
+            return
+
+        ref = self.db_provider().collection(COLLECTION).document(record_id)
+        existing = await asyncio.to_thread(self._acquire, ref, user_id, fingerprint)
+        if existing is not None:
+            if existing["state"] == COMPLETED:
+                self.cache.put(record_id, existing)
+            await self._respond_with_record(existing, fingerprint, scope, receive, send)
+            return
+
+        capture = _ResponseCapture(send)
+        try:
+            await self.app(scope, _replay_body(body, receive), capture.send)
+        except Exception:
+            await asyncio.to_thread(ref.delete)
+            raise
+
+        if not capture.storable():
+            await asyncio.to_thread(ref.delete)
+            return
+        record = {
+            "user_id": user_id,
+            "fingerprint": fingerprint,
+            "state": COMPLETED,
+            "status": capture.status,
+            "headers": capture.headers,
+            "body": bytes(capture.body),
+            "created_at": datetime.now(timezone.utc),
+            "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.ttl),
+        }
+        try:
+            await asyncio.to_thread(ref.set, record)
+            self.cache.put(record_id, record)
+        except Exception as e:
+            # The response was already sent; a retry will just run again
+            logger.error("Error storing idempotent response: %s", e, extra={"record_id": record_id})
+
+    async def _authenticate(self, scope) -> Optional[str]:
+        authorization = _header(scope, b"authorization") or ""
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return None
+        try:
+            decoded = await asyncio.to_thread(verify_token, token)
+        except Exception:
+            return None
+        return decoded["uid"]
+
+    def _acquire(self, ref, user_id: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Claim the key for this request.
+
+        Returns:
+            None if the key was claimed and the request should run, else the
+            record of the request that already holds it
+        """
+        now = datetime.now(timezone.utc)
+        record = {
+            "user_id": user_id,
+            "fingerprint": fingerprint,
+            "state": IN_PROGRESS,
+            "created_at": now,
+            "locked_until": now + timedelta(seconds=LOCK_TIMEOUT),
+            "expires_at": now + timedelta(seconds=self.ttl),
+        }
+        try:
+            ref.create(record)
+            return None
+        except AlreadyExists:
+            existing = ref.get().to_dict()
+
+        abandoned = existing is not None and existing["state"] == IN_PROGRESS and existing["locked_until"] <= now
+        if existing is None or _is_expired(existing, now) or abandoned:
+            ref.set(record)
+            return None
+        return existing
+
+    async def _respond_with_record(self, record: Dict[str, Any], fingerprint: str, scope, receive, send) -> None:
+        if record["fingerprint"] != fingerprint:
+            response = JSONResponse(
+                {"detail": "Idempotency-Key was already used for a different request"}, status_code=422
+            )
+        elif record["state"] == IN_PROGRESS:
+            response = JSONResponse(
+                {"detail": "A request with this Idempotency-Key is still in progress"},
+                status_code=409,
+                headers={"Retry-After": "1"},
+            )
+        else:
+            body = bytes(record["body"])
+            headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in record["headers"].items()]
+            headers += [(b"content-length", str(len(body)).encode()), (REPLAYED_HEADER, b"true")]
+            await send({"type": "http.response.start", "status": record["status"], "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+        await response(scope, receive, send)
+
+
+class _ResponseCapture:
+    """Forwards the response to the client while keeping a copy to store."""
+
+    def __init__(self, send):
+        self._send = send
+        self.status = 500
+        self.headers: Dict[str, str] = {}
+        self.body = bytearray()
+        self.truncated = False
+
+    async def send(self, message) -> None:
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+            self.headers = {
+                name.decode("latin-1"): value.decode("latin-1")
+                for name, value in message.get("headers", [])
+                if name.lower() in STORED_HEADERS
+            }
+        elif message["type"] == "http.response.body" and not self.truncated:
+            self.body += message.get("body", b"")
+            if len(self.body) > MAX_STORED_BODY:
+                self.truncated = True
+                self.body = bytearray()
+        await self._send(message)
+
+    def storable(self) -> bool:
+        return self.status in STORED_STATUSES and not self.truncated
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+def _replay_body(body: bytes, receive):
+    """A receive callable yielding the already-read body, then the original channel."""
+    sent = False
+
+    async def replay():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return replay
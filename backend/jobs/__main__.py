@@ -0,0 +1,56 @@
+"""Run a job worker outside the API process.
+
+Run from the backend directory:
+
+    python -m jobs --concurrency 8
+    python -m jobs --type import_transactions --type rebuild_aggregates
+
+Set JOB_WORKER_CONCURRENCY=0 on the API to leave all jobs to these workers.
+SIGTERM and SIGINT stop the worker gracefully: running jobs get
+--shutdown-timeout seconds to finish before they are interrupted and
+queued again.
+"""
+import argparse
+import asyncio
+import signal
+from datetime import timedelta
+
+from firebase_app import get_firestore_client
+from jobs.handlers import HANDLERS
+from jobs.worker import JobWorker
+from logger import configure_logging
+
+
+async def run(worker: JobWorker, shutdown_timeout: float) -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    await worker.start()
+    await stop.wait()
+    await worker.stop(timeout=shutdown_timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m jobs", description="Background job worker")
+    parser.add_argument("--concurrency", type=int, default=4, help="Jobs run at the same time")
+    parser.add_argument("--tenant-concurrency", type=int, default=2, help="Jobs of one user run at the same time")
+    parser.add_argument("--lease-seconds", type=float, default=60, help="How long a job stays claimed without a heartbeat")
+    parser.add_argument("--type", action="append", choices=sorted(HANDLERS), help="Job type to run; repeat for several (default: all)")
+    parser.add_argument("--shutdown-timeout", type=float, default=30, help="Seconds running jobs get to finish on shutdown")
+    args = parser.parse_args()
+
+    configure_logging()
+    handlers = {job_type: HANDLERS[job_type] for job_type in args.type} if args.type else HANDLERS
+    worker = JobWorker(
+        get_firestore_client(),
+        handlers=handlers,
+        concurrency=args.concurrency,
+        tenant_concurrency=args.tenant_concurrency,
+        lease=timedelta(seconds=args.lease_seconds),
+    )
+    asyncio.run(run(worker, args.shutdown_timeout))
+
+
+if __name__ == "__main__":
+    main()
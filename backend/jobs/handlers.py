@@ -0,0 +1,82 @@
+"""Handlers of the job types, by name.
+
+A handler receives the Firestore client and the JobContext of a claimed
+job and returns its result, stored on the job. The work runs in a thread,
+as the services block on the synchronous Firestore client, and reports
+progress through the context so it can be cancelled. Every handler is
+resumable: a retried job picks up where the previous attempt stopped, from
+its saved progress or the service's own checkpoints.
+"""
+import asyncio
+from typing import Any, Dict, Optional
+from firebase_admin import firestore
+from jobs.worker import Handler, JobContext
+from services.budget_deletion_service import BudgetDeletionService
+from services.job_service import DELETE_BUDGET, GENERATE_RECURRING, IMPORT_TRANSACTIONS, REBUILD_AGGREGATES
+from services.monthly_aggregate_service import MonthlyAggregateService
+from services.recurring_transaction_service import RecurringTransactionService
+from services.transaction_service import TransactionService
+
+
+async def delete_budget(db: firestore.Client, context: JobContext) -> Optional[Dict[str, Any]]:
+    """Cascading delete of a budget; resumes from the deletion's checkpoint."""
+    service = BudgetDeletionService(db)
+    checkpoint = await asyncio.to_thread(
+        service.delete_budget_cascade,
+        context.params["budget_id"],
+        lambda checkpoint: context.report_progress(deleted_counts=dict(checkpoint["deleted_counts"]))
+    )
+    return {"deleted_counts": checkpoint["deleted_counts"]}
+
+
+async def rebuild_aggregates(db: firestore.Client, context: JobContext) -> Optional[Dict[str, Any]]:
+    """Recompute a budget's monthly aggregates, skipping the months already rebuilt."""
+    months = context.params["months"]
+    done = context.progress.get("months_done", 0)
+    service = MonthlyAggregateService(db)
+
+    def rebuilt(month: str) -> None:
+        nonlocal done
+        done += 1
+        context.report_progress(months_done=done, months=len(months))
+
+    stored = await asyncio.to_thread(service.rebuild, context.params["budget_id"], months[done:], rebuilt)
+    return {"months_stored": len(stored)}
+
+
+async def generate_recurring(db: firestore.Client, context: JobContext) -> Optional[Dict[str, Any]]:
+    """Create the due occurrences of a budget's recurring transactions."""
+    service = RecurringTransactionService(db)
+    return await asyncio.to_thread(
+        service.generate_due_transactions,
+        context.params["budget_id"],
+        None,
+        lambda generated: context.report_progress(generated=generated)
+    )
+
+
+async def import_transactions(db: firestore.Client, context: JobContext) -> Optional[Dict[str, Any]]:
+    """Write the rows of an import, resuming after the last committed batch."""
+    params = context.params
+    service = TransactionService(db)
+    return await asyncio.to_thread(
+        service.import_transactions,
+        params["budget_id"],
+        params["account_id"],
+        params["rows"],
+        context.job_id,
+        context.progress.get("rows_done", 0),
+        lambda rows_done, counts: context.report_progress(
+            rows_done=rows_done, rows=len(params["rows"]), counts=dict(counts)
+        ),
+        params.get("skip_duplicates", True),
+        context.progress.get("counts")
+    )
+
+
+HANDLERS: Dict[str, Handler] = {
+    DELETE_BUDGET: delete_budget,
+    REBUILD_AGGREGATES: rebuild_aggregates,
+    GENERATE_RECURRING: generate_recurring,
+    IMPORT_TRANSACTIONS: import_transactions,
+}
@@ -0,0 +1,283 @@
+"""Asyncio worker pool running the jobs queued by JobService.
+
+`JobWorker` claims due jobs up to its `concurrency` and runs each with the
+handler registered for its type (see jobs/handlers.py). It runs inside the
+API process, started by the app's lifespan, or on its own with
+`python -m jobs`; any number of workers can share the queue.
+
+- Every running job has a heartbeat task. It saves the progress the handler
+  reported, at most every `progress_interval` seconds, and renews the lease
+  at least every third of its duration. A worker that lost a job's lease
+  stops the handler and drops its outcome, as another worker may own the
+  job by then.
+- Cancellation is cooperative: once the heartbeat sees `cancel_requested`,
+  the handler's next `report_progress()` raises JobCancelled.
+- A handler that raises is retried with exponential backoff until the job
+  runs out of attempts. ValueError means the job can't succeed (e.g. the
+  budget doesn't exist) and fails it right away.
+- On shutdown the worker stops claiming and lets running jobs finish for
+  `timeout` seconds. It then interrupts them and queues them again without
+  counting the attempt, so handlers must be resumable.
+"""
+import asyncio
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+from firebase_admin import firestore
+from logger import get_logger
+from metrics import REGISTRY, Counter, Histogram
+from services.job_service import QUEUED, JobService
+
+logger = get_logger(__name__)
+
+DEFAULT_LEASE = timedelta(seconds=60)
+
+JOBS_FINISHED = REGISTRY.register(Counter(
+    "jobs_finished_total", "Job attempts by type and outcome", ("type", "outcome")
+))
+JOB_DURATION = REGISTRY.register(Histogram(
+    "job_duration_seconds", "Duration of job attempts by type", ("type",),
+    buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+))
+
+
+class JobCancelled(Exception):
+    """Raised by JobContext when its job is cancelled or its worker stops."""
+
+
+class JobContext:
+    """What a handler gets to know and report about its job.
+
+    Handlers run their blocking work in threads, so reporting progress is
+    thread-safe.
+    """
+
+    def __init__(self, job: Dict[str, Any]):
+        self.job_id: str = job["id"]
+        self.type: str = job["type"]
+        self.tenant_id: Optional[str] = job["tenant_id"]
+        self.params: Dict[str, Any] = job["params"]
+        self.attempt: int = job["attempts"]
+        # Saved by previous attempts, so a retried handler can resume
+        self.progress: Dict[str, Any] = dict(job.get("progress") or {})
+        self.stopping = False  # Interrupted by the worker's shutdown, not cancelled
+        self.lease_lost = False
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._changed = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def raise_if_cancelled(self) -> None:
+        if self._cancelled.is_set():
+            raise JobCancelled(self.job_id)
+
+    def report_progress(self, **progress: Any) -> None:
+        """Merge into the job's progress, saved by the next heartbeat.
+
+        Raises:
+            JobCancelled: If the job was cancelled; the handler should let it propagate
+        """
+        with self._lock:
+            self.progress.update(progress)
+            self._changed = True
+        self.raise_if_cancelled()
+
+    def snapshot_progress(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.progress)
+
+    def take_progress(self) -> Optional[Dict[str, Any]]:
+        """The progress if it changed since the last call, else None."""
+        with self._lock:
+            if not self._changed:
+                return None
+            self._changed = False
+            return dict(self.progress)
+
+
+Handler = Callable[[firestore.Client, JobContext], Awaitable[Optional[Dict[str, Any]]]]
+
+
+class JobWorker:
+    """Claims jobs and runs them concurrently, holding their leases."""
+
+    def __init__(
+        self,
+        db: firestore.Client,
+        handlers: Optional[Dict[str, Handler]] = None,
+        concurrency: int = 4,
+        tenant_concurrency: int = 2,
+        lease: timedelta = DEFAULT_LEASE,
+        poll_interval: float = 1.0,
+        progress_interval: float = 2.0,
+        worker_id: Optional[str] = None
+    ):
+        """Initialize the worker.
+
+        Args:
+            db: Firestore client instance
+            handlers: Handler of each job type, defaults to jobs.handlers.HANDLERS
+            concurrency: Jobs run at the same time by this worker
+            tenant_concurrency: Jobs of one tenant run at the same time by all workers
+            lease: How long a job stays claimed without a heartbeat
+            poll_interval: Seconds between polls for due jobs while idle
+            progress_interval: Seconds between saves of a job's progress
+            worker_id: Unique ID of this worker, defaults to host, pid and a random suffix
+        """
+        if handlers is None:
+            from jobs.handlers import HANDLERS
+            handlers = HANDLERS
+        self.db = db
+        self.service = JobService(db)
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.tenant_concurrency = tenant_concurrency
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.progress_interval = progress_interval
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._running: Dict[str, JobContext] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._poller: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    async def start(self) -> None:
+        """Start polling for jobs in the background."""
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._poller = asyncio.create_task(self._poll())
+        logger.info(f"Job worker {self.worker_id} started (concurrency {self.concurrency})")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Stop claiming jobs, then let running jobs finish or interrupt them.
+
+        Args:
+            timeout: Seconds running jobs get to finish, and then to stop once interrupted
+        """
+        self._stopping = True
+        if self._poller is not None:
+            self._poller.cancel()
+            await asyncio.gather(self._poller, return_exceptions=True)
+        if self._tasks:
+            await asyncio.wait(list(self._tasks.values()), timeout=timeout)
+        if self._tasks:
+            logger.info(f"Interrupting {len(self._tasks)} running jobs")
+            for context in self._running.values():
+                context.stopping = True
+                context.cancel()
+            await asyncio.wait(list(self._tasks.values()), timeout=timeout)
+        # Jobs still running keep their lease until it expires, then another worker retries them
+        logger.info(f"Job worker {self.worker_id} stopped")
+
+    async def _poll(self) -> None:
+        while not self._stopping:
+            free = self.concurrency - len(self._tasks)
+            claimed = []
+            if free > 0:
+                try:
+                    claimed = await asyncio.to_thread(
+                        self.service.claim, self.worker_id, self.lease, free,
+                        self.tenant_concurrency, list(self.handlers)
+                    )
+                except Exception as e:
+                    logger.error(f"Error claiming jobs: {str(e)}")
+                for job in claimed:
+                    context = JobContext(job)
+                    self._running[context.job_id] = context
+                    self._tasks[context.job_id] = asyncio.create_task(self._run(context))
+            if claimed and len(claimed) == free:
+                # There may be more due jobs, but all slots are taken until one frees up
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _run(self, context: JobContext) -> None:
+        logger.info(f"Running {context.type} job {context.job_id} (attempt {context.attempt})")
+        heartbeat = asyncio.create_task(self._heartbeat(context))
+        start = time.perf_counter()
+        try:
+            outcome = await self._execute(context)
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+            del self._running[context.job_id]
+            del self._tasks[context.job_id]
+            self._wake.set()
+        JOB_DURATION.observe((context.type,), time.perf_counter() - start)
+        JOBS_FINISHED.inc((context.type, outcome))
+        logger.info(f"Job {context.job_id} {outcome}")
+
+    async def _execute(self, context: JobContext) -> str:
+        """Run the handler and record how it ended; returns the outcome."""
+        try:
+            try:
+                result = await self.handlers[context.type](self.db, context)
+            except JobCancelled:
+                if context.lease_lost:
+                    return "lease_lost"
+                if context.stopping:
+                    await asyncio.to_thread(
+                        self.service.release, context.job_id, self.worker_id, context.snapshot_progress()
+                    )
+                    return "released"
+                held = await asyncio.to_thread(
+                    self.service.mark_cancelled, context.job_id, self.worker_id, context.snapshot_progress()
+                )
+                return "cancelled" if held else "lease_lost"
+            except Exception as e:
+                logger.error(f"Job {context.job_id} failed: {str(e)}")
+                job = await asyncio.to_thread(
+                    self.service.fail, context.job_id, self.worker_id, f"{type(e).__name__}: {e}",
+                    context.snapshot_progress(), not isinstance(e, ValueError)
+                )
+                if job is None:
+                    return "lease_lost"
+                return "retried" if job["status"] == QUEUED else "failed"
+
+            held = await asyncio.to_thread(
+                self.service.complete, context.job_id, self.worker_id, result, context.snapshot_progress()
+            )
+            return "succeeded" if held else "lease_lost"
+
+        except Exception as e:
+            # Recording the outcome failed; the lease expires and another worker retries the job
+            logger.error(f"Error recording the outcome of job {context.job_id}: {str(e)}")
+            return "error"
+
+    async def _heartbeat(self, context: JobContext) -> None:
+        renew_every = self.lease.total_seconds() / 3
+        last_renewal = time.monotonic()
+        while True:
+            await asyncio.sleep(min(self.progress_interval, renew_every))
+            progress = context.take_progress()
+            if progress is None and time.monotonic() - last_renewal < renew_every:
+                continue
+            try:
+                job = await asyncio.to_thread(
+                    self.service.renew, context.job_id, self.worker_id, self.lease, progress
+                )
+            except Exception as e:
+                logger.warning(f"Error renewing the lease of job {context.job_id}: {str(e)}")
+                continue
+            last_renewal = time.monotonic()
+            if job is None:
+                logger.warning(f"Lost the lease of job {context.job_id}, stopping it")
+                context.lease_lost = True
+                context.cancel()
+                return
+            if job["cancel_requested"]:
+                context.cancel()
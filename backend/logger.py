@@ -1,9 +1,136 @@
+import atexit
 import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+import orjson
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,  # Change to DEBUG for more details
-    format="%(asctime)s - %(levelname)s - %(message)s",
-)
+# Environment variables read by configure_logging()
+LOG_LEVEL_ENV = "LOG_LEVEL"                    # DEBUG, INFO, WARNING, ... (default INFO)
+LOG_FORMAT_ENV = "LOG_FORMAT"                  # json or text (default json)
+LOG_DEBUG_SAMPLE_RATE_ENV = "LOG_DEBUG_SAMPLE_RATE"  # fraction of DEBUG records kept (default 1.0)
 
-logger = logging.getLogger(__name__)  # Use a named logger
\ No newline at end of file
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line.
+
+    Fields passed through `extra` are added as top-level keys, so callers log
+    values as data instead of interpolating them into the message.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+class DebugSampler(logging.Filter):
+    """Keeps only a fraction of DEBUG records; other levels always pass."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+class _AsyncQueueHandler(QueueHandler):
+    """QueueHandler that keeps records structured.
+
+    The stock handler renders the full message with its own formatter before
+    enqueueing. Here only the arguments are merged and the traceback is
+    rendered, everything else is formatted on the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(
+    level: Optional[str] = None,
+    fmt: Optional[str] = None,
+    debug_sample_rate: Optional[float] = None
+) -> None:
+    """Configure the root logger once for the whole process.
+
+    Records are enqueued by the calling thread and written to stderr by a
+    background QueueListener, so request handlers never block on log I/O.
+    Calling this again replaces the previous configuration.
+
+    Args:
+        level: Log level name, defaults to $LOG_LEVEL or INFO
+        fmt: "json" or "text", defaults to $LOG_FORMAT or json
+        debug_sample_rate: Fraction of DEBUG records kept, defaults to
+            $LOG_DEBUG_SAMPLE_RATE or 1.0
+    """
+    global _listener
+
+    level = (level or os.getenv(LOG_LEVEL_ENV, "INFO")).upper()
+    fmt = (fmt or os.getenv(LOG_FORMAT_ENV, "json")).lower()
+    if debug_sample_rate is None:
+        debug_sample_rate = float(os.getenv(LOG_DEBUG_SAMPLE_RATE_ENV, "1.0"))
+
+    output = logging.StreamHandler(sys.stderr)
+    if fmt == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    handler = _AsyncQueueHandler(log_queue)
+    handler.addFilter(DebugSampler(debug_sample_rate))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    if _listener is not None:
+        _listener.stop()
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_listener() -> None:
+    if _listener is not None:
+        _listener.stop()
+
+
+atexit.register(_stop_listener)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Return a named logger; output is controlled by configure_logging()."""
+    return logging.getLogger(name)
+
+
+logger = get_logger(__name__)  # Use a named logger
@@ -1,12 +1,15 @@
 import asyncio
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, status, Request, Depends, Path, Body
 from fastapi.routing import APIRoute
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from datetime import datetime
 from typing import List, Callable, Any
 from uuid import UUID
-import firebase_admin
-from firebase_admin import auth, firestore, credentials
+from firebase_admin import auth, firestore
+from firebase_app import get_firestore_client, initialize_firebase
 from models import User, Budget, CategoryGroup, Category
 from services.account_service import AccountService
 from services.budget_report_service import BudgetReportService
@@ -19,7 +22,7 @@ from services.recurring_transaction_service import RecurringTransactionService
 from services.transaction_service import TransactionService
 from services.budget_service import BudgetService
 from services.user_service import UserService
-from routers import users #, budgets, categories, category_groups, reports
+from routers import users, transactions, reports, analytics, events, changes, batch, categories, jobs #, budgets, category_groups
 
 from firestore_service import (
     create_budget, get_budget, get_user_budgets,
@@ -28,54 +31,107 @@ from firestore_service import (
     create_category
 )
 from utils import debug_request, get_token, handle_exceptions
-from logger import logger
+from logger import configure_logging, logger
+from metrics import MetricsMiddleware, REGISTRY
+from idempotency import DEFAULT_TTL, IdempotencyMiddleware
+from compression import DEFAULT_MINIMUM_SIZE, CompressionMiddleware
+from rate_limit import DEFAULT_USER_LIMIT, AdmissionController, RateLimit, RateLimitMiddleware
+from jobs.worker import JobWorker
 
 import functools
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Firebase is initialized here rather than at import time, so importing
+    # the app is cheap and doesn't require credentials
+    initialize_firebase()
+    # Create the Firestore client and its gRPC channel in this process; under
+    # gunicorn that's after the fork, since channels can't be shared
+    get_firestore_client()
+    # Runs background jobs in this process; set to 0 when they run in `python -m jobs`
+    worker = None
+    concurrency = int(os.getenv("JOB_WORKER_CONCURRENCY", 2))
+    if concurrency > 0:
+        worker = JobWorker(
+            get_firestore_client(),
+            concurrency=concurrency,
+            tenant_concurrency=int(os.getenv("JOB_TENANT_CONCURRENCY", 2))
+        )
+        await worker.start()
+    app.state.ready = True
+    yield
+    app.state.ready = False
+    if worker is not None:
+        await worker.stop()
+
+
 def create_app():
+    configure_logging()
     app = FastAPI(
         title="Ignite - budget API",
         description="REST API for budget management",
-        version="1.0.0"
+        version="1.0.0",
+        lifespan=lifespan
+    )
+    # Replays stored responses to retried POST/PATCH requests carrying an Idempotency-Key
+    app.add_middleware(
+        IdempotencyMiddleware,
+        ttl=int(os.getenv("IDEMPOTENCY_TTL_SECONDS", DEFAULT_TTL))
+    )
+    # Throttles users over their limits and sheds load past the concurrency
+    # limit before anything touches Firestore; outside the idempotency store
+    # so throttled requests cost no reads
+    app.add_middleware(
+        RateLimitMiddleware,
+        user_limit=RateLimit(
+            rate=float(os.getenv("RATE_LIMIT_PER_USER_RPS", DEFAULT_USER_LIMIT.rate)),
+            burst=int(os.getenv("RATE_LIMIT_PER_USER_BURST", DEFAULT_USER_LIMIT.burst))
+        ),
+        admission=AdmissionController(max_concurrency=int(os.getenv("ADMISSION_MAX_CONCURRENCY", 64)))
+    )
+    # Per-route latency and Firestore usage, exposed on /metrics
+    app.add_middleware(
+        MetricsMiddleware,
+        server_timing=os.getenv("SERVER_TIMING", "false").lower() == "true"
     )
-    # Configure CORS middleware
+    # Outside the idempotency store and the metrics, so they see uncompressed bodies
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=int(os.getenv("COMPRESSION_MINIMUM_SIZE", DEFAULT_MINIMUM_SIZE))
+    )
+    # Configure CORS middleware. Outermost, so the responses other middleware
+    # return themselves (replays, 409s, 429s) carry the CORS headers too
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],  # In production, replace with specific origins
     #    allow_origins=["http://localhost:8080"],  # Vue.js development server
         allow_credentials=True,
-        allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        allow_headers=["Content-Type", "Authorization", "Accept"],
-        expose_headers=["Content-Length"],
+        allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+        allow_headers=["Content-Type", "Authorization", "Accept", "Idempotency-Key"],
+        expose_headers=["Content-Length", "Idempotent-Replayed", "Retry-After"],
         max_age=600,
     )
-    # Path to your Firebase service account key JSON file
-    FIREBASE_CREDENTIALS_PATH = "/Users/lidiafreitas/programming/keys/budgetapp-449511-firebase-adminsdk-fbsvc-80fc508f2e.json"
-
-    if not firebase_admin._apps:
-        cred = credentials.Certificate(FIREBASE_CREDENTIALS_PATH)
-        firebase_admin.initialize_app(cred, {
-            "projectId": "budgetapp-449511",
-        })
-
-    # Use the correct Firestore database
-    db = firestore.client()
-
 
     # Include routers
     app.include_router(users.router)
+    app.include_router(transactions.router)
+    app.include_router(reports.router)
+    app.include_router(analytics.router)
+    app.include_router(events.router)
+    app.include_router(changes.router)
+    app.include_router(batch.router)
+    app.include_router(categories.router)
+    app.include_router(jobs.router)
     # app.include_router(budgets.router)
-    # app.include_router(categories.router)
     # app.include_router(category_groups.router)
-    # app.include_router(reports.router)
     
-    return app, db
+    return app
 
-app, db = create_app()
+app = create_app()
 
 # Create a dependency provider and add services' getters
 def get_db():
-    return firestore.client()
+    return get_firestore_client()
 
 def get_account_service(db: firestore.Client = Depends(get_db)):
     return AccountService(db)
@@ -108,6 +164,22 @@ def get_transaction_service(db: firestore.Client = Depends(get_db)):
     return TransactionService(db)
 
 
+@app.get("/health", tags=["Health"])
+async def health():
+    """Liveness probe: the worker is up and serving requests."""
+    return {"status": "ok"}
+
+@app.get("/ready", tags=["Health"])
+async def ready():
+    """Readiness probe: Firebase is initialized and the worker can take traffic."""
+    if not getattr(app.state, "ready", False):
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"status": "starting"})
+    return {"status": "ready"}
+
+@app.get("/metrics", tags=["Debug"], response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/routes", tags=["Debug"])
 async def list_routes():
     routes = []
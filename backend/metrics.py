@@ -0,0 +1,358 @@
+import functools
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from starlette.datastructures import MutableHeaders
+
+# Request latency buckets in seconds (the Prometheus client defaults)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Buckets for the number of Firestore RPCs issued by one request
+RPC_COUNT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250)
+
+# Route label used for Firestore calls made outside of a request
+BACKGROUND_ROUTE = "background"
+# Route label used for requests that didn't match any route
+UNMATCHED_ROUTE = "unmatched"
+
+# GAPIC Firestore methods and the operation they are counted as
+FIRESTORE_RPC_OPERATIONS = {
+    "batch_get_documents": "read",
+    "run_query": "query",
+    "run_aggregation_query": "query",
+    "partition_query": "query",
+    "list_documents": "query",
+    "list_collection_ids": "query",
+    "commit": "write",
+    "batch_write": "write",
+    "begin_transaction": "transaction",
+    "rollback": "transaction",
+}
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with a fixed set of labels."""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labels: Tuple[str, ...] = (), value: float = 1.0) -> None:
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0.0) + value
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            values = sorted(self.values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value}" for labels, value in values]
+
+
+class Histogram:
+    """Histogram with cumulative buckets, a sum and a count per label set."""
+
+    type = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.values: Dict[Tuple[str, ...], List[float]] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        with self.lock:
+            # One slot per bucket plus +Inf, then the sum
+            series = self.values.get(labels)
+            if series is None:
+                series = self.values[labels] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            values = sorted((labels, list(series)) for labels, series in self.values.items())
+        lines = []
+        for labels, series in values:
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {series[len(self.buckets)]}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self.metrics: List[Any] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+))
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route"), LATENCY_BUCKETS
+))
+FIRESTORE_OPERATIONS = REGISTRY.register(Counter(
+    "firestore_operations_total", "Firestore RPCs by route and operation", ("route", "operation")
+))
+FIRESTORE_DOCUMENTS_READ = REGISTRY.register(Counter(
+    "firestore_documents_read_total", "Documents returned by Firestore reads and queries", ("route",)
+))
+FIRESTORE_DOCUMENTS_WRITTEN = REGISTRY.register(Counter(
+    "firestore_documents_written_total", "Document writes sent to Firestore", ("route",)
+))
+FIRESTORE_RPC_SECONDS = REGISTRY.register(Counter(
+    "firestore_rpc_seconds_total", "Time spent waiting on Firestore RPCs", ("route",)
+))
+FIRESTORE_RPCS_PER_REQUEST = REGISTRY.register(Histogram(
+    "firestore_rpcs_per_request", "Firestore RPCs issued by a single request", ("route",), RPC_COUNT_BUCKETS
+))
+
+
+class RequestStats:
+    """Firestore usage accumulated while serving one request.
+
+    Service code runs partly in worker threads, which share the instance
+    through the copied context, so updates are locked.
+    """
+
+    def __init__(self):
+        self.operations: Dict[str, int] = {}
+        self.documents_read = 0
+        self.documents_written = 0
+        self.rpc_seconds = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def rpcs(self) -> int:
+        return sum(self.operations.values())
+
+    def record_rpc(self, operation: str, documents_written: int = 0) -> None:
+        with self.lock:
+            self.operations[operation] = self.operations.get(operation, 0) + 1
+            self.documents_written += documents_written
+
+    def record_progress(self, seconds: float, documents_read: int = 0) -> None:
+        with self.lock:
+            self.rpc_seconds += seconds
+            self.documents_read += documents_read
+
+    def server_timing(self, total_seconds: float) -> str:
+        """Format the stats as a Server-Timing header value."""
+        return (
+            f"app;dur={total_seconds * 1000:.1f}, "
+            f"firestore;dur={self.rpc_seconds * 1000:.1f};"
+            f"desc=\"{self.rpcs} rpcs, {self.documents_read} docs read\""
+        )
+
+    def flush(self, route: str) -> None:
+        """Add the stats to the per-route counters."""
+        for operation, count in self.operations.items():
+            FIRESTORE_OPERATIONS.inc((route, operation), count)
+        if self.documents_read:
+            FIRESTORE_DOCUMENTS_READ.inc((route,), self.documents_read)
+        if self.documents_written:
+            FIRESTORE_DOCUMENTS_WRITTEN.inc((route,), self.documents_written)
+        if self.rpc_seconds:
+            FIRESTORE_RPC_SECONDS.inc((route,), self.rpc_seconds)
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    """Stats of the request being served, or None outside of a request."""
+    return _request_stats.get()
+
+
+def _stats_for_call() -> Tuple[RequestStats, bool]:
+    """Return the stats to record into and whether they must be flushed immediately."""
+    stats = _request_stats.get()
+    if stats is None:
+        return RequestStats(), True
+    return stats, False
+
+
+class _InstrumentedStream:
+    """Wraps a server-streaming RPC response, timing and counting documents as they arrive."""
+
+    def __init__(self, stream: Iterable[Any], document_field: str):
+        self._stream = iter(stream)
+        self._source = stream
+        self._document_field = document_field
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        stats, background = _stats_for_call()
+        start = time.perf_counter()
+        try:
+            response = next(self._stream)
+        finally:
+            elapsed = time.perf_counter() - start
+        documents = 1 if self._document_field and self._document_field in response else 0
+        stats.record_progress(elapsed, documents)
+        if background:
+            stats.flush(BACKGROUND_ROUTE)
+        return response
+
+    def __getattr__(self, name: str) -> Any:
+        # cancel(), trailing_metadata() etc. of the underlying gRPC stream
+        return getattr(self._source, name)
+
+
+# Field that marks a returned document in each streaming RPC response
+_STREAM_DOCUMENT_FIELDS = {
+    "batch_get_documents": "found",
+    "run_query": "document",
+    "run_aggregation_query": "",
+}
+
+
+class InstrumentedFirestoreApi:
+    """Proxy around the GAPIC Firestore client counting and timing every RPC.
+
+    Installed by instrument_client(), so every DocumentReference, Query,
+    WriteBatch, Transaction and BulkWriter created from the client is covered.
+    """
+
+    def __init__(self, api: Any):
+        self._api = api
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._api, name)
+        operation = FIRESTORE_RPC_OPERATIONS.get(name)
+        if operation is None or not callable(attr):
+            return attr
+        return functools.partial(self._call, name, operation, attr)
+
+    @staticmethod
+    def _call(name: str, operation: str, method: Callable[..., Any], *args, **kwargs) -> Any:
+        stats, background = _stats_for_call()
+        request = kwargs.get("request", args[0] if args else None)
+        writes = request.get("writes") if isinstance(request, dict) else getattr(request, "writes", None)
+        stats.record_rpc(operation, len(writes) if writes else 0)
+
+        start = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+        finally:
+            stats.record_progress(time.perf_counter() - start)
+            if background:
+                stats.flush(BACKGROUND_ROUTE)
+
+        if name in _STREAM_DOCUMENT_FIELDS:
+            return _InstrumentedStream(result, _STREAM_DOCUMENT_FIELDS[name])
+        return result
+
+
+def instrument_client(client: Any) -> Any:
+    """Install the RPC instrumentation on a Firestore client, in place.
+
+    The client caches its GAPIC client in `_firestore_api_internal`; there is
+    no public hook, so the cached instance is replaced by a proxy. Calling this
+    again on the same client is a no-op.
+
+    Args:
+        client: google.cloud.firestore.Client instance
+
+    Returns:
+        The same client
+    """
+    api = getattr(client, "_firestore_api", None)
+    if api is None:
+        # Not backed by the GAPIC client, e.g. the in-memory benchmark fake
+        return client
+    if not isinstance(api, InstrumentedFirestoreApi):
+        client._firestore_api_internal = InstrumentedFirestoreApi(api)
+    return client
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and Firestore usage per route.
+
+    Routes are labelled by their path template (e.g.
+    `/api/budgets/{budget_id}/transactions`), so the label set stays bounded.
+    """
+
+    def __init__(self, app, server_timing: bool = False):
+        """
+        Args:
+            app: ASGI application
+            server_timing: Add a Server-Timing header to every response
+        """
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing:
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", stats.server_timing(time.perf_counter() - start))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            elapsed = time.perf_counter() - start
+            route = scope.get("route")
+            path = getattr(route, "path", None) or UNMATCHED_ROUTE
+            method = scope["method"]
+
+            HTTP_REQUESTS.inc((method, path, str(status_code)))
+            HTTP_REQUEST_DURATION.observe((method, path), elapsed)
+            FIRESTORE_RPCS_PER_REQUEST.observe((path,), stats.rpcs)
+            stats.flush(path)
@@ -0,0 +1,56 @@
+"""Run the registered schema migrations.
+
+Run from the backend directory:
+
+    python -m migrations --dry-run --diff-file diff.jsonl
+    python -m migrations
+    python -m migrations --only 0001_categories_budget_id
+
+Completed migrations are skipped; an interrupted one resumes from its
+checkpoints.
+"""
+import argparse
+import contextlib
+import sys
+
+from firebase_app import get_firestore_client
+from logger import configure_logging
+from migrations.framework import MigrationRunner
+from migrations.versions import MIGRATIONS
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m migrations", description="Firestore schema migrations")
+    parser.add_argument("--dry-run", action="store_true", help="Report the changes without writing anything")
+    parser.add_argument("--diff-file", type=str, help="Where a dry run writes its diff (JSON lines), - for stdout")
+    parser.add_argument("--only", action="append", help="Version to run; repeat for several (default: all)")
+    parser.add_argument("--parallelism", type=int, default=8, help="Partitions scanned at the same time")
+    parser.add_argument("--page-size", type=int, default=500, help="Documents per page and checkpoint")
+    parser.add_argument("--max-ops-per-second", type=int, default=500, help="Write rate of the whole run")
+    args = parser.parse_args()
+
+    configure_logging()
+    migrations = [m for m in MIGRATIONS if not args.only or m.version in args.only]
+    unknown = set(args.only or []) - {m.version for m in MIGRATIONS}
+    if unknown:
+        parser.error(f"Unknown migrations: {', '.join(sorted(unknown))}")
+
+    with contextlib.ExitStack() as stack:
+        diff_output = None
+        if args.diff_file == "-":
+            diff_output = sys.stdout
+        elif args.diff_file:
+            diff_output = stack.enter_context(open(args.diff_file, "w"))
+        runner = MigrationRunner(
+            get_firestore_client(),
+            parallelism=args.parallelism,
+            page_size=args.page_size,
+            max_ops_per_second=args.max_ops_per_second,
+            dry_run=args.dry_run,
+            diff_output=diff_output,
+        )
+        runner.run_all(migrations)
+
+
+if __name__ == "__main__":
+    main()
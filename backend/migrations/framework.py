@@ -0,0 +1,402 @@
+"""Versioned, resumable Firestore schema migrations.
+
+A migration is a `Migration` subclass with a unique, sortable `version`,
+the `collection` it rewrites and a `migrate()` method returning the field
+updates of one document. `MigrationRunner` applies it:
+
+- The collection is split with `CollectionGroup.get_partitions()` and the
+  partitions are scanned concurrently by up to `parallelism` workers.
+- Each worker pages through its partition in `__name__` order, `page_size`
+  documents at a time, so memory stays constant whatever the collection
+  size.
+- Writes go through one `BulkWriter` per worker. Its rate limit is the
+  runner's budget split across the workers.
+- After every page, once its writes are flushed, the partition's cursor is
+  checkpointed. A crashed or interrupted run resumes after the last
+  checkpoint when started again. `migrate()` must therefore be idempotent,
+  and a page may be applied twice.
+- A page with a write that still fails after `MAX_WRITE_ATTEMPTS` isn't
+  checkpointed and its partition stops there. The migration is then
+  recorded as failed, and running it again retries the page.
+- The ledger document `schema_migrations/{version}` records status and
+  counts. Partition checkpoints are stored under it, one document per
+  partition, so workers never contend on one document. Completed
+  migrations are skipped.
+- A dry run writes nothing, not even the ledger. It reports what would
+  change, as one JSON line per document, for the documents a real run
+  would still process.
+"""
+import json
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Any, Callable, Dict, IO, Iterable, List, Optional, Tuple
+from firebase_admin import firestore
+from google.cloud.firestore_v1.bulk_writer import BulkWriterOptions, SendMode
+from logger import get_logger
+
+LEDGER_COLLECTION = "schema_migrations"
+PARTITIONS_SUBCOLLECTION = "partitions"
+
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+# Attempts of a failed bulk write before it is counted as failed
+MAX_WRITE_ATTEMPTS = 5
+
+
+class DeleteDocument:
+    """Returned by Migration.migrate() to delete the document."""
+
+
+DELETE_DOCUMENT = DeleteDocument()
+_MISSING = object()
+
+
+class Migration:
+    """One schema change of one collection.
+
+    Subclasses set `version`, `description` and `collection` and implement
+    `migrate()`. `prepare()` can batch the lookups a page needs, e.g. one
+    get_all() of the parent documents instead of one read per document.
+    """
+
+    version: str = ""  # Sortable and unique, e.g. "0001_categories_budget_id"
+    description: str = ""
+    collection: str = ""
+
+    def prepare(self, db: firestore.Client, snapshots: List[Any]) -> Any:
+        """Load what migrating a page of documents needs.
+
+        Args:
+            db: Firestore client instance
+            snapshots: The page's document snapshots
+
+        Returns:
+            Any: Passed to migrate() for every document of the page
+        """
+        return None
+
+    def migrate(self, doc_id: str, data: Dict[str, Any], context: Any) -> Any:
+        """Compute the change of one document.
+
+        Args:
+            doc_id: ID of the document
+            data: The document's current fields
+            context: What prepare() returned for the page
+
+        Returns:
+            Updates of top-level fields (firestore.DELETE_FIELD removes one),
+            DELETE_DOCUMENT, or None to leave the document as it is. Fields
+            already holding the new value aren't written.
+        """
+        raise NotImplementedError
+
+
+class _Counts:
+    """Thread-safe counters of one run."""
+
+    FIELDS = ("scanned", "changed", "deleted", "failed")
+
+    def __init__(self, initial: Optional[Dict[str, int]] = None):
+        self._values = {field: 0 for field in self.FIELDS}
+        self._values.update(initial or {})
+        self._lock = threading.Lock()
+
+    def add(self, **increments: int) -> None:
+        with self._lock:
+            for field, value in increments.items():
+                self._values[field] += value
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._values)
+
+
+def _describe(value: Any) -> Any:
+    if value is firestore.DELETE_FIELD:
+        return "<deleted>"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class MigrationRunner:
+    """Applies migrations in version order, recording them in the ledger."""
+
+    def __init__(
+        self,
+        db: firestore.Client,
+        parallelism: int = 8,
+        partitions_per_worker: int = 4,
+        page_size: int = 500,
+        max_ops_per_second: int = 500,
+        dry_run: bool = False,
+        diff_output: Optional[IO[str]] = None,
+        progress_callback: Optional[Callable[[str, Dict[str, int]], None]] = None
+    ):
+        """Initialize the runner.
+
+        Args:
+            db: Firestore client instance
+            parallelism: Partitions scanned at the same time
+            partitions_per_worker: Partitions requested per worker, so fast
+                workers pick up the work of slow ones
+            page_size: Documents read, migrated and checkpointed at a time
+            max_ops_per_second: Write rate of the whole run
+            dry_run: Only report the changes, as JSON lines to diff_output
+            diff_output: Where dry runs write their diff, None to only count
+            progress_callback: Receives the version and the counts after each page
+        """
+        self.db = db
+        self.parallelism = parallelism
+        self.partitions_per_worker = partitions_per_worker
+        self.page_size = page_size
+        self.max_ops_per_second = max_ops_per_second
+        self.dry_run = dry_run
+        self.diff_output = diff_output
+        self.progress_callback = progress_callback
+        self.logger = get_logger(__name__)
+        self._diff_lock = threading.Lock()
+
+    def run_all(self, migrations: Iterable[Migration]) -> Dict[str, Dict[str, Any]]:
+        """Run every migration not completed yet, in version order.
+
+        Returns:
+            Dict mapping each version to its ledger entry
+        """
+        results = {}
+        for migration in sorted(migrations, key=lambda m: m.version):
+            results[migration.version] = self.run(migration)
+        return results
+
+    def run(self, migration: Migration) -> Dict[str, Any]:
+        """Run or resume one migration.
+
+        Returns:
+            Dict: The migration's ledger entry
+
+        Raises:
+            ValueError: If the migration doesn't declare a version and collection
+        """
+        if not migration.version or not migration.collection:
+            raise ValueError(f"{type(migration).__name__} must set version and collection")
+
+        ledger_ref = self.db.collection(LEDGER_COLLECTION).document(migration.version)
+        ledger = ledger_ref.get().to_dict()
+        if ledger is not None and ledger["status"] == COMPLETED:
+            self.logger.info(f"Migration {migration.version} already completed, skipping")
+            return ledger
+
+        if ledger is None:
+            ledger = {
+                "version": migration.version,
+                "description": migration.description,
+                "collection": migration.collection,
+                "status": PENDING,
+                "counts": _Counts().snapshot(),
+                "created_at": datetime.utcnow(),
+            }
+        partitions = self._load_partitions(ledger_ref, migration, ledger)
+        previous_status = ledger["status"]
+        # Partition checkpoints hold the progress of interrupted runs
+        counts = _Counts()
+        for partition in partitions.values():
+            # Pages with failed writes weren't checkpointed and are retried
+            partition["counts"]["failed"] = 0
+            counts.add(**partition["counts"])
+        ledger.update(
+            status=RUNNING, dry_run=self.dry_run, started_at=datetime.utcnow(), partitions=len(partitions), error=None
+        )
+        self._save_ledger(ledger_ref, ledger)
+        self.logger.info(
+            f"Running migration {migration.version} on {migration.collection}: "
+            f"{sum(1 for p in partitions.values() if not p['done'])}/{len(partitions)} partitions left"
+            + (" (dry run)" if self.dry_run else "")
+        )
+
+        stop = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=self.parallelism, thread_name_prefix="migration")
+        try:
+            futures = [
+                pool.submit(self._run_partition, migration, ledger_ref, index, partition, counts, stop)
+                for index, partition in partitions.items() if not partition["done"]
+            ]
+            wait(futures, return_when=FIRST_EXCEPTION)
+            for future in futures:
+                future.result()
+            failed = counts.snapshot()["failed"]
+            if failed:
+                raise RuntimeError(f"{failed} documents failed to migrate")
+        except BaseException as e:
+            # Workers stop after their current page, which is checkpointed
+            stop.set()
+            pool.shutdown(wait=True, cancel_futures=True)
+            ledger.update(status=FAILED, counts=counts.snapshot(), error=str(e) or type(e).__name__)
+            self._save_ledger(ledger_ref, ledger)
+            self.logger.error(f"Migration {migration.version} failed, run again to resume: {str(e)}")
+            raise
+        pool.shutdown()
+
+        ledger.update(
+            status=COMPLETED if not self.dry_run else previous_status,
+            counts=counts.snapshot(),
+            completed_at=datetime.utcnow()
+        )
+        self._save_ledger(ledger_ref, ledger)
+        self.logger.info(f"Migration {migration.version} finished: {ledger['counts']}")
+        return ledger
+
+    def _load_partitions(
+        self, ledger_ref: Any, migration: Migration, ledger: Dict[str, Any]
+    ) -> Dict[str, Dict[str, Any]]:
+        """The stored partitions of an interrupted run, or new ones.
+
+        Boundaries are stored with the checkpoints, so a resumed run scans
+        exactly the ranges the first run split the collection into.
+        """
+        partitions_ref = ledger_ref.collection(PARTITIONS_SUBCOLLECTION)
+        if ledger["status"] != PENDING:
+            stored = {doc.id: doc.to_dict() for doc in partitions_ref.stream()}
+            if stored:
+                return stored
+
+        requested = self.parallelism * self.partitions_per_worker
+        boundaries = [
+            (partition.start_at, partition.end_at)
+            for partition in self.db.collection_group(migration.collection).get_partitions(requested)
+        ] or [(None, None)]
+        partitions = {
+            f"{index:04d}": {
+                "start_at": start.path if start is not None else None,
+                "end_before": end.path if end is not None else None,
+                "cursor": None,
+                "done": False,
+                "counts": _Counts().snapshot(),
+            }
+            for index, (start, end) in enumerate(boundaries)
+        }
+        if not self.dry_run:
+            for index, partition in partitions.items():
+                partitions_ref.document(index).set(partition)
+        return partitions
+
+    def _run_partition(
+        self,
+        migration: Migration,
+        ledger_ref: Any,
+        index: str,
+        partition: Dict[str, Any],
+        counts: _Counts,
+        stop: threading.Event
+    ) -> None:
+        partition_ref = ledger_ref.collection(PARTITIONS_SUBCOLLECTION).document(index)
+        query = self.db.collection_group(migration.collection).order_by("__name__")
+        if partition["end_before"]:
+            query = query.end_before({"__name__": self.db.document(partition["end_before"])})
+
+        writer = None
+        if not self.dry_run:
+            writer = self.db.bulk_writer(options=BulkWriterOptions(
+                max_ops_per_second=max(1, self.max_ops_per_second // self.parallelism),
+                mode=SendMode.parallel
+            ))
+            writer.on_write_error(lambda failure: self._on_write_error(failure, counts, partition))
+
+        try:
+            while True:
+                if stop.is_set():
+                    return
+                if partition["cursor"]:
+                    page_query = query.start_after({"__name__": self.db.document(partition["cursor"])})
+                elif partition["start_at"]:
+                    page_query = query.start_at({"__name__": self.db.document(partition["start_at"])})
+                else:
+                    page_query = query
+                page = list(page_query.limit(self.page_size).stream())
+                if not page:
+                    break
+
+                page_counts, writes = self._migrate_page(migration, page)
+                if writer is not None:
+                    failed = partition["counts"]["failed"]
+                    for operation, reference, *args in writes:
+                        getattr(writer, operation)(reference, *args)
+                    # Checkpoint only what was written
+                    writer.flush()
+                    if partition["counts"]["failed"] > failed:
+                        # Left unchecked, so the next run retries the page
+                        return
+                partition["cursor"] = page[-1].reference.path
+                for field, value in page_counts.items():
+                    partition["counts"][field] += value
+                counts.add(**page_counts)
+                if not self.dry_run:
+                    partition_ref.set(partition)
+                if self.progress_callback:
+                    self.progress_callback(migration.version, counts.snapshot())
+                if len(page) < self.page_size:
+                    break
+        finally:
+            if writer is not None:
+                writer.close()
+
+        partition["done"] = True
+        if not self.dry_run:
+            partition_ref.set(partition)
+
+    def _migrate_page(self, migration: Migration, page: List[Any]) -> Tuple[Dict[str, int], List[Tuple]]:
+        """Migrate a page; its writes are returned, so a failing page writes nothing."""
+        # A collection group also matches subcollections with the same name
+        page = [doc for doc in page if doc.reference.parent.path == migration.collection]
+        context = migration.prepare(self.db, page)
+        changed = deleted = 0
+        writes = []
+        for doc in page:
+            data = doc.to_dict()
+            change = migration.migrate(doc.id, data, context)
+            if change is DELETE_DOCUMENT:
+                deleted += 1
+                self._record(doc, None)
+                writes.append(("delete", doc.reference))
+                continue
+            # Only fields that actually change, so re-running a page is a no-op
+            updates = {}
+            for field, value in (change or {}).items():
+                if value is firestore.DELETE_FIELD:
+                    if field in data:
+                        updates[field] = value
+                elif data.get(field, _MISSING) != value:
+                    updates[field] = value
+            if not updates:
+                continue
+            changed += 1
+            self._record(doc, {field: [_describe(data.get(field)), _describe(value)] for field, value in updates.items()})
+            writes.append(("update", doc.reference, updates))
+        return {"scanned": len(page), "changed": changed, "deleted": deleted}, writes
+
+    def _record(self, doc: Any, changes: Optional[Dict[str, List[Any]]]) -> None:
+        """Write one line of the dry-run diff: the document and each field's [old, new]."""
+        if not self.dry_run or self.diff_output is None:
+            return
+        line = {"document": doc.reference.path, "delete": changes is None}
+        if changes is not None:
+            line["changes"] = changes
+        with self._diff_lock:
+            self.diff_output.write(json.dumps(line, default=str) + "\n")
+
+    def _on_write_error(self, failure: Any, counts: _Counts, partition: Dict[str, Any]) -> bool:
+        if failure.attempts < MAX_WRITE_ATTEMPTS:
+            return True
+        self.logger.error(f"Giving up on migrating {failure.reference.path}: {failure.message}")
+        counts.add(failed=1)
+        partition["counts"]["failed"] += 1
+        return False
+
+    def _save_ledger(self, ledger_ref: Any, ledger: Dict[str, Any]) -> None:
+        if self.dry_run:
+            return
+        ledger["updated_at"] = datetime.utcnow()
+        ledger_ref.set(ledger)
@@ -0,0 +1,6 @@
+"""Registered migrations. Add new ones here; they run in version order."""
+from migrations.versions.v0001_categories_budget_id import CategoriesBudgetId
+
+MIGRATIONS = [
+    CategoriesBudgetId(),
+]
@@ -0,0 +1,37 @@
+from typing import Any, Dict, List
+from firebase_admin import firestore
+from migrations.framework import Migration
+
+
+class CategoriesBudgetId(Migration):
+    """Denormalize budget_id onto categories created before it was stored.
+
+    Categories are listed and synced by budget_id; older ones only have a
+    group_id and are missed by those queries.
+    """
+
+    version = "0001_categories_budget_id"
+    description = "Copy budget_id from each category's group onto the category"
+    collection = "categories"
+
+    def prepare(self, db: firestore.Client, snapshots: List[Any]) -> Dict[str, str]:
+        # One batched read of the groups of the page's categories that need it
+        documents = (doc.to_dict() for doc in snapshots)
+        group_ids = {data["group_id"] for data in documents if not data.get("budget_id") and data.get("group_id")}
+        if not group_ids:
+            return {}
+        refs = [db.collection("category_groups").document(group_id) for group_id in group_ids]
+        # get_all returns the groups in no particular order
+        return {
+            group.id: group.to_dict().get("budget_id")
+            for group in db.get_all(refs, field_paths=["budget_id"]) if group.exists
+        }
+
+    def migrate(self, doc_id: str, data: Dict[str, Any], context: Dict[str, str]) -> Any:
+        if data.get("budget_id"):
+            return None
+        budget_id = context.get(data.get("group_id"))
+        if budget_id is None:
+            # Orphaned category, left for manual cleanup
+            return None
+        return {"budget_id": budget_id}
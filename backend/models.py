@@ -3,14 +3,6 @@ from datetime import datetime, timedelta
 from typing import List, Optional, Dict
 from enum import Enum
 from firebase_admin import firestore
-# Store valid currencies in a separate JSON file
-import json
-
-CURRENCY_FILE = "data/valid_currencies.json"
-
-# Load valid currencies from JSON file
-with open(CURRENCY_FILE, "r") as file:
-    VALID_CURRENCIES = set(json.load(file))
 
 class FrequencyType(str, Enum):
     DAILY = "daily"
@@ -76,7 +68,8 @@ class CategoryGroup(BaseAuditModel):
 
 class Category(BaseAuditModel):
     id: Optional[str] = None  # Firestore document ID (optional when creating)
-    group_id: str
+    group_id: Optional[str] = None  # None once removed from its group
+    budget_id: Optional[str] = None  # Denormalized from the category group
     name: str
     cash_left_over: int = 0 # Cash left over from last month
     target_id : Optional[str] = None # Target savings for this category
@@ -155,6 +148,7 @@ class Account(BaseAuditModel):
 
 class Transaction(BaseAuditModel):
     id: Optional[str] = None  # Firestore document ID (optional when creating)
+    budget_id: Optional[str] = None
     account_id: str
     amount: int  # Stored in cents
     date: datetime
@@ -163,6 +157,8 @@ class Transaction(BaseAuditModel):
     cleared: bool = False
     notes: Optional[str]
     pending: bool = False
+    bank_id: Optional[str] = None  # The bank's ID of the transaction, set by imports
+    duplicate_of: Optional[str] = None  # ID of a transaction this one possibly duplicates
 
     @property
     def document_path(self) -> str:
@@ -0,0 +1,429 @@
+"""Per-user rate limiting and admission control.
+
+RateLimitMiddleware puts two checks in front of the routes, so one runaway
+client can't use up the Firestore quota and the latency budget of everyone
+else:
+
+- Token buckets keyed on the verified user ID, or on the client address for
+  requests without a valid token. Every user has one bucket across all
+  routes and one per matching RouteLimit, e.g. writes or the batch
+  endpoint. A request finding a bucket empty gets 429 with `Retry-After`
+  set to when the bucket has a token again. A user may also only have
+  `user_concurrency` requests running at once, so a burst within the
+  bucket sizes can't occupy a worker either.
+- An admission controller bounding the requests running at once. Requests
+  issue their Firestore RPCs while they run, so this bounds the RPCs in
+  flight. Requests over the limit wait in a priority lane: waiting
+  interactive requests are admitted before bulk ones, and bulk requests
+  (the batch endpoint, range reports, or any request sent with
+  `X-Request-Priority: bulk`) may only fill `bulk_share` of the slots. A
+  request not admitted within its lane's maximum wait is shed with 429.
+
+A batch request runs its sub-requests concurrently, so it holds no slot
+itself. Each sub-request takes tokens from the user's buckets and an
+admission slot like a standalone request, see sub_request_limits(), and
+is answered 429 on its own when it is throttled or shed.
+
+Limits are kept in memory per process, so with several gunicorn workers a
+user gets each limit once per worker.
+"""
+import asyncio
+import hashlib
+import math
+import re
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Iterable, NamedTuple, Optional, Pattern, Sequence, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+from logger import get_logger
+from metrics import REGISTRY, Counter, Histogram
+from request_cache import shared_request_cache
+from utils import verify_token
+
+logger = get_logger(__name__)
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+# Lanes in the order waiting requests are admitted
+LANES = (INTERACTIVE, BULK)
+PRIORITY_HEADER = "x-request-priority"
+
+# Never limited: probes, metrics scraping and CORS preflights
+EXEMPT_PATHS = frozenset({"/health", "/ready", "/metrics"})
+EXEMPT_METHODS = frozenset({"OPTIONS"})
+# Long-lived streams are rate limited when they connect but hold no slot
+UNADMITTED_PATHS = (re.compile(r"/events$"),)
+BULK_PATHS = (re.compile(r"^/api/batch$"), re.compile(r"/reports/range$"))
+# Requests whose sub-requests are limited one by one instead of the request itself
+SUB_REQUEST_PATHS = (re.compile(r"^/api/batch$"),)
+# Key of the limiter in the scope state of requests with sub-requests
+SCOPE_STATE_KEY = "rate_limit"
+# Seconds an invalid token is remembered, and a valid one without an `exp` claim
+INVALID_TOKEN_TTL = 60
+
+HTTP_REQUESTS_THROTTLED = REGISTRY.register(Counter(
+    "http_requests_throttled_total", "Requests rejected with 429 by reason and lane", ("reason", "lane")
+))
+ADMISSION_WAIT = REGISTRY.register(Histogram(
+    "admission_wait_seconds", "Time requests waited for an admission slot", ("lane",)
+))
+
+
+class RateLimit(NamedTuple):
+    rate: float  # Tokens added per second
+    burst: int  # Bucket capacity
+
+
+class RouteLimit(NamedTuple):
+    name: str
+    methods: frozenset
+    pattern: Pattern[str]
+    limit: RateLimit
+
+
+class Rejection(NamedTuple):
+    detail: str
+    retry_after: int  # Seconds
+
+
+DEFAULT_USER_LIMIT = RateLimit(rate=20, burst=40)
+# Requests of one user running at once; a browser opens about six connections
+DEFAULT_USER_CONCURRENCY = 8
+DEFAULT_ROUTE_LIMITS = (
+    RouteLimit("writes", frozenset({"POST", "PUT", "PATCH", "DELETE"}), re.compile(r"^/api/"), RateLimit(10, 30)),
+    RouteLimit("batch", frozenset({"POST"}), re.compile(r"^/api/batch$"), RateLimit(2, 10)),
+    RouteLimit(
+        "reports", frozenset({"GET"}), re.compile(r"^/api/budgets/[^/]+/(reports|analytics)/"), RateLimit(2, 10)
+    ),
+)
+
+
+class TokenBucket:
+    """Bucket of `limit.burst` tokens refilled at `limit.rate` tokens per second."""
+
+    __slots__ = ("limit", "tokens", "updated")
+
+    def __init__(self, limit: RateLimit, now: float):
+        self.limit = limit
+        self.tokens = float(limit.burst)
+        self.updated = now
+
+    def wait_time(self, now: float, tokens: int = 1) -> float:
+        """Seconds until `tokens` tokens are available, 0 if they are now.
+
+        Taking more tokens than the burst only needs a full bucket, and
+        leaves it in debt.
+        """
+        self.tokens = min(self.limit.burst, self.tokens + (now - self.updated) * self.limit.rate)
+        self.updated = now
+        needed = min(tokens, self.limit.burst)
+        return 0.0 if self.tokens >= needed else (needed - self.tokens) / self.limit.rate
+
+    def take(self, tokens: int = 1) -> None:
+        self.tokens -= tokens
+
+
+class _Buckets:
+    """LRU of token buckets; an evicted bucket starts full again."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+
+    def get(self, key: Tuple[str, str], limit: RateLimit, now: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(limit, now)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+
+class _VerifiedTokens:
+    """LRU of token digests and the user each token verified as, until the token expires.
+
+    Throttled clients resend the same token many times a second, so each one
+    is verified once instead of on every request. Tokens that fail
+    verification are remembered as anonymous for INVALID_TOKEN_TTL seconds.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[bytes, Tuple[Optional[str], float]]" = OrderedDict()
+
+    def get(self, digest: bytes, now: float) -> Tuple[bool, Optional[str]]:
+        """(found, user ID or None for an invalid token)."""
+        entry = self._entries.get(digest)
+        if entry is None:
+            return False, None
+        if entry[1] <= now:
+            del self._entries[digest]
+            return False, None
+        self._entries.move_to_end(digest)
+        return True, entry[0]
+
+    def put(self, digest: bytes, user_id: Optional[str], expires_at: float) -> None:
+        self._entries[digest] = (user_id, expires_at)
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+class AdmissionController:
+    """Bounds the requests running at once, admitting waiting requests by lane priority.
+
+    Used from one event loop, so its state needs no locking.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 64,
+        bulk_share: float = 0.5,
+        max_wait: Optional[Dict[str, float]] = None
+    ):
+        """
+        Args:
+            max_concurrency: Requests running at the same time
+            bulk_share: Fraction of the slots bulk requests may hold
+            max_wait: Seconds a request of each lane may wait for a slot
+                before it is shed
+        """
+        self.max_concurrency = max_concurrency
+        self.bulk_limit = max(1, int(max_concurrency * bulk_share))
+        self.max_wait = {INTERACTIVE: 2.0, BULK: 0.5, **(max_wait or {})}
+        self.in_flight = {lane: 0 for lane in LANES}
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {lane: deque() for lane in LANES}
+
+    def _has_slot(self, lane: str) -> bool:
+        if sum(self.in_flight.values()) >= self.max_concurrency:
+            return False
+        return lane != BULK or self.in_flight[BULK] < self.bulk_limit
+
+    async def acquire(self, lane: str) -> bool:
+        """Wait for a slot in lane; False if none freed up within the lane's maximum wait."""
+        # Requests already waiting in the lane go first
+        if self._has_slot(lane) and not self._waiters[lane]:
+            self.in_flight[lane] += 1
+            return True
+        if self.max_wait[lane] <= 0:
+            return False
+
+        granted = asyncio.get_running_loop().create_future()
+        self._waiters[lane].append(granted)
+        try:
+            await asyncio.wait_for(asyncio.shield(granted), self.max_wait[lane])
+            return True
+        except asyncio.TimeoutError:
+            if granted.done():
+                # Granted as the wait ran out
+                return True
+            self._waiters[lane].remove(granted)
+            return False
+        except asyncio.CancelledError:
+            if granted.done():
+                self.release(lane)
+            else:
+                self._waiters[lane].remove(granted)
+            raise
+
+    def release(self, lane: str) -> None:
+        self.in_flight[lane] -= 1
+        for waiting_lane in LANES:
+            waiters = self._waiters[waiting_lane]
+            while waiters and self._has_slot(waiting_lane):
+                self.in_flight[waiting_lane] += 1
+                waiters.popleft().set_result(True)
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying per-user token buckets and admission control."""
+
+    def __init__(
+        self,
+        app,
+        user_limit: Optional[RateLimit] = DEFAULT_USER_LIMIT,
+        route_limits: Sequence[RouteLimit] = DEFAULT_ROUTE_LIMITS,
+        admission: Optional[AdmissionController] = None,
+        user_concurrency: Optional[int] = DEFAULT_USER_CONCURRENCY,
+        bulk_paths: Iterable[Pattern[str]] = BULK_PATHS,
+        max_buckets: int = 100_000,
+        shed_retry_after: int = 1
+    ):
+        """
+        Args:
+            app: ASGI application
+            user_limit: Limit of each user across all routes, None for no limit
+            route_limits: Limits of each user on the matching routes
+            admission: Admission controller, None to not bound concurrency
+            user_concurrency: Requests of one user running at the same time,
+                None for no limit
+            bulk_paths: Paths served in the bulk lane
+            max_buckets: Token buckets kept in memory
+            shed_retry_after: Retry-After, in seconds, of requests rejected
+                by the concurrency limits
+        """
+        self.app = app
+        self.user_limit = user_limit
+        self.route_limits = tuple(route_limits)
+        self.admission = admission
+        self.user_concurrency = user_concurrency
+        self._running: Dict[str, int] = {}
+        self.bulk_paths = tuple(bulk_paths)
+        self.buckets = _Buckets(max_buckets)
+        self.tokens = _VerifiedTokens(max_buckets)
+        self.shed_retry_after = shed_retry_after
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in EXEMPT_METHODS or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+        # The token verified here is reused by the middleware inside and the route
+        with shared_request_cache():
+            await self._limit(scope, receive, send)
+
+    async def _limit(self, scope, receive, send) -> None:
+        headers = Headers(scope=scope)
+        path, method = scope["path"], scope["method"]
+        lane = BULK if (
+            headers.get(PRIORITY_HEADER, "").lower() == BULK or any(p.search(path) for p in self.bulk_paths)
+        ) else INTERACTIVE
+
+        client = await self._client_key(headers, scope)
+        # Long-lived streams are only rate limited when they connect
+        held = not any(p.search(path) for p in UNADMITTED_PATHS)
+        if held and self.user_concurrency is not None and self._running.get(client, 0) >= self.user_concurrency:
+            HTTP_REQUESTS_THROTTLED.inc(("user_concurrency", lane))
+            await self._reject("Too many concurrent requests", self.shed_retry_after, scope, receive, send)
+            return
+        wait = self._take_tokens(client, [(method, path)])
+        if wait:
+            HTTP_REQUESTS_THROTTLED.inc(("rate_limit", lane))
+            await self._reject("Rate limit exceeded", math.ceil(wait), scope, receive, send)
+            return
+        if not held:
+            await self.app(scope, receive, send)
+            return
+
+        self._running[client] = self._running.get(client, 0) + 1
+        try:
+            if any(p.search(path) for p in SUB_REQUEST_PATHS):
+                # Admitted sub-request by sub-request, see sub_request_limits()
+                scope.setdefault("state", {})[SCOPE_STATE_KEY] = (self, client, lane)
+                await self.app(scope, receive, send)
+                return
+            if self.admission is None:
+                await self.app(scope, receive, send)
+                return
+            start = time.perf_counter()
+            admitted = await self.admission.acquire(lane)
+            ADMISSION_WAIT.observe((lane,), time.perf_counter() - start)
+            if not admitted:
+                HTTP_REQUESTS_THROTTLED.inc(("overloaded", lane))
+                await self._reject("Server busy", self.shed_retry_after, scope, receive, send)
+                return
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                self.admission.release(lane)
+        finally:
+            self._running[client] -= 1
+            if not self._running[client]:
+                del self._running[client]
+
+    async def _client_key(self, headers: Headers, scope) -> str:
+        """The verified user ID, or the client address for anonymous requests."""
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and token:
+            digest = hashlib.sha256(token.encode()).digest()
+            now = time.time()
+            found, user_id = self.tokens.get(digest, now)
+            if not found:
+                try:
+                    decoded = await asyncio.to_thread(verify_token, token)
+                    user_id = decoded["uid"]
+                    self.tokens.put(digest, user_id, decoded.get("exp", now + INVALID_TOKEN_TTL))
+                except Exception:
+                    # Rejected by the route; limited like any anonymous request
+                    self.tokens.put(digest, None, now + INVALID_TOKEN_TTL)
+            if user_id is not None:
+                return f"user:{user_id}"
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    def _take_tokens(self, client: str, requests: Sequence[Tuple[str, str]]) -> float:
+        """Take a token per (method, path) from each of its buckets, or none and return the longest wait."""
+        now = time.monotonic()
+        needed: Dict[Tuple[str, str], int] = {}
+        limits: Dict[Tuple[str, str], RateLimit] = {}
+        for method, path in requests:
+            if self.user_limit is not None:
+                needed[(client, "")] = needed.get((client, ""), 0) + 1
+                limits[(client, "")] = self.user_limit
+            for route_limit in self.route_limits:
+                if method in route_limit.methods and route_limit.pattern.search(path):
+                    key = (client, route_limit.name)
+                    needed[key] = needed.get(key, 0) + 1
+                    limits[key] = route_limit.limit
+        buckets = [(self.buckets.get(key, limits[key], now), tokens) for key, tokens in needed.items()]
+        wait = max((bucket.wait_time(now, tokens) for bucket, tokens in buckets), default=0.0)
+        if not wait:
+            for bucket, tokens in buckets:
+                bucket.take(tokens)
+        return wait
+
+    @asynccontextmanager
+    async def limit_sub_requests(
+        self, client: str, lane: str, requests: Sequence[Tuple[str, str]]
+    ) -> AsyncIterator[Optional[Rejection]]:
+        wait = self._take_tokens(client, requests)
+        if wait:
+            HTTP_REQUESTS_THROTTLED.inc(("rate_limit", lane))
+            yield Rejection("Rate limit exceeded", math.ceil(wait))
+            return
+        if self.admission is None:
+            yield None
+            return
+        start = time.perf_counter()
+        admitted = await self.admission.acquire(lane)
+        ADMISSION_WAIT.observe((lane,), time.perf_counter() - start)
+        if not admitted:
+            HTTP_REQUESTS_THROTTLED.inc(("overloaded", lane))
+            yield Rejection("Server busy", self.shed_retry_after)
+            return
+        try:
+            yield None
+        finally:
+            self.admission.release(lane)
+
+    @staticmethod
+    async def _reject(detail: str, retry_after: int, scope, receive, send) -> None:
+        response = JSONResponse({"detail": detail}, status_code=429, headers={"Retry-After": str(retry_after)})
+        await response(scope, receive, send)
+
+
+@asynccontextmanager
+async def sub_request_limits(scope, requests: Sequence[Tuple[str, str]]) -> AsyncIterator[Optional[Rejection]]:
+    """Apply the user's rate limits and admission control to batch sub-requests run one after another.
+
+    Holds an admission slot while the body of the `with` block runs, so use
+    it on the event loop serving the batch request. Yields None if the
+    sub-requests may run, else why they were rejected; requests not served
+    through RateLimitMiddleware are never rejected.
+
+    Args:
+        scope: ASGI scope of the batch request
+        requests: HTTP method and path, without the query string, of each sub-request
+    """
+    limiter = scope.get("state", {}).get(SCOPE_STATE_KEY)
+    if limiter is None:
+        yield None
+        return
+    middleware, client, lane = limiter
+    async with middleware.limit_sub_requests(client, lane, requests) as rejection:
+        yield rejection
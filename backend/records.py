@@ -0,0 +1,88 @@
+from datetime import datetime
+from typing import Any, Dict, NamedTuple, Optional, Sequence
+
+
+class TransactionRecord(NamedTuple):
+    """Compact, immutable view of a transaction used by aggregation pipelines.
+
+    Holds only the fields reports group and sum by. Tuples carry no per-instance
+    __dict__, so a record is several times smaller than the equivalent
+    Transaction model or Firestore dict. Convert to pydantic models only at the
+    API edge.
+    """
+    id: str
+    account_id: Optional[str]
+    category_id: Optional[str]
+    payee: Optional[str]
+    amount: int  # Stored in cents
+    date: Optional[datetime]
+
+    @classmethod
+    def from_dict(cls, doc_id: str, data: Dict[str, Any]) -> "TransactionRecord":
+        return cls(
+            doc_id,
+            data.get("account_id"),
+            data.get("category_id"),
+            data.get("payee"),
+            data.get("amount", 0),
+            data.get("date"),
+        )
+
+    @classmethod
+    def from_snapshot(cls, doc: Any) -> "TransactionRecord":
+        """Build a record from a Firestore DocumentSnapshot."""
+        return cls.from_dict(doc.id, doc.to_dict())
+
+
+# Fields to project in Firestore queries feeding TransactionRecord
+TRANSACTION_RECORD_FIELDS = [field for field in TransactionRecord._fields if field != "id"]
+
+
+class RecordTotals(NamedTuple):
+    """Integer-cent totals of a set of transaction records."""
+    income: int
+    expenses: int  # Absolute value of the negative amounts
+    net: int
+    by_category: Dict[Optional[str], int]
+
+
+def summarize_records(records: Sequence[TransactionRecord]) -> RecordTotals:
+    """Compute income, expenses, net and per-category totals in one pass.
+
+    All arithmetic stays in integer cents; callers convert to Decimal only
+    when building the response.
+    """
+    income = 0
+    expenses = 0
+    by_category: Dict[Optional[str], int] = {}
+    for record in records:
+        amount = record.amount
+        if amount > 0:
+            income += amount
+        else:
+            expenses -= amount
+        by_category[record.category_id] = by_category.get(record.category_id, 0) + amount
+    return RecordTotals(income, expenses, income - expenses, by_category)
+
+
+def summarize_records_by_month(records: Sequence[TransactionRecord]) -> Dict[str, RecordTotals]:
+    """Compute RecordTotals per YYYY-MM month in a single pass over the records."""
+    buckets: Dict[str, list] = {}
+    for record in records:
+        date = record.date
+        month = f"{date.year:04d}-{date.month:02d}"
+        bucket = buckets.get(month)
+        if bucket is None:
+            bucket = buckets[month] = [0, 0, {}]
+        amount = record.amount
+        if amount > 0:
+            bucket[0] += amount
+        else:
+            bucket[1] -= amount
+        by_category = bucket[2]
+        by_category[record.category_id] = by_category.get(record.category_id, 0) + amount
+
+    return {
+        month: RecordTotals(income, expenses, income - expenses, by_category)
+        for month, (income, expenses, by_category) in buckets.items()
+    }
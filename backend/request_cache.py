@@ -0,0 +1,72 @@
+"""Request-scoped memoization.
+
+Inside a `request_cache()` block, lookups wrapped in `cached()` or
+`cached_async()` run once per key and are shared by everything running in
+that context, including tasks started from it. The batch endpoint opens one
+block for all of its sub-requests, so the ID token is verified once and a
+budget is read once however many sub-requests need it. Outside a block
+every lookup runs normally.
+"""
+import asyncio
+import concurrent.futures
+import contextlib
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterator, Optional
+
+_cache: ContextVar[Optional[Dict[Hashable, Any]]] = ContextVar("request_cache", default=None)
+
+
+@contextlib.contextmanager
+def request_cache() -> Iterator[Dict[Hashable, Any]]:
+    """Open a cache scope for the current context."""
+    token = _cache.set({})
+    try:
+        yield _cache.get()
+    finally:
+        _cache.reset(token)
+
+
+@contextlib.contextmanager
+def shared_request_cache() -> Iterator[Dict[Hashable, Any]]:
+    """Join the cache scope of the current context, or open one if there is none.
+
+    Middleware use this so that they, the middleware inside them and the
+    route share one scope, e.g. to verify the ID token once per request.
+    """
+    cache = _cache.get()
+    if cache is not None:
+        yield cache
+        return
+    with request_cache() as cache:
+        yield cache
+
+
+def cached(key: Hashable, compute: Callable[[], Any]) -> Any:
+    """Return compute(), memoized under key in the current cache scope."""
+    cache = _cache.get()
+    if cache is None:
+        return compute()
+    if key not in cache:
+        cache[key] = compute()
+    return cache[key]
+
+
+async def cached_async(key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+    """Await compute(), memoized under key; concurrent callers share one call.
+
+    Callers may run on different event loops, e.g. the worker-thread loops
+    of BaseService.gather_stages, so the result is shared through a
+    thread-safe future.
+    """
+    cache = _cache.get()
+    if cache is None:
+        return await compute()
+    future: concurrent.futures.Future = concurrent.futures.Future()
+    existing = cache.setdefault(key, future)
+    if existing is future:
+        try:
+            future.set_result(await compute())
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+    return await asyncio.wrap_future(existing)
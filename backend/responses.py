@@ -0,0 +1,161 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Dict, List, Literal, Optional, get_args
+import msgpack
+import orjson
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+Layout = Literal["rows", "columnar"]
+LAYOUT_DESCRIPTION = (
+    "rows: an array of objects. columnar: one array per field, "
+    "which is smaller and compresses better on long lists"
+)
+
+
+def orjson_default(value: Any) -> Any:
+    """Serialize the types orjson doesn't handle natively.
+
+    Pydantic models are dumped without re-validation and Decimals are encoded
+    the same way FastAPI's jsonable_encoder does (int if integral, else float).
+    Datetimes and integer cents are handled by orjson directly, datetime
+    subclasses are converted here.
+    """
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, datetime):
+        # Subclasses such as Firestore's DatetimeWithNanoseconds
+        return value.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response serialized with orjson.
+
+    Returning this from a route bypasses FastAPI's response_model validation
+    and jsonable_encoder, so it should only wrap data the services already
+    validated. Used by list and report endpoints where those steps dominate
+    CPU time on large payloads.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=orjson_default,
+            option=orjson.OPT_NON_STR_KEYS
+        )
+
+
+def msgpack_default(value: Any) -> Any:
+    """Convert the types msgpack doesn't handle natively.
+
+    Naive datetimes are made UTC, which the packer then writes natively as
+    MessagePack timestamps: 6 to 10 bytes instead of an ISO string, decoded
+    to native dates by most clients.
+    """
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    raise TypeError(f"Type is not MessagePack serializable: {type(value).__name__}")
+
+
+class MsgPackResponse(Response):
+    """MessagePack response, see ORJSONResponse for when to use it."""
+    media_type = MSGPACK_MEDIA_TYPES[0]
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, default=msgpack_default, datetime=True)
+
+
+def to_columnar(content: Any) -> Any:
+    """Turn lists of objects into one list per field.
+
+    A top-level list becomes a {field: [values]} mapping; in a model or dict,
+    every value that is a list of objects is converted the same way. Lists
+    are expected to hold one type of object; missing keys become None. Empty
+    lists of objects become {} like non-empty ones, so clients always get a
+    mapping: in a model the field's type tells, in a dict every empty list
+    is taken to be a list of objects.
+    """
+    if isinstance(content, list):
+        return _columns(content)
+    if isinstance(content, BaseModel):
+        columnar = {}
+        for name, field in type(content).model_fields.items():
+            value = getattr(content, name)
+            columnar[name] = _columns(value) if _is_object_list(value, field.annotation) else value
+        return columnar
+    if isinstance(content, dict):
+        return {key: _columns(value) if _is_object_list(value) else value for key, value in content.items()}
+    return content
+
+
+def _is_object_list(value: Any, annotation: Any = None) -> bool:
+    """Whether a value is a list of objects; an empty one is if its annotation, when given, holds models."""
+    if not isinstance(value, list):
+        return False
+    if value:
+        return isinstance(value[0], (BaseModel, dict))
+    return annotation is None or _holds_models(annotation)
+
+
+def _holds_models(annotation: Any) -> bool:
+    """Whether a type is, or contains, a pydantic model, e.g. List[Optional[Transaction]]."""
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return True
+    return any(_holds_models(arg) for arg in get_args(annotation))
+
+
+def _columns(rows: List[Any]) -> Dict[str, List[Any]]:
+    if not rows:
+        return {}
+    if isinstance(rows[0], BaseModel):
+        return {name: [getattr(row, name) for row in rows] for name in type(rows[0]).model_fields}
+    keys = dict.fromkeys(key for row in rows for key in row)
+    return {key: [row.get(key) for row in rows] for key in keys}
+
+
+def parse_qvalues(header: str) -> Dict[str, float]:
+    """Parse an Accept or Accept-Encoding header into {value: q}."""
+    quality = {}
+    for item in header.split(","):
+        value, _, params = item.strip().partition(";")
+        if not value:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, number = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(number)
+                except ValueError:
+                    q = 0.0
+        quality[value.strip().lower()] = q
+    return quality
+
+
+def accepts_msgpack(request: Request) -> bool:
+    """Whether the Accept header prefers MessagePack over JSON."""
+    quality = parse_qvalues(request.headers.get("accept", ""))
+    msgpack_q = max(quality.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES)
+    return msgpack_q > 0 and msgpack_q >= quality.get("application/json", 0.0)
+
+
+def negotiated_response(request: Request, content: Any, layout: Optional[str] = None) -> Response:
+    """Serialize already validated content as the client asked.
+
+    MessagePack if the Accept header prefers it, else JSON; with
+    layout="columnar", lists of objects are sent as one list per field.
+    """
+    if layout == "columnar":
+        content = to_columnar(content)
+    response_class = MsgPackResponse if accepts_msgpack(request) else ORJSONResponse
+    return response_class(content, headers={"Vary": "Accept"})
@@ -0,0 +1,85 @@
+import asyncio
+from datetime import datetime
+from fastapi import APIRouter, Depends, Request, Path, Query
+from firebase_admin import firestore
+from firebase_app import get_firestore_client
+from typing import Optional
+from analytics import TransactionColumns
+from responses import ORJSONResponse
+from services.analytics_service import AnalyticsService
+from services.budget_service import BudgetService
+from utils import assert_budget_owner, handle_exceptions, parse_month
+
+route = "analytics"
+Service = AnalyticsService
+
+router = APIRouter(
+    prefix="/api/budgets",
+    tags=[route.capitalize()],
+    responses={401: {"description": "Unauthorized"}}
+)
+
+# Create a dependency provider and add services' getters
+def get_db():
+    return get_firestore_client()
+
+def get_service(db: firestore.Client = Depends(get_db)):
+    return Service(db)
+
+def get_budget_service(db: firestore.Client = Depends(get_db)):
+    return BudgetService(db)
+
+
+async def get_budget_columns(
+    request: Request,
+    budget_id: str = Path(..., description="The ID of the budget"),
+    service: Service = Depends(get_service),
+    budget_service: BudgetService = Depends(get_budget_service)
+) -> TransactionColumns:
+    budget = await budget_service.get_budget(budget_id)
+    assert_budget_owner(request, budget)
+    return await asyncio.to_thread(service.get_columns, budget_id)
+
+
+@router.get("/{budget_id}/analytics/income-expense", response_class=ORJSONResponse)
+@handle_exceptions("Error getting income and expenses")
+async def get_income_expense(
+    period: str = Query("M", description="Period: D, W, M or Y"),
+    start_date: Optional[datetime] = Query(None, description="Inclusive start of the date range"),
+    end_date: Optional[datetime] = Query(None, description="Exclusive end of the date range"),
+    columns: TransactionColumns = Depends(get_budget_columns)
+):
+    return ORJSONResponse(columns.income_expense_by_period(period, start_date, end_date))
+
+
+@router.get("/{budget_id}/analytics/spending-trend", response_class=ORJSONResponse)
+@handle_exceptions("Error getting spending trend")
+async def get_spending_trend(
+    period: str = Query("M", description="Period: D, W, M or Y"),
+    category_id: Optional[str] = Query(None, description="Restrict to one category"),
+    start_date: Optional[datetime] = Query(None, description="Inclusive start of the date range"),
+    end_date: Optional[datetime] = Query(None, description="Exclusive end of the date range"),
+    columns: TransactionColumns = Depends(get_budget_columns)
+):
+    return ORJSONResponse(columns.spending_trend(period, category_id, start_date, end_date))
+
+
+@router.get("/{budget_id}/analytics/category-deltas/{month}", response_class=ORJSONResponse)
+@handle_exceptions("Error getting category deltas")
+async def get_category_deltas(
+    month: str = Path(..., description="The month to compare with the previous one, YYYY-MM"),
+    columns: TransactionColumns = Depends(get_budget_columns)
+):
+    parse_month(month)
+    return ORJSONResponse(columns.category_deltas(month))
+
+
+@router.get("/{budget_id}/analytics/top-payees", response_class=ORJSONResponse)
+@handle_exceptions("Error getting top payees")
+async def get_top_payees(
+    limit: int = Query(10, ge=1, le=100, description="Number of payees to return"),
+    start_date: Optional[datetime] = Query(None, description="Inclusive start of the date range"),
+    end_date: Optional[datetime] = Query(None, description="Exclusive end of the date range"),
+    columns: TransactionColumns = Depends(get_budget_columns)
+):
+    return ORJSONResponse(columns.top_payees(limit, start_date, end_date))
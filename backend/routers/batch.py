@@ -0,0 +1,49 @@
+from typing import List
+from fastapi import APIRouter, Depends, Request
+from firebase_admin import firestore
+from firebase_app import get_firestore_client
+from request_cache import request_cache
+from responses import ORJSONResponse
+from services.batch_service import BatchService, BatchRequest, SubResponse
+from utils import handle_exceptions
+
+route = "batch"
+Service = BatchService
+
+router = APIRouter(
+    prefix=f"/api/{route}",
+    tags=[route.capitalize()],
+    responses={401: {"description": "Unauthorized"}}
+)
+
+# Create a dependency provider and add services' getters
+def get_db():
+    return get_firestore_client()
+
+def get_service(db: firestore.Client = Depends(get_db)):
+    return Service(db)
+
+
+@router.post(
+    "",
+    response_model=List[SubResponse],
+    response_class=ORJSONResponse
+)
+@handle_exceptions("Error executing batch")
+async def execute_batch(
+    request: Request,
+    batch: BatchRequest,
+    service: Service = Depends(get_service)
+):
+    """Run up to 20 API requests in one round trip.
+
+    Sub-requests are authenticated with the batch's token, verified once, and
+    share request-scoped lookups such as budget reads. Each result carries the
+    status and body the standalone request would have returned; a failed
+    sub-request doesn't fail the batch. Sub-requests count against the caller's rate limits like standalone
+    requests; a throttled one gets a 429 result.
+    """
+    with request_cache():
+        await service.verify_user(request)
+        results = await service.execute(request, batch.requests)
+    return ORJSONResponse([result.model_dump() for result in results])
@@ -0,0 +1,53 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Request, Path, Query
+from firebase_admin import firestore
+from firebase_app import get_firestore_client
+from models import Category
+from responses import LAYOUT_DESCRIPTION, Layout, ORJSONResponse, negotiated_response
+from services.budget_service import BudgetService
+from services.category_service import CategoryService
+from sparse_fields import FIELDS_DESCRIPTION, parse_fields
+from utils import assert_budget_owner, handle_exceptions
+
+route = "categories"
+Service = CategoryService
+Model = Category
+
+router = APIRouter(
+    prefix="/api/budgets",
+    tags=[route.capitalize()],
+    responses={401: {"description": "Unauthorized"}}
+)
+
+# Create a dependency provider and add services' getters
+def get_db():
+    return get_firestore_client()
+
+def get_service(db: firestore.Client = Depends(get_db)):
+    return Service(db)
+
+def get_budget_service(db: firestore.Client = Depends(get_db)):
+    return BudgetService(db)
+
+
+@router.get(
+    "/{budget_id}/categories",
+    response_model=List[Model],
+    response_class=ORJSONResponse
+)
+@handle_exceptions(f"Error listing {route}")
+async def list_categories(
+    request: Request,
+    budget_id: str = Path(..., description="The ID of the budget"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    layout: Layout = Query("rows", description=LAYOUT_DESCRIPTION),
+    service: Service = Depends(get_service),
+    budget_service: BudgetService = Depends(get_budget_service)
+):
+    selected = parse_fields(fields, Model)
+    budget = await budget_service.get_budget(budget_id)
+    assert_budget_owner(request, budget)
+
+    categories = await service.get_categories_for_budget(budget_id, selected)
+    # Already validated by the service, skip response_model re-validation
+    return negotiated_response(request, categories, layout)
@@ -0,0 +1,51 @@
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, Request, Path, Query
+from firebase_admin import firestore
+from firebase_app import get_firestore_client
+from responses import ORJSONResponse
+from services.budget_changes_service import BudgetChangesService, BudgetChanges
+from services.budget_service import BudgetService
+from utils import assert_budget_owner, handle_exceptions
+
+route = "changes"
+Service = BudgetChangesService
+
+router = APIRouter(
+    prefix="/api/budgets",
+    tags=[route.capitalize()],
+    responses={401: {"description": "Unauthorized"}}
+)
+
+# Create a dependency provider and add services' getters
+def get_db():
+    return get_firestore_client()
+
+def get_service(db: firestore.Client = Depends(get_db)):
+    return Service(db)
+
+def get_budget_service(db: firestore.Client = Depends(get_db)):
+    return BudgetService(db)
+
+
+@router.get(
+    "/{budget_id}/changes",
+    response_model=BudgetChanges,
+    response_class=ORJSONResponse
+)
+@handle_exceptions("Error getting budget changes")
+async def get_budget_changes(
+    request: Request,
+    budget_id: str = Path(..., description="The ID of the budget"),
+    since: Optional[datetime] = Query(
+        None, description="Watermark returned by the previous call; omit for the full budget state"
+    ),
+    service: Service = Depends(get_service),
+    budget_service: BudgetService = Depends(get_budget_service)
+):
+    budget = await budget_service.get_budget(budget_id)
+    assert_budget_owner(request, budget)
+
+    changes = await service.get_changes(budget, budget_id, since)
+    # Already validated by the service, skip response_model re-validation
+    return ORJSONResponse(changes)
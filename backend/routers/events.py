@@ -0,0 +1,65 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Request, Path, Query
+from fastapi.responses import StreamingResponse
+from firebase_admin import firestore
+from firebase_app import get_firestore_client
+import orjson
+from responses import orjson_default
+from services.budget_events_service import BudgetEventsService
+from services.budget_service import BudgetService
+from utils import assert_budget_owner, handle_exceptions
+
+route = "events"
+Service = BudgetEventsService
+
+router = APIRouter(
+    prefix="/api/budgets",
+    tags=[route.capitalize()],
+    responses={401: {"description": "Unauthorized"}}
+)
+
+# Create a dependency provider and add services' getters
+def get_db():
+    return get_firestore_client()
+
+def get_service(db: firestore.Client = Depends(get_db)):
+    return Service(db)
+
+def get_budget_service(db: firestore.Client = Depends(get_db)):
+    return BudgetService(db)
+
+
+def format_event(event: Optional[dict]) -> bytes:
+    """Encode an event as a Server-Sent Events message, None as a keep-alive comment."""
+    if event is None:
+        return b": keep-alive\n\n"
+    lines = [f"event: {event['type']}"]
+    if "id" in event:
+        lines.append(f"id: {event['id']}")
+    lines.append("data: " + orjson.dumps(event, default=orjson_default).decode())
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+@router.get("/{budget_id}/events", response_class=StreamingResponse)
+@handle_exceptions("Error streaming budget events")
+async def stream_budget_events(
+    request: Request,
+    budget_id: str = Path(..., description="The ID of the budget"),
+    access_token: Optional[str] = Query(
+        None, description="ID token, for EventSource clients that can't send an Authorization header"
+    ),
+    service: Service = Depends(get_service),
+    budget_service: BudgetService = Depends(get_budget_service)
+):
+    budget = await budget_service.get_budget(budget_id)
+    assert_budget_owner(request, budget, access_token)
+
+    async def events():
+        async for event in service.subscribe(budget_id):
+            yield format_event(event)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,89 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Path, status
+from firebase_admin import firestore
+from firebase_app import get_firestore_client
+from services.budget_service import BudgetService
+from services.job_service import Job, JobService
+from services.recurring_transaction_service import RecurringTransactionService
+from utils import assert_budget_owner, get_token, handle_exceptions, verify_token
+
+route = "jobs"
+Service = JobService
+
+router = APIRouter(
+    prefix="/api",
+    tags=[route.capitalize()],
+    responses={401: {"description": "Unauthorized"}}
+)
+
+# Create a dependency provider and add services' getters
+def get_db():
+    return get_firestore_client()
+
+def get_service(db: firestore.Client = Depends(get_db)):
+    return Service(db)
+
+def get_budget_service(db: firestore.Client = Depends(get_db)):
+    return BudgetService(db)
+
+def get_recurring_service(db: firestore.Client = Depends(get_db)):
+    return RecurringTransactionService(db)
+
+def assert_job_owner(request: Request, job: Job):
+    # Other users' jobs are reported missing rather than forbidden, job IDs aren't secret
+    if job is None or job.tenant_id != verify_token(get_token(request))['uid']:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+
+
+@router.get("/jobs/{job_id}", response_model=Job)
+@handle_exceptions("Error getting job")
+async def get_job(
+    request: Request,
+    job_id: str = Path(..., description="The ID of the job"),
+    service: Service = Depends(get_service)
+):
+    """Status and progress of a background job; poll it until the job has finished."""
+    job = await service.get_job(job_id)
+    assert_job_owner(request, job)
+    return job
+
+
+@router.post("/jobs/{job_id}/cancel", response_model=Job)
+@handle_exceptions("Error cancelling job")
+async def cancel_job(
+    request: Request,
+    job_id: str = Path(..., description="The ID of the job"),
+    service: Service = Depends(get_service)
+):
+    """Cancel a job. A running job stops at its next progress report, keeping what it did."""
+    assert_job_owner(request, await service.get_job(job_id))
+    return await service.cancel(job_id)
+
+
+@router.delete("/budgets/{budget_id}", response_model=Job, status_code=status.HTTP_202_ACCEPTED)
+@handle_exceptions("Error deleting budget")
+async def delete_budget(
+    request: Request,
+    budget_id: str = Path(..., description="The ID of the budget"),
+    budget_service: BudgetService = Depends(get_budget_service)
+):
+    """Delete a budget with all of its documents, in a background job."""
+    budget = await budget_service.get_budget(budget_id)
+    assert_budget_owner(request, budget)
+    return await budget_service.delete_budget(budget_id, cascade=True)
+
+
+@router.post("/budgets/{budget_id}/recurring/generate", response_model=Job, status_code=status.HTTP_202_ACCEPTED)
+@handle_exceptions("Error generating recurring transactions")
+async def generate_recurring_transactions(
+    request: Request,
+    budget_id: str = Path(..., description="The ID of the budget"),
+    service: RecurringTransactionService = Depends(get_recurring_service),
+    budget_service: BudgetService = Depends(get_budget_service)
+):
+    """Create the due occurrences of the budget's recurring transactions, in a background job."""
+    budget = await budget_service.get_budget(budget_id)
+    assert_budget_owner(request, budget)
+    return await service.submit_generation(budget_id, budget.user_id)
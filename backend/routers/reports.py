@@ -0,0 +1,115 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Request, Path, Query, status
+from firebase_admin import firestore
+from firebase_app import get_firestore_client
+from services.budget_report_service import BudgetReportService, MonthlyBudgetReport, RangeBudgetReport
+from services.budget_service import BudgetService
+from services.category_service import CategoryService
+from services.job_service import Job
+from services.monthly_aggregate_service import MonthlyAggregateService
+from services.transaction_service import TransactionService
+from models import Transaction
+from sparse_fields import FIELDS_DESCRIPTION, parse_fields
+from responses import LAYOUT_DESCRIPTION, Layout, ORJSONResponse, negotiated_response
+from utils import assert_budget_owner, handle_exceptions, parse_month
+
+route = "reports"
+Service = BudgetReportService
+
+router = APIRouter(
+    prefix="/api/budgets",
+    tags=[route.capitalize()],
+    responses={401: {"description": "Unauthorized"}}
+)
+
+# Create a dependency provider and add services' getters
+def get_db():
+    return get_firestore_client()
+
+def get_budget_service(db: firestore.Client = Depends(get_db)):
+    return BudgetService(db)
+
+def get_service(
+    db: firestore.Client = Depends(get_db),
+    budget_service: BudgetService = Depends(get_budget_service)
+):
+    return Service(db, budget_service, CategoryService(db), TransactionService(db))
+
+def get_aggregate_service(db: firestore.Client = Depends(get_db)):
+    return MonthlyAggregateService(db)
+
+
+@router.get(
+    "/{budget_id}/reports/monthly/{month}",
+    response_model=MonthlyBudgetReport,
+    response_class=ORJSONResponse
+)
+@handle_exceptions("Error getting monthly report")
+async def get_monthly_report(
+    request: Request,
+    budget_id: str = Path(..., description="The ID of the budget"),
+    month: str = Path(..., description="The month to get data for in format YYYY-MM"),
+    include_transactions: bool = Query(True, description="Include the month's transactions"),
+    fields: Optional[str] = Query(None, description=f"Transaction fields. {FIELDS_DESCRIPTION}"),
+    layout: Layout = Query("rows", description=LAYOUT_DESCRIPTION),
+    service: Service = Depends(get_service),
+    budget_service: BudgetService = Depends(get_budget_service)
+):
+    period = parse_month(month)
+    transaction_fields = parse_fields(fields, Transaction)
+    budget = await budget_service.get_budget(budget_id)
+    assert_budget_owner(request, budget)
+
+    report = await service.get_monthly_budget_data(
+        budget_id, period.year, period.month, include_transactions, transaction_fields
+    )
+    # Already validated by the service, skip response_model re-validation
+    return negotiated_response(request, report, layout)
+
+
+@router.get(
+    "/{budget_id}/reports/range",
+    response_model=RangeBudgetReport,
+    response_class=ORJSONResponse
+)
+@handle_exceptions("Error getting range report")
+async def get_range_report(
+    request: Request,
+    budget_id: str = Path(..., description="The ID of the budget"),
+    start_month: str = Query(..., alias="from", description="First month of the range, YYYY-MM"),
+    end_month: str = Query(..., alias="to", description="Last month of the range (inclusive), YYYY-MM"),
+    layout: Layout = Query("rows", description=LAYOUT_DESCRIPTION),
+    service: Service = Depends(get_service),
+    budget_service: BudgetService = Depends(get_budget_service)
+):
+    parse_month(start_month)
+    parse_month(end_month)
+    budget = await budget_service.get_budget(budget_id)
+    assert_budget_owner(request, budget)
+
+    report = await service.get_range_report(budget_id, start_month, end_month)
+    # Already validated by the service, skip response_model re-validation
+    return negotiated_response(request, report, layout)
+
+
+@router.post(
+    "/{budget_id}/reports/aggregates/rebuild",
+    response_model=Job,
+    status_code=status.HTTP_202_ACCEPTED
+)
+@handle_exceptions("Error rebuilding aggregates")
+async def rebuild_aggregates(
+    request: Request,
+    budget_id: str = Path(..., description="The ID of the budget"),
+    start_month: str = Query(..., alias="from", description="First month to rebuild, YYYY-MM"),
+    end_month: str = Query(..., alias="to", description="Last month to rebuild (inclusive), YYYY-MM"),
+    aggregate_service: MonthlyAggregateService = Depends(get_aggregate_service),
+    budget_service: BudgetService = Depends(get_budget_service)
+):
+    """Recompute the stored monthly aggregates of a range, in a background job."""
+    parse_month(start_month)
+    parse_month(end_month)
+    budget = await budget_service.get_budget(budget_id)
+    assert_budget_owner(request, budget)
+
+    return await aggregate_service.submit_rebuild(budget_id, budget.user_id, start_month, end_month)
@@ -0,0 +1,77 @@
+from datetime import datetime
+from fastapi import APIRouter, Depends, Request, Path, Query, status
+from firebase_admin import firestore
+from firebase_app import get_firestore_client
+from typing import List, Optional
+from models import Transaction
+from responses import LAYOUT_DESCRIPTION, Layout, ORJSONResponse, negotiated_response
+from services.budget_service import BudgetService
+from services.job_service import Job
+from services.transaction_service import TransactionImport, TransactionService
+from sparse_fields import FIELDS_DESCRIPTION, parse_fields
+from utils import assert_budget_owner, handle_exceptions
+
+route = "transactions"
+Service = TransactionService
+Model = Transaction
+
+router = APIRouter(
+    prefix="/api/budgets",
+    tags=[route.capitalize()],
+    responses={401: {"description": "Unauthorized"}}
+)
+
+# Create a dependency provider and add services' getters
+def get_db():
+    return get_firestore_client()
+
+def get_service(db: firestore.Client = Depends(get_db)):
+    return Service(db)
+
+def get_budget_service(db: firestore.Client = Depends(get_db)):
+    return BudgetService(db)
+
+
+@router.get(
+    "/{budget_id}/transactions",
+    response_model=List[Model],
+    response_class=ORJSONResponse
+)
+@handle_exceptions(f"Error listing {route}")
+async def list_transactions(
+    request: Request,
+    budget_id: str = Path(..., description="The ID of the budget"),
+    start_date: Optional[datetime] = Query(None, description="Inclusive start of the date range"),
+    end_date: Optional[datetime] = Query(None, description="Exclusive end of the date range"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    layout: Layout = Query("rows", description=LAYOUT_DESCRIPTION),
+    service: Service = Depends(get_service),
+    budget_service: BudgetService = Depends(get_budget_service)
+):
+    selected = parse_fields(fields, Model)
+    budget = await budget_service.get_budget(budget_id)
+    assert_budget_owner(request, budget)
+
+    transactions = await service.get_transactions_for_period(budget_id, start_date, end_date, selected)
+    # Already validated by the service, skip response_model re-validation
+    return negotiated_response(request, transactions, layout)
+
+
+@router.post(
+    "/{budget_id}/transactions/import",
+    response_model=Job,
+    status_code=status.HTTP_202_ACCEPTED
+)
+@handle_exceptions(f"Error importing {route}")
+async def import_transactions(
+    request: Request,
+    transaction_import: TransactionImport,
+    budget_id: str = Path(..., description="The ID of the budget"),
+    service: Service = Depends(get_service),
+    budget_service: BudgetService = Depends(get_budget_service)
+):
+    """Import statement rows into an account, in a background job; poll /api/jobs/{id} for progress."""
+    budget = await budget_service.get_budget(budget_id)
+    assert_budget_owner(request, budget)
+
+    return await service.submit_import(budget_id, budget.user_id, transaction_import)
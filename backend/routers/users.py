@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, Request, status, Path, Body, HTTPException
 from firebase_admin import firestore
+from firebase_app import get_firestore_client
 from typing import List
 from models import User
 from services.user_service import UserService
@@ -17,7 +18,7 @@ router = APIRouter(
 
 # Create a dependency provider and add services' getters
 def get_db():
-    return firestore.client()
+    return get_firestore_client()
 
 def get_service(db: firestore.Client = Depends(get_db)):
     return Service(db)
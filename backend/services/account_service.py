@@ -90,7 +90,8 @@ class AccountService(BaseService):
     def delete_account(self, account_id: str) -> bool:
         """Delete an account."""
         try:
-            self.db.collection(self.collection).document(account_id).delete()
+            doc_ref = self.db.collection(self.collection).document(account_id)
+            self.delete_with_tombstone(doc_ref, doc_ref.get().to_dict())
             self.logger.info(f"Deleted account {account_id}")
             return True
         except Exception as e:
@@ -108,7 +109,7 @@ class AccountService(BaseService):
                 if not doc.exists:
                     raise ValueError("Account not found")
                 
-                current_balance = doc.get('balance', 0)
+                current_balance = doc.to_dict().get('balance', 0)
                 new_balance = current_balance + amount
                 
                 transaction.update(doc_ref, {
@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+from firebase_admin import firestore
+from .base_service import BaseService, TOMBSTONES_COLLECTION
+from .budget_changes_service import WATERMARK_LAG
+from analytics import TransactionColumns
+from records import TransactionRecord, TRANSACTION_RECORD_FIELDS
+
+class _CachedColumns:
+    """Columns of one budget plus the watermark they are current up to."""
+
+    def __init__(self):
+        self.columns = TransactionColumns()
+        self.watermark: Optional[datetime] = None
+        # Deletes are read from the tombstones newer than this
+        self.deleted_watermark: Optional[datetime] = None
+        self.refreshed_at: Optional[float] = None
+        self.lock = threading.Lock()
+
+
+# Process-wide LRU cache shared by all AnalyticsService instances (one per request)
+MAX_CACHED_BUDGETS = 128
+_cache: "OrderedDict[str, _CachedColumns]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+class AnalyticsService(BaseService):
+    """Service answering multi-month analytics from columnar transaction data.
+
+    A budget's transactions are loaded once into a TransactionColumns store and
+    kept in a process-wide cache. Later calls only fetch transactions whose
+    `updated_at` is newer than the cached watermark, and drop the ones whose
+    tombstones are newer than the last deletes seen. Like delta sync, both
+    reads reach WATERMARK_LAG further back, so a write committed after a
+    newer one was read isn't missed; rows read twice are just upserted or
+    removed again.
+    """
+
+    def __init__(self, db: firestore.Client, refresh_interval: float = 30.0):
+        """Initialize the analytics service.
+
+        Args:
+            db: Firestore client instance
+            refresh_interval: Minimum seconds between incremental refreshes of a budget
+        """
+        super().__init__()
+        self.db = db
+        self.collection = "transactions"
+        self.refresh_interval = refresh_interval
+
+    def get_columns(self, budget_id: str, force_refresh: bool = False) -> TransactionColumns:
+        """Return the columnar transactions of a budget, loading or refreshing them.
+
+        Args:
+            budget_id: ID of the budget
+            force_refresh: Refresh even if the refresh interval hasn't elapsed
+
+        Returns:
+            TransactionColumns: Columns of the budget's transactions
+        """
+        with _cache_lock:
+            cached = _cache.setdefault(budget_id, _CachedColumns())
+            _cache.move_to_end(budget_id)
+            while len(_cache) > MAX_CACHED_BUDGETS:
+                _cache.popitem(last=False)
+
+        with cached.lock:
+            if (force_refresh or cached.refreshed_at is None
+                    or time.monotonic() - cached.refreshed_at >= self.refresh_interval):
+                self._refresh(budget_id, cached)
+            return cached.columns
+
+    def invalidate(self, budget_id: str) -> None:
+        """Drop the cached columns of a budget."""
+        with _cache_lock:
+            _cache.pop(budget_id, None)
+
+    def _refresh(self, budget_id: str, cached: _CachedColumns) -> None:
+        """Drop transactions deleted since the last refresh, then upsert the ones changed since the watermark."""
+        try:
+            removed = 0
+            if cached.deleted_watermark is None:
+                # Everything deleted before the full load below is already missing from it
+                cached.deleted_watermark = datetime.utcnow()
+            else:
+                deleted = []
+                deleted_watermark = cached.deleted_watermark
+                docs = self.db.collection(TOMBSTONES_COLLECTION)\
+                    .where("scope", "==", f"budget:{budget_id}")\
+                    .where("deleted_at", ">", deleted_watermark - WATERMARK_LAG)\
+                    .stream()
+                for doc in docs:
+                    data = doc.to_dict()
+                    if data.get("collection") == self.collection:
+                        deleted.append(data["document_id"])
+                    # Firestore returns timestamps timezone-aware, in UTC
+                    deleted_at = data["deleted_at"].replace(tzinfo=None)
+                    if deleted_at > deleted_watermark:
+                        deleted_watermark = deleted_at
+                removed = cached.columns.remove(deleted)
+                cached.deleted_watermark = deleted_watermark
+
+            query = self.db.collection(self.collection).where("budget_id", "==", budget_id)
+            if cached.watermark is not None:
+                query = query.where("updated_at", ">", cached.watermark - WATERMARK_LAG)
+            query = query.select(TRANSACTION_RECORD_FIELDS + ["updated_at"])
+
+            records = []
+            watermark = cached.watermark
+            for doc in query.stream():
+                data = doc.to_dict()
+                records.append(TransactionRecord.from_dict(doc.id, data))
+                updated_at = data.get("updated_at")
+                if updated_at is not None and (watermark is None or updated_at > watermark):
+                    watermark = updated_at
+
+            changed = cached.columns.upsert(records)
+            cached.watermark = watermark
+            cached.refreshed_at = time.monotonic()
+            self.logger.info(
+                f"Refreshed analytics for budget {budget_id}: "
+                f"{changed} changed, {removed} removed, {len(cached.columns)} total"
+            )
+        except Exception as e:
+            self.logger.error(f"Error refreshing analytics for budget {budget_id}: {str(e)}")
+            raise
@@ -1,14 +1,15 @@
 import asyncio
 import logging
-from typing import Any, Dict, Optional, TypeVar
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar, Union
 from functools import wraps
-import traceback
-from utils import get_token, maybe_throw_not_found, handle_exceptions
+from firebase_app import get_firestore_client
+from utils import get_token, maybe_throw_not_found, handle_exceptions, verify_token
 from firebase_admin import firestore, auth
-from abc import ABC, abstractmethod
+from abc import ABC
 from fastapi import HTTPException, Request
 from models import BaseAuditModel
-from pprint import pformat
 
 
 T = TypeVar("T", bound=BaseAuditModel)  # Defines a generic type variable
@@ -23,31 +24,61 @@ class NotImplementedException(Exception):
 class DocNotFoundException(Exception):
     pass
 
+class StageTimeoutException(ServiceException):
+    """Raised when a stage run by BaseService.gather_stages exceeds its timeout."""
+    pass
+
+# Default per-stage timeout of BaseService.gather_stages, in seconds
+DEFAULT_STAGE_TIMEOUT = 10.0
+
+# Deleted documents leave a tombstone here so delta sync can report the
+# deletion. Tombstones carry `expires_at` for the TTL policy in
+# firestore.indexes.json, which deletes them; clients that last synced
+# longer ago than the retention must do a full resync.
+TOMBSTONES_COLLECTION = "tombstones"
+TOMBSTONE_RETENTION = timedelta(days=30)
+
+def tombstone_scope(collection: str, document_id: str, data: Dict[str, Any]) -> Optional[str]:
+    """Scope a tombstone is synced under: its budget, or its user for user-level documents."""
+    if collection == "budgets":
+        return f"budget:{document_id}"
+    if data.get("budget_id"):
+        return f"budget:{data['budget_id']}"
+    if data.get("user_id"):
+        return f"user:{data['user_id']}"
+    return None
+
+def _call_blocking(call: Callable[[], Any]) -> Any:
+    """Run a stage in a worker thread.
+
+    Service methods are coroutines whose bodies block on the synchronous
+    Firestore client, so they are driven to completion on a private event loop.
+    """
+    result = call()
+    if asyncio.iscoroutine(result):
+        return asyncio.run(result)
+    return result
+
 class BaseService(ABC):
     """Base service class providing common functionality for all services."""
     
+    # Name of the service's Firestore collection, set by subclasses
+    collection: str = None
+    
     def __init__(self):
         """Initialize the base service with a logger and firestore."""
         self.logger = logging.getLogger(self.__class__.__name__)
         self._setup_logging()
-        self.db = firestore.client()
-    
-    @property
-    @abstractmethod
-    def collection(self):
-        raise NotImplementedException()  # Abstract property, must be implemented by subclasses
+        self.db = get_firestore_client()
+        self.stage_timings: Dict[str, float] = {}
 
     def _setup_logging(self) -> None:
-        """Configure logging for the service."""
-        # Only add handler if none exist
-        if not self.logger.handlers:
-            formatter = logging.Formatter(
-                '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-            )
-            handler = logging.StreamHandler()
-            handler.setFormatter(formatter)
-            self.logger.addHandler(handler)
-            self.logger.setLevel(logging.INFO)
+        """Configure logging for the service.
+
+        Handlers, level and format are set once for the process by
+        logger.configure_logging(); service loggers only propagate to it.
+        """
+        self.logger.propagate = True
     
     def log_error(self, error: Exception, context: Optional[Dict[str, Any]] = None) -> None:
         """
@@ -58,15 +89,96 @@ class BaseService(ABC):
             context: Optional dictionary with additional context
         """
         class_name = type(self).__name__
-        error_details = {
-            'error_type': type(error).__name__,
-            'error_message': str(error),
-            'traceback': traceback.format_exc()
-        }
-        if context:
-            error_details.update(context)
+        self.logger.error(
+            "%s error occurred: %s",
+            class_name,
+            error,
+            exc_info=error,
+            extra={'error_type': type(error).__name__, 'context': context}
+        )
+
+    async def gather_stages(
+        self,
+        stages: Dict[str, Callable[[], Union[Awaitable[Any], Any]]],
+        timeout: float = DEFAULT_STAGE_TIMEOUT
+    ) -> Dict[str, Any]:
+        """
+        Run independent stages concurrently and return their results by name.
+        
+        Each stage is a zero-argument callable returning a value or a coroutine.
+        Stages run in worker threads so blocking Firestore calls overlap. If any
+        stage fails or exceeds its timeout, the remaining stages are cancelled
+        and the error is raised. The wall time of every stage is recorded in
+        self.stage_timings (milliseconds).
+        
+        Args:
+            stages: Mapping of stage name to callable
+            timeout: Per-stage timeout in seconds
+            
+        Returns:
+            Dict mapping each stage name to its result
+            
+        Raises:
+            StageTimeoutException: If a stage exceeds the timeout
+        """
+        async def run_stage(name: str, call: Callable[[], Any]) -> Any:
+            start = time.perf_counter()
+            try:
+                return await asyncio.wait_for(asyncio.to_thread(_call_blocking, call), timeout)
+            except asyncio.TimeoutError:
+                raise StageTimeoutException(f"Stage '{name}' timed out after {timeout}s")
+            finally:
+                self.stage_timings[name] = round((time.perf_counter() - start) * 1000, 2)
+        
+        tasks = {name: asyncio.ensure_future(run_stage(name, call)) for name, call in stages.items()}
+        try:
+            results = await asyncio.gather(*tasks.values())
+        except BaseException:
+            # Threads can't be interrupted, but nothing waits on abandoned stages
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        finally:
+            self.logger.info("Stage timings", extra={"stage_timings_ms": self.stage_timings})
         
-        self.logger.error(f"{class_name} error occurred: {pformat(error_details)}")
+        return dict(zip(tasks.keys(), results))
+    
+    def record_stage(self, name: str, start: float) -> None:
+        """Record the time since start (a time.perf_counter() value) as a stage timing."""
+        self.stage_timings[name] = round((time.perf_counter() - start) * 1000, 2)
+
+    def tombstone(
+        self, collection: str, document_id: str, data: Optional[Dict[str, Any]]
+    ) -> Tuple[Any, Dict[str, Any]]:
+        """Reference and fields of the tombstone for a deleted document.
+
+        Write it in the same batch or transaction as the delete.
+
+        Args:
+            collection: Collection of the deleted document
+            document_id: ID of the deleted document
+            data: Fields of the deleted document, used to scope the tombstone
+
+        Returns:
+            Tuple of (tombstone document reference, tombstone fields)
+        """
+        now = datetime.utcnow()
+        ref = self.db.collection(TOMBSTONES_COLLECTION).document(f"{collection}:{document_id}")
+        return ref, {
+            "collection": collection,
+            "document_id": document_id,
+            "scope": tombstone_scope(collection, document_id, data or {}),
+            "deleted_at": now,
+            "expires_at": now + TOMBSTONE_RETENTION,
+        }
+
+    def delete_with_tombstone(self, doc_ref: Any, data: Optional[Dict[str, Any]]) -> None:
+        """Delete a document and write its tombstone in one commit."""
+        batch = self.db.batch()
+        batch.delete(doc_ref)
+        batch.set(*self.tombstone(doc_ref.parent.id, doc_ref.id, data))
+        batch.commit()
 
     # @handle_exceptions("Error verifying user")
     async def verify_user(self, request: Request):
@@ -75,9 +187,9 @@ class BaseService(ABC):
             raise HTTPException(status_code=401, detail="No token provided")
         
         # Verify the Firebase ID token
-        decoded_token = auth.verify_id_token(token)
+        decoded_token = verify_token(token)
         user_id = decoded_token['uid']
-        self.logger.info(f"Decoded user ID: {user_id}")
+        self.logger.debug("Decoded user ID: %s", user_id)
 
         return user_id
 
@@ -99,21 +211,15 @@ class BaseService(ABC):
         try:
             await self.verify_user(request)
             
-            # Log the raw collection class data
-            self.logger.info(f"Raw collection class data: {pformat(collection_class)}")
-            
             # Get dictionary representation excluding id field
             if exclude_id:
                 dict_data = collection_class.dict(exclude={'id'})
             else:
                 dict_data = collection_class.dict()
-            self.logger.info(f"Dictionary representation: {pformat(dict_data)}")
-            
             # Create the document directly
-            self.logger.info("Creating new document")
             created_doc = collection_class.create(self.db, self.collection, exclude_id, **dict_data)
             
-            self.logger.debug(f"Successfully created {class_name}")
+            self.logger.debug("Successfully created %s", class_name)
             return created_doc
         except Exception as e:
             self.log_error(e)
@@ -134,19 +240,17 @@ class BaseService(ABC):
             ServiceException: If document retrieval fails
         """
         class_name = type(self).__name__
-        self.logger.debug(f"Getting {class_name} with ID: {id}")
+        self.logger.debug("Getting %s with ID: %s", class_name, id)
         try:
             await self.verify_user(request)
-            self.logger.debug("Querying Firestore for document")
             doc_ref = self.db.collection(self.collection).document(id).get()
             
             if doc_ref.exists:
                 doc_data = doc_ref.to_dict()
-                self.logger.debug(f"Found doc data: {doc_data}")
-                self.logger.info(f"Successfully retrieved {class_name}: {id}")
+                self.logger.debug("Successfully retrieved %s: %s", class_name, id)
                 return self.__class__(**doc_data)
             else:
-                self.logger.debug(f"No {class_name} found with ID: {id}")
+                self.logger.debug("No %s found with ID: %s", class_name, id)
                 raise DocNotFoundException(f"{class_name} not found: {id}")
                 
         except DocNotFoundException:
@@ -160,7 +264,7 @@ class BaseService(ABC):
     # @handle_exceptions("Error updating document")
     async def update(self, request: Request, id: str, doc_update: T) -> T:
         class_name = type(self).__name__
-        self.logger.debug(f"Updating {class_name} with ID: {id}")
+        self.logger.debug("Updating %s with ID: %s", class_name, id)
         await self.verify_user(request)
         doc_ref = self.db.collection(self.collection).document(id)
         
@@ -182,8 +286,9 @@ class BaseService(ABC):
     # @handle_exceptions("Error deleting document")
     async def delete(self, request: Request, id: str):
         class_name = type(self).__name__
-        self.logger.debug(f"Deleting {class_name} with ID: {id}")
+        self.logger.debug("Deleting %s with ID: %s", class_name, id)
         await self.verify_user(request)
 
         doc_ref = self.db.collection(self.collection).document(id)
-        doc_ref.delete()
+        doc = doc_ref.get()
+        self.delete_with_tombstone(doc_ref, doc.to_dict())
@@ -0,0 +1,196 @@
+import asyncio
+import re
+import time
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+from urllib.parse import urlsplit
+import orjson
+from fastapi import Request
+from fastapi.middleware.asyncexitstack import AsyncExitStackMiddleware
+from firebase_admin import firestore
+from pydantic import BaseModel, ConfigDict, Field
+from starlette.middleware.exceptions import ExceptionMiddleware
+from .base_service import BaseService, _call_blocking
+from rate_limit import sub_request_limits
+
+# Most sub-requests a single batch may carry
+MAX_BATCH_SIZE = 20
+# Streaming endpoints and the batch endpoint itself can't be batched
+UNBATCHABLE_PATHS = [re.compile(r"^/api/batch"), re.compile(r"/events$")]
+BATCH_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE"}
+
+class SubRequest(BaseModel):
+    # Unknown fields are rejected rather than ignored, e.g. the `atomic` flag
+    # of clients expecting their writes to be committed together
+    model_config = ConfigDict(extra="forbid")
+
+    id: Optional[str] = None  # Echoed in the result, to match results to requests
+    method: str = "GET"
+    path: str  # Including the query string, e.g. /api/budgets/b1/transactions?start_date=...
+    body: Optional[Any] = None
+
+class SubResponse(BaseModel):
+    id: Optional[str] = None
+    status: int
+    body: Optional[Any] = None
+
+class BatchRequest(BaseModel):
+    requests: List[SubRequest] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+
+class BatchService(BaseService):
+    """Service running several API requests inside one HTTP request.
+
+    Sub-requests go through the app's router, so they are validated,
+    authorized and handled exactly like standalone requests, without the
+    per-request middleware. Sub-requests run concurrently in worker threads;
+    one running longer than the timeout gets a 504 result without failing
+    the rest of the batch.
+    """
+
+    def __init__(self, db: firestore.Client, timeout: float = 30.0):
+        """Initialize the batch service.
+
+        Args:
+            db: Firestore client instance
+            timeout: Seconds each sub-request may take
+        """
+        super().__init__()
+        self.db = db
+        self.collection = None
+        self.timeout = timeout
+
+    async def execute(self, request: Request, sub_requests: List[SubRequest]) -> List[SubResponse]:
+        """Run the sub-requests with the caller's credentials.
+
+        Args:
+            request: The batch request, whose Authorization header is reused
+            sub_requests: Requests to run
+
+        Returns:
+            List[SubResponse]: One result per sub-request, in request order
+        """
+        for sub_request in sub_requests:
+            self._validate(sub_request)
+
+        dispatcher = self._dispatcher(request)
+        responses = await asyncio.gather(*(
+            self._run_one(dispatcher, request, index, sub_request)
+            for index, sub_request in enumerate(sub_requests)
+        ))
+        self.logger.info(
+            "Batch executed", extra={"sub_requests": len(sub_requests), "stage_timings": self.stage_timings}
+        )
+        return list(responses)
+
+    async def _run_stage(self, name: str, call: Callable[[], Awaitable[Any]]) -> Tuple[asyncio.Future, bool]:
+        """Run call in a worker thread, like gather_stages, waiting at most the timeout.
+
+        Returns:
+            The future of the call and whether it finished in time
+        """
+        start = time.perf_counter()
+        future = asyncio.ensure_future(asyncio.to_thread(_call_blocking, call))
+        done, _ = await asyncio.wait({future}, timeout=self.timeout)
+        self.record_stage(name, start)
+        return future, bool(done)
+
+    async def _run_one(
+        self, dispatcher: Any, request: Request, index: int, sub_request: SubRequest
+    ) -> SubResponse:
+        limited = [(sub_request.method, urlsplit(sub_request.path).path)]
+        async with sub_request_limits(request.scope, limited) as rejection:
+            if rejection is not None:
+                return SubResponse(
+                    id=sub_request.id,
+                    status=429,
+                    body={"detail": rejection.detail, "retry_after": rejection.retry_after}
+                )
+            future, finished = await self._run_stage(
+                str(index), lambda: self._dispatch(dispatcher, request, sub_request)
+            )
+        if not finished:
+            # The thread can't be interrupted; its result is dropped
+            self.logger.error(f"Batch sub-request {sub_request.method} {sub_request.path} timed out")
+            return SubResponse(
+                id=sub_request.id,
+                status=504,
+                body={"detail": f"Sub-request timed out after {self.timeout}s"}
+            )
+        return future.result()
+
+    def _validate(self, sub_request: SubRequest) -> None:
+        sub_request.method = sub_request.method.upper()
+        if sub_request.method not in BATCH_METHODS:
+            raise ValueError(f"Unsupported method in batch: {sub_request.method}")
+        path = urlsplit(sub_request.path).path
+        if not path.startswith("/api/") or any(pattern.search(path) for pattern in UNBATCHABLE_PATHS):
+            raise ValueError(f"Path can't be batched: {sub_request.path}")
+
+    async def _dispatch(self, dispatcher: Any, request: Request, sub_request: SubRequest) -> SubResponse:
+        url = urlsplit(sub_request.path)
+        body = b"" if sub_request.body is None else orjson.dumps(sub_request.body)
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        authorization = request.headers.get("authorization")
+        if authorization:
+            headers.append((b"authorization", authorization.encode("latin-1")))
+
+        parent = request.scope
+        scope = {
+            "type": "http",
+            "asgi": parent.get("asgi", {"version": "3.0"}),
+            "http_version": parent.get("http_version", "1.1"),
+            "scheme": parent.get("scheme", "http"),
+            "server": parent.get("server"),
+            "client": parent.get("client"),
+            "root_path": parent.get("root_path", ""),
+            "method": sub_request.method,
+            "path": url.path,
+            "raw_path": url.path.encode(),
+            "query_string": url.query.encode(),
+            "headers": headers,
+            "app": parent.get("app"),
+        }
+        if "state" in parent:
+            scope["state"] = parent["state"]
+
+        received = False
+
+        async def receive():
+            nonlocal received
+            if received:
+                return {"type": "http.disconnect"}
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        status = 500
+        chunks = []
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        try:
+            await dispatcher(scope, receive, send)
+        except Exception as e:
+            self.logger.error(f"Error in batch sub-request {sub_request.method} {url.path}: {str(e)}")
+            return SubResponse(id=sub_request.id, status=500, body={"detail": "Internal Server Error"})
+
+        content = b"".join(chunks)
+        try:
+            parsed = orjson.loads(content) if content else None
+        except orjson.JSONDecodeError:
+            parsed = content.decode("utf-8", errors="replace")
+        return SubResponse(id=sub_request.id, status=status, body=parsed)
+
+    @staticmethod
+    def _dispatcher(request: Request) -> Any:
+        """The app's router with the exception handling FastAPI puts around it, built once per app."""
+        app = request.app
+        dispatcher = getattr(app.state, "batch_dispatcher", None)
+        if dispatcher is None:
+            dispatcher = ExceptionMiddleware(AsyncExitStackMiddleware(app.router), handlers=app.exception_handlers)
+            app.state.batch_dispatcher = dispatcher
+        return dispatcher
@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from firebase_admin import firestore
+from pydantic import BaseModel
+from .base_service import BaseService, TOMBSTONES_COLLECTION, TOMBSTONE_RETENTION
+from models import Budget
+
+# Collections synced per budget, with the field scoping their documents.
+# Payees belong to the user, so a budget syncs its owner's payees.
+SYNCED_COLLECTIONS = {
+    "accounts": "budget_id",
+    "transactions": "budget_id",
+    "categories": "budget_id",
+    "category_groups": "budget_id",
+    "payees": "user_id",
+}
+
+# The returned watermark trails the server clock, so writes whose
+# `updated_at` was taken before a query ran but committed after it are
+# still picked up by the next sync. Those documents are returned twice,
+# clients apply upserts idempotently.
+WATERMARK_LAG = timedelta(seconds=30)
+
+class Tombstone(BaseModel):
+    collection: str
+    document_id: str
+    deleted_at: datetime
+
+class BudgetChanges(BaseModel):
+    budget_id: str
+    since: Optional[datetime]
+    # Pass as `since` on the next call
+    watermark: datetime
+    # True when the whole budget state is returned, either because no
+    # watermark was given or because it is older than the tombstone retention
+    full_resync: bool
+    budget: Optional[Budget] = None  # Only if it changed
+    upserts: Dict[str, List[Dict[str, Any]]]
+    tombstones: List[Tombstone] = []
+
+class BudgetChangesService(BaseService):
+    """Service returning the documents of a budget changed since a watermark."""
+
+    def __init__(self, db: firestore.Client):
+        """Initialize the budget changes service.
+
+        Args:
+            db: Firestore client instance
+        """
+        super().__init__()
+        self.db = db
+        self.collection = TOMBSTONES_COLLECTION
+
+    async def get_changes(self, budget: Budget, budget_id: str, since: Optional[datetime]) -> BudgetChanges:
+        """Collect upserts and tombstones of a budget since a watermark.
+
+        Each synced collection is queried on `updated_at > since`, and the
+        tombstones of the budget and its owner on `deleted_at > since`. The
+        queries run concurrently and need composite indexes on
+        (budget_id or user_id, updated_at) and (scope, deleted_at).
+
+        Args:
+            budget: The budget, already fetched by the caller
+            budget_id: ID of the budget
+            since: Watermark returned by the previous call, None for everything
+
+        Returns:
+            BudgetChanges: Changed documents, deletions and the next watermark
+        """
+        try:
+            now = datetime.utcnow()
+            if since is not None and since.tzinfo is not None:
+                # Timestamps are stored as naive UTC
+                since = since.astimezone(timezone.utc).replace(tzinfo=None)
+            full_resync = since is None or since < now - TOMBSTONE_RETENTION
+            query_since = None if full_resync else since
+            scopes = {
+                "budget_id": budget_id,
+                "user_id": budget.user_id,
+            }
+
+            stages = {
+                collection: (lambda c=collection, f=field: self._changed_documents(c, f, scopes[f], query_since))
+                for collection, field in SYNCED_COLLECTIONS.items()
+            }
+            if not full_resync:
+                stages["tombstones"] = lambda: self._tombstones(
+                    [f"budget:{budget_id}", f"user:{budget.user_id}"], query_since
+                )
+            results = await self.gather_stages(stages)
+
+            upserts = {collection: results[collection] for collection in SYNCED_COLLECTIONS}
+            # A document deleted and then recreated is current, not deleted
+            current = {
+                (collection, doc["id"]) for collection, docs in upserts.items() for doc in docs
+            }
+            tombstones = [
+                tombstone for tombstone in results.get("tombstones", [])
+                if (tombstone.collection, tombstone.document_id) not in current
+            ]
+            budget_changed = query_since is None or (
+                budget.updated_at is not None and budget.updated_at.replace(tzinfo=None) > query_since
+            )
+
+            self.logger.info(
+                "Budget changes",
+                extra={
+                    "budget_id": budget_id,
+                    "full_resync": full_resync,
+                    "upserts": sum(len(docs) for docs in upserts.values()),
+                    "tombstones": len(tombstones),
+                }
+            )
+            return BudgetChanges(
+                budget_id=budget_id,
+                since=since,
+                watermark=now - WATERMARK_LAG,
+                full_resync=full_resync,
+                budget=budget if budget_changed else None,
+                upserts=upserts,
+                tombstones=tombstones,
+            )
+        except Exception as e:
+            self.logger.error(f"Error getting changes of budget {budget_id}: {str(e)}")
+            raise
+
+    def _changed_documents(
+        self, collection: str, field: str, value: str, since: Optional[datetime]
+    ) -> List[Dict[str, Any]]:
+        query = self.db.collection(collection).where(field, "==", value)
+        if since is not None:
+            query = query.where("updated_at", ">", since)
+        return [{"id": doc.id, **doc.to_dict()} for doc in query.stream()]
+
+    def _tombstones(self, scopes: List[str], since: datetime) -> List[Tombstone]:
+        docs = self.db.collection(TOMBSTONES_COLLECTION)\
+            .where("scope", "in", scopes)\
+            .where("deleted_at", ">", since)\
+            .stream()
+        return [Tombstone(**doc.to_dict()) for doc in docs]
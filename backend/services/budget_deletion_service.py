@@ -0,0 +1,167 @@
+from datetime import datetime
+from typing import Callable, Dict, Optional
+from firebase_admin import firestore
+from google.cloud.firestore_v1.bulk_writer import BulkWriterOptions, SendMode
+from .base_service import BaseService
+
+# Budget-scoped collections removed by a cascading delete, in deletion order.
+# The budget document itself is deleted last so an interrupted job can be resumed.
+BUDGET_CHILD_COLLECTIONS = [
+    "transactions",
+    "recurring_transactions",
+    "payees",
+    "categories",
+    "category_groups",
+    "category_trees",
+    "monthly_aggregates",
+    "duplicate_index",
+    "accounts",
+]
+
+class BudgetDeletionService(BaseService):
+    """Service for deleting a budget together with all of its child documents."""
+
+    def __init__(
+        self,
+        db: firestore.Client,
+        page_size: int = 500,
+        max_ops_per_second: int = 500
+    ):
+        """Initialize the deletion service.
+
+        Args:
+            db: Firestore client instance
+            page_size: Number of document references fetched per page
+            max_ops_per_second: Upper bound for the BulkWriter write rate
+        """
+        super().__init__()
+        self.db = db
+        self.collection = "budget_deletions"
+        self.page_size = page_size
+        self.max_ops_per_second = max_ops_per_second
+
+    def delete_budget_cascade(
+        self,
+        budget_id: str,
+        progress_callback: Optional[Callable[[Dict], None]] = None
+    ) -> Dict:
+        """Delete a budget and every document referencing it.
+
+        Progress is checkpointed in the `budget_deletions` collection after
+        every page, so calling this again for the same budget resumes the job.
+
+        Args:
+            budget_id: ID of the budget to delete
+            progress_callback: Optional callable receiving the checkpoint after each page
+
+        Returns:
+            Dict: Final checkpoint with per-collection deleted counts
+
+        Raises:
+            FirebaseError: If database operation fails
+        """
+        try:
+            checkpoint = self._load_checkpoint(budget_id)
+            self.logger.info(
+                f"Cascading delete of budget {budget_id} "
+                f"(completed collections: {checkpoint['completed_collections']})"
+            )
+
+            for collection in BUDGET_CHILD_COLLECTIONS:
+                if collection in checkpoint["completed_collections"]:
+                    continue
+                self._delete_collection_for_budget(
+                    collection, budget_id, checkpoint, progress_callback
+                )
+                checkpoint["completed_collections"].append(collection)
+                self._save_checkpoint(budget_id, checkpoint)
+
+            # Child documents get no tombstones of their own, syncing clients
+            # drop everything under the budget's tombstone
+            budget_ref = self.db.collection("budgets").document(budget_id)
+            self.delete_with_tombstone(budget_ref, None)
+            checkpoint["status"] = "completed"
+            checkpoint["completed_at"] = datetime.utcnow()
+            self._save_checkpoint(budget_id, checkpoint)
+            self._report(checkpoint, progress_callback)
+
+            self.logger.info(f"Deleted budget {budget_id}: {checkpoint['deleted_counts']}")
+            return checkpoint
+
+        except Exception as e:
+            self.logger.error(f"Error deleting budget {budget_id}: {str(e)}")
+            raise
+
+    def is_pending(self, budget_id: str) -> bool:
+        """Check whether a cascading delete of this budget was interrupted."""
+        doc = self.db.collection(self.collection).document(budget_id).get()
+        return doc.exists and doc.to_dict().get("status") == "in_progress"
+
+    def _delete_collection_for_budget(
+        self,
+        collection: str,
+        budget_id: str,
+        checkpoint: Dict,
+        progress_callback: Optional[Callable[[Dict], None]]
+    ) -> None:
+        """Page through a collection by budget_id and bulk delete each page."""
+        base_query = self.db.collection(collection)\
+            .where("budget_id", "==", budget_id)\
+            .order_by("__name__")\
+            .select([])\
+            .limit(self.page_size)
+
+        last_doc = None
+        while True:
+            query = base_query.start_after(last_doc) if last_doc else base_query
+            page = list(query.stream())
+            if not page:
+                break
+
+            writer = self.db.bulk_writer(
+                options=BulkWriterOptions(
+                    max_ops_per_second=self.max_ops_per_second,
+                    mode=SendMode.parallel
+                )
+            )
+            for doc in page:
+                writer.delete(doc.reference)
+            writer.close()
+
+            counts = checkpoint["deleted_counts"]
+            counts[collection] = counts.get(collection, 0) + len(page)
+            self._save_checkpoint(budget_id, checkpoint)
+            self._report(checkpoint, progress_callback)
+
+            if len(page) < self.page_size:
+                break
+            last_doc = page[-1]
+
+    def _load_checkpoint(self, budget_id: str) -> Dict:
+        """Load an existing checkpoint or start a new one."""
+        doc = self.db.collection(self.collection).document(budget_id).get()
+        if doc.exists:
+            checkpoint = doc.to_dict()
+            checkpoint["status"] = "in_progress"
+            return checkpoint
+
+        checkpoint = {
+            "budget_id": budget_id,
+            "status": "in_progress",
+            "completed_collections": [],
+            "deleted_counts": {},
+            "started_at": datetime.utcnow(),
+        }
+        self._save_checkpoint(budget_id, checkpoint)
+        return checkpoint
+
+    def _save_checkpoint(self, budget_id: str, checkpoint: Dict) -> None:
+        checkpoint["updated_at"] = datetime.utcnow()
+        self.db.collection(self.collection).document(budget_id).set(checkpoint)
+
+    def _report(self, checkpoint: Dict, progress_callback: Optional[Callable[[Dict], None]]) -> None:
+        self.logger.info(
+            f"Budget {checkpoint['budget_id']} deletion progress: {checkpoint['deleted_counts']}"
+        )
+        if progress_callback:
+            progress_callback(checkpoint)
@@ -0,0 +1,246 @@
+import asyncio
+import threading
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set
+from firebase_admin import firestore
+from .base_service import BaseService, TOMBSTONES_COLLECTION
+
+# Collections whose changes are streamed, each filtered on budget_id. The
+# budget document itself is watched as well.
+WATCHED_COLLECTIONS = ("accounts", "category_groups", "categories", "transactions")
+# Collections too large to read whole whenever listeners start, which the
+# initial snapshot would bill. Only their documents updated since the feed
+# started are watched, on (budget_id, updated_at), and their deletes are
+# read from the budget's tombstones.
+WINDOWED_COLLECTIONS = frozenset({"transactions"})
+
+# Event types besides document changes
+READY = "ready"      # listeners are live, changes from here on are delivered
+RESYNC = "resync"    # events were dropped, the client must refetch and reconnect
+
+
+class _Subscriber:
+    """Queue of one connected client, filled from listener threads."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue_size: int):
+        self.loop = loop
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(queue_size)
+        self.overflowed = False
+
+    def push(self, event: Dict[str, Any]) -> None:
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event: Dict[str, Any]) -> None:
+        if self.overflowed:
+            return
+        if self.queue.full():
+            # A slow client gets a resync instead of an unbounded backlog
+            self.overflowed = True
+            self.queue.get_nowait()
+            self.queue.put_nowait({"type": RESYNC})
+            return
+        self.queue.put_nowait(event)
+
+
+class _BudgetFeed:
+    """The snapshot listeners of one budget and the clients they fan out to."""
+
+    def __init__(self, budget_id: str):
+        self.budget_id = budget_id
+        self.subscribers: Set[_Subscriber] = set()
+        self.watches: List[Any] = []
+        self.pending_initial = 0
+        self.ready = False
+        self.sequence = 0
+        self.close_timer: Optional[threading.Timer] = None
+        self.lock = threading.Lock()
+
+    def start(self, db: firestore.Client) -> None:
+        started_at = datetime.utcnow()
+        targets = [("budgets", db.collection("budgets").document(self.budget_id))]
+        for collection in WATCHED_COLLECTIONS:
+            query = db.collection(collection).where("budget_id", "==", self.budget_id)
+            if collection in WINDOWED_COLLECTIONS:
+                query = query.where("updated_at", ">=", started_at)
+            targets.append((collection, query))
+        targets.append((TOMBSTONES_COLLECTION, db.collection(TOMBSTONES_COLLECTION)
+            .where("scope", "==", f"budget:{self.budget_id}")
+            .where("deleted_at", ">=", started_at)))
+        self.pending_initial = len(targets)
+        for collection, target in targets:
+            self.watches.append(target.on_snapshot(self._callback(collection)))
+
+    def stop(self) -> None:
+        for watch in self.watches:
+            watch.unsubscribe()
+        self.watches = []
+
+    def _callback(self, collection: str) -> Callable:
+        initial = True
+
+        def on_snapshot(docs, changes, read_time) -> None:
+            nonlocal initial
+            if initial:
+                # The first snapshot is the current state, which clients fetch themselves
+                initial = False
+                self._initial_snapshot_received()
+                return
+            with self.lock:
+                for change in changes:
+                    event = self._event(collection, change)
+                    if event is None:
+                        continue
+                    self.sequence += 1
+                    event.update({"id": self.sequence, "read_time": read_time})
+                    for subscriber in self.subscribers:
+                        subscriber.push(event)
+
+        return on_snapshot
+
+    @staticmethod
+    def _event(collection: str, change: Any) -> Optional[Dict[str, Any]]:
+        """The event of a document change, or None for changes not streamed."""
+        removed = change.type.name == "REMOVED"
+        if collection == TOMBSTONES_COLLECTION:
+            # The windowed collections' deletes; others are seen by their own listeners
+            data = change.document.to_dict()
+            if removed or data.get("collection") not in WINDOWED_COLLECTIONS:
+                return None
+            return {
+                "type": "removed",
+                "collection": data["collection"],
+                "document_id": data["document_id"],
+                "data": None,
+            }
+        if removed and collection in WINDOWED_COLLECTIONS:
+            # Reported by its tombstone
+            return None
+        return {
+            "type": change.type.name.lower(),
+            "collection": collection,
+            "document_id": change.document.id,
+            "data": None if removed else change.document.to_dict(),
+        }
+
+    def _initial_snapshot_received(self) -> None:
+        with self.lock:
+            self.pending_initial -= 1
+            if self.pending_initial > 0 or self.ready:
+                return
+            self.ready = True
+            for subscriber in self.subscribers:
+                subscriber.push({"type": READY})
+
+    def add(self, subscriber: _Subscriber) -> None:
+        with self.lock:
+            self.subscribers.add(subscriber)
+            if self.ready:
+                subscriber.push({"type": READY})
+
+
+# Process-wide feeds shared by all BudgetEventsService instances (one per request)
+_feeds: Dict[str, _BudgetFeed] = {}
+_feeds_lock = threading.Lock()
+
+
+class BudgetEventsService(BaseService):
+    """Service streaming budget changes from Firestore snapshot listeners.
+
+    Each budget with connected clients has one set of listeners per process,
+    however many clients watch it. Listeners are reference counted and
+    stopped `idle_timeout` seconds after the last client disconnects, so
+    navigating away and back doesn't restart them.
+    """
+
+    def __init__(self, db: firestore.Client, idle_timeout: float = 30.0, queue_size: int = 1000):
+        """Initialize the budget events service.
+
+        Args:
+            db: Firestore client instance
+            idle_timeout: Seconds listeners of a budget outlive its last client
+            queue_size: Events buffered per client before it is told to resync
+        """
+        super().__init__()
+        self.db = db
+        self.collection = "budgets"
+        self.idle_timeout = idle_timeout
+        self.queue_size = queue_size
+
+    async def subscribe(self, budget_id: str, heartbeat: float = 15.0) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """Yield the change events of a budget until the caller stops iterating.
+
+        The first event is `ready`, sent once the listeners are live; clients
+        should (re)fetch their data when they receive it and apply the
+        following `added`, `modified` and `removed` events to it. A `resync`
+        event ends the stream. A transaction first changed after the feed
+        started is reported `added`, so clients apply both `added` and
+        `modified` as upserts.
+
+        Args:
+            budget_id: ID of the budget
+            heartbeat: Seconds without events after which None is yielded, so
+                the caller can keep the connection alive
+
+        Yields:
+            Dict[str, Any]: Event, or None on heartbeat
+        """
+        subscriber = _Subscriber(asyncio.get_running_loop(), self.queue_size)
+        feed = await asyncio.to_thread(self._acquire, budget_id, subscriber)
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield event
+                if event["type"] == RESYNC:
+                    return
+        finally:
+            self._release(feed, subscriber)
+
+    def _acquire(self, budget_id: str, subscriber: _Subscriber) -> _BudgetFeed:
+        with _feeds_lock:
+            feed = _feeds.get(budget_id)
+            if feed is not None:
+                if feed.close_timer is not None:
+                    feed.close_timer.cancel()
+                    feed.close_timer = None
+                feed.add(subscriber)
+                return feed
+
+            feed = _BudgetFeed(budget_id)
+            try:
+                feed.start(self.db)
+            except Exception as e:
+                feed.stop()
+                self.logger.error(f"Error starting listeners for budget {budget_id}: {str(e)}")
+                raise
+            _feeds[budget_id] = feed
+            feed.add(subscriber)
+            self.logger.info("Started budget listeners", extra={"budget_id": budget_id})
+            return feed
+
+    def _release(self, feed: _BudgetFeed, subscriber: _Subscriber) -> None:
+        with _feeds_lock:
+            with feed.lock:
+                feed.subscribers.discard(subscriber)
+                if feed.subscribers:
+                    return
+            feed.close_timer = threading.Timer(self.idle_timeout, self._close_if_idle, args=(feed,))
+            feed.close_timer.daemon = True
+            feed.close_timer.start()
+
+    def _close_if_idle(self, feed: _BudgetFeed) -> None:
+        with _feeds_lock:
+            if feed.subscribers or _feeds.get(feed.budget_id) is not feed:
+                return
+            del _feeds[feed.budget_id]
+        feed.stop()
+        self.logger.info("Stopped idle budget listeners", extra={"budget_id": feed.budget_id})
+
+
+def active_feeds() -> Dict[str, int]:
+    """Budgets with live listeners in this process and their connected clients."""
+    with _feeds_lock:
+        return {budget_id: len(feed.subscribers) for budget_id, feed in _feeds.items()}
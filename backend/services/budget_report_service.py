@@ -1,14 +1,28 @@
+import time
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional, Union
 import logging
 from decimal import Decimal
+import numpy as np
 from firebase_admin import firestore
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, SerializeAsAny, field_validator
 from .base_service import BaseService
 from .budget_service import BudgetService
 from .category_service import CategoryService
 from .transaction_service import TransactionService
+from .monthly_aggregate_service import MonthlyAggregateService
 from models import Budget, Transaction, Category
+from records import (
+    RecordTotals, TransactionRecord, TRANSACTION_RECORD_FIELDS,
+    summarize_records, summarize_records_by_month
+)
+from sparse_fields import PartialModel, partial_model, stored_fields
+from utils import iter_months, month_bounds
+
+# Longest range a single range report may cover
+MAX_RANGE_MONTHS = 36
+# The only category fields reports use; skips fetching assigned_amounts
+REPORT_CATEGORY_FIELDS = ["id", "name"]
 
 class BudgetPeriod(BaseModel):
     year: int
@@ -35,10 +49,33 @@ class CategoryTotal(BaseModel):
 class MonthlyBudgetReport(BaseModel):
     budget: Budget
     period: BudgetPeriod
-    transactions: List[Transaction]
+    # Partial transactions when the report was requested with a sparse fieldset
+    transactions: List[Union[Transaction, SerializeAsAny[PartialModel]]] = []
     category_totals: List[CategoryTotal]
     summary: BudgetSummary
 
+class MonthSummary(BaseModel):
+    month: str
+    summary: BudgetSummary
+
+class CategoryRangeTotal(BaseModel):
+    category_id: str
+    category_name: str
+    monthly_amounts: List[Decimal]  # Aligned with RangeBudgetReport.months
+    total_amount: Decimal
+    average_amount: Decimal
+    trend: float  # Least-squares change per month
+
+class RangeBudgetReport(BaseModel):
+    budget: Budget
+    start_month: str
+    end_month: str
+    months: List[MonthSummary]
+    category_totals: List[CategoryRangeTotal]
+    summary: BudgetSummary
+    average: BudgetSummary
+    net_trend: float  # Least-squares change of the monthly net per month
+
 logger = logging.getLogger(__name__)
 
 class BudgetReportService(BaseService):
@@ -65,12 +102,15 @@ class BudgetReportService(BaseService):
         self.budget_service = budget_service
         self.category_service = category_service
         self.transaction_service = transaction_service
+        self.aggregate_service = MonthlyAggregateService(db)
 
     async def get_monthly_budget_data(
         self, 
         budget_id: str, 
         year: int,
-        month: int
+        month: int,
+        include_transactions: bool = True,
+        transaction_fields: Optional[List[str]] = None
     ) -> MonthlyBudgetReport:
         """
         Get aggregated budget data for a specific month.
@@ -79,6 +119,10 @@ class BudgetReportService(BaseService):
             budget_id: The ID of the budget
             year: The year for which to get data
             month: The month for which to get data (1-12)
+            include_transactions: Include the month's transactions in the report.
+                When False only the fields needed for the totals are fetched.
+            transaction_fields: Optional sparse fieldset of the included
+                transactions, from sparse_fields.parse_fields
 
         Returns:
             Dictionary containing aggregated budget data including:
@@ -100,29 +144,56 @@ class BudgetReportService(BaseService):
             if not 1 <= month <= 12:
                 raise ValueError("Month must be between 1 and 12")
             
-            # Get budget details
-            budget = await self.budget_service.get_budget(budget_id)
-            if not budget:
-                raise ValueError(f"Budget not found: {budget_id}")
-
-            # Get all relevant data
             start_date = datetime(year, month, 1)
             if month == 12:
                 end_date = datetime(year + 1, 1, 1)
             else:
                 end_date = datetime(year, month + 1, 1)
 
-            transactions = await self.transaction_service.get_transactions_for_period(
-                budget_id, start_date, end_date
+            if not include_transactions:
+                fetched_fields = TRANSACTION_RECORD_FIELDS
+            elif transaction_fields is not None:
+                # The totals need the record fields whichever fields are returned
+                fetched_fields = list(dict.fromkeys(TRANSACTION_RECORD_FIELDS + stored_fields(transaction_fields)))
+            else:
+                fetched_fields = None
+            transaction_model = (
+                Transaction if transaction_fields is None else partial_model(Transaction, tuple(transaction_fields))
             )
-            categories = await self.category_service.get_categories_for_budget(budget_id)
+
+            # The three reads are independent, fetch them concurrently
+            results = await self.gather_stages({
+                "budget": lambda: self.budget_service.get_budget(budget_id),
+                "transactions": lambda: self.transaction_service.get_transaction_snapshots_for_period(
+                    budget_id, start_date, end_date, fields=fetched_fields
+                ),
+                "categories": lambda: self.category_service.get_categories_for_budget(
+                    budget_id, fields=REPORT_CATEGORY_FIELDS
+                ),
+            })
+            budget = results["budget"]
+            if not budget:
+                raise ValueError(f"Budget not found: {budget_id}")
+            snapshots = results["transactions"]
+            categories = results["categories"]
             
-            # Calculate totals by category
-            category_totals = self._calculate_category_totals(transactions, categories)
+            # Aggregate on compact records, build models only for the response
+            aggregation_start = time.perf_counter()
+            records = []
+            transactions = []
+            for doc in snapshots:
+                data = doc.to_dict()
+                records.append(TransactionRecord.from_dict(doc.id, data))
+                if include_transactions:
+                    data['id'] = doc.id
+                    transactions.append(transaction_model.model_validate(data))
+            del snapshots
             
-            # Calculate overall totals
-            total_income = Decimal(str(sum(t.amount for t in transactions if t.amount > 0)))
-            total_expenses = Decimal(str(sum(t.amount for t in transactions if t.amount < 0)))
+            # Calculate overall and per-category totals in integer cents
+            totals = summarize_records(records)
+            del records
+            category_totals = self._calculate_category_totals(totals, categories)
+            self.record_stage("aggregation", aggregation_start)
             
             return MonthlyBudgetReport(
                 budget=budget,
@@ -130,9 +201,9 @@ class BudgetReportService(BaseService):
                 transactions=transactions,
                 category_totals=category_totals,
                 summary=BudgetSummary(
-                    total_income=total_income,
-                    total_expenses=abs(total_expenses),
-                    net=total_income + total_expenses
+                    total_income=Decimal(totals.income),
+                    total_expenses=Decimal(totals.expenses),
+                    net=Decimal(totals.net)
                 )
             )
             
@@ -143,34 +214,178 @@ class BudgetReportService(BaseService):
             logger.error(f"Error getting monthly budget data: {str(e)}")
             raise
 
+    async def get_range_report(
+        self,
+        budget_id: str,
+        start_month: str,
+        end_month: str
+    ) -> RangeBudgetReport:
+        """
+        Get per-month and per-category totals for a range of months.
+
+        Stored aggregates are used for months that have them; raw transactions
+        are scanned only for the missing months, which are then stored if they
+        have already ended.
+
+        Args:
+            budget_id: The ID of the budget
+            start_month: First month of the range in YYYY-MM format
+            end_month: Last month of the range in YYYY-MM format (inclusive)
+
+        Returns:
+            RangeBudgetReport with monthly summaries, per-category monthly
+            amounts, totals, averages and trends
+
+        Raises:
+            ValueError: If the budget_id is invalid or the range is invalid
+            FirestoreError: If there's an error accessing the database
+        """
+        try:
+            logger.info(f"Fetching range report for budget {budget_id} - {start_month} to {end_month}")
+
+            months = iter_months(start_month, end_month)
+            if not months:
+                raise ValueError("Start month must not be after end month")
+            if len(months) > MAX_RANGE_MONTHS:
+                raise ValueError(f"Range must not exceed {MAX_RANGE_MONTHS} months")
+
+            results = await self.gather_stages({
+                "budget": lambda: self.budget_service.get_budget(budget_id),
+                "categories": lambda: self.category_service.get_categories_for_budget(
+                    budget_id, fields=REPORT_CATEGORY_FIELDS
+                ),
+                "aggregates": lambda: self.aggregate_service.get_aggregates(budget_id, months),
+            })
+            budget = results["budget"]
+            if not budget:
+                raise ValueError(f"Budget not found: {budget_id}")
+            categories = results["categories"]
+            aggregates = results["aggregates"]
+
+            missing = [month for month in months if month not in aggregates]
+            if missing:
+                scan_start = time.perf_counter()
+                scanned_at = datetime.utcnow()
+                scanned = await self._scan_months(budget_id, missing)
+                self.aggregate_service.save_aggregates(budget_id, scanned, scanned_at)
+                aggregates.update(scanned)
+                self.record_stage("scan", scan_start)
+            logger.info(f"Range report used {len(months) - len(missing)} stored and {len(missing)} scanned months")
+
+            return self._build_range_report(budget, months, aggregates, categories)
+
+        except ValueError as e:
+            logger.error(f"Validation error in get_range_report: {str(e)}")
+            raise
+        except Exception as e:
+            logger.error(f"Error getting range report: {str(e)}")
+            raise
+
+    async def _scan_months(self, budget_id: str, months: List[str]) -> Dict[str, RecordTotals]:
+        """Aggregate raw transactions of the given months, one query per contiguous run."""
+        runs: List[List[str]] = []
+        for month in months:
+            if runs and month_bounds(runs[-1][-1])[1] == month_bounds(month)[0]:
+                runs[-1].append(month)
+            else:
+                runs.append([month])
+
+        records = []
+        for run in runs:
+            snapshots = await self.transaction_service.get_transaction_snapshots_for_period(
+                budget_id, month_bounds(run[0])[0], month_bounds(run[-1])[1],
+                fields=TRANSACTION_RECORD_FIELDS
+            )
+            records.extend(TransactionRecord.from_snapshot(doc) for doc in snapshots)
+
+        scanned = summarize_records_by_month(records)
+        empty = RecordTotals(0, 0, 0, {})
+        return {month: scanned.get(month, empty) for month in months}
+
+    def _build_range_report(
+        self,
+        budget: Budget,
+        months: List[str],
+        aggregates: Dict[str, RecordTotals],
+        categories: List[Category]
+    ) -> RangeBudgetReport:
+        """Assemble the month x category matrix and derive totals, averages and trends."""
+        count = len(months)
+        matrix = np.zeros((len(categories), count), dtype=np.int64)
+        income = np.zeros(count, dtype=np.int64)
+        expenses = np.zeros(count, dtype=np.int64)
+        for column, month in enumerate(months):
+            totals = aggregates[month]
+            income[column] = totals.income
+            expenses[column] = totals.expenses
+            for row, category in enumerate(categories):
+                matrix[row, column] = totals.by_category.get(category.id, 0)
+
+        def summary(total_income: int, total_expenses: int) -> BudgetSummary:
+            return BudgetSummary(
+                total_income=Decimal(total_income),
+                total_expenses=Decimal(total_expenses),
+                net=Decimal(total_income - total_expenses)
+            )
+
+        def average(values: np.ndarray) -> Decimal:
+            return (Decimal(int(values.sum())) / count).quantize(Decimal("0.01"))
+
+        return RangeBudgetReport(
+            budget=budget,
+            start_month=months[0],
+            end_month=months[-1],
+            months=[
+                MonthSummary(month=month, summary=summary(int(income[i]), int(expenses[i])))
+                for i, month in enumerate(months)
+            ],
+            category_totals=[
+                CategoryRangeTotal(
+                    category_id=category.id,
+                    category_name=category.name,
+                    monthly_amounts=[Decimal(int(amount)) for amount in matrix[row]],
+                    total_amount=Decimal(int(matrix[row].sum())),
+                    average_amount=average(matrix[row]),
+                    trend=self._trend(matrix[row])
+                )
+                for row, category in enumerate(categories)
+            ],
+            summary=summary(int(income.sum()), int(expenses.sum())),
+            average=BudgetSummary(
+                total_income=average(income),
+                total_expenses=average(expenses),
+                net=average(income - expenses)
+            ),
+            net_trend=self._trend(income - expenses)
+        )
+
+    @staticmethod
+    def _trend(values: np.ndarray) -> float:
+        """Least-squares slope of a monthly series, in cents per month."""
+        if len(values) < 2:
+            return 0.0
+        return round(float(np.polyfit(np.arange(len(values)), values.astype(np.float64), 1)[0]), 2)
+
     def _calculate_category_totals(
         self,
-        transactions: List[Transaction],
+        totals: RecordTotals,
         categories: List[Category]
     ) -> List[CategoryTotal]:
         """
-        Calculate total amounts for each category.
+        Build the category totals of the report.
 
         Args:
-            transactions: List of transactions for the period
+            totals: Integer-cent totals of the period's transactions
             categories: List of categories in the budget
 
         Returns:
-            Dictionary mapping category IDs to their total amounts
+            List of category totals, one per category of the budget
         """
-        category_amounts = {cat.id: Decimal('0') for cat in categories}
-        category_name_map = {cat.id: cat.name for cat in categories}
-        
-        for transaction in transactions:
-            if transaction.category_id in category_amounts:
-                category_amounts[transaction.category_id] += Decimal(str(transaction.amount))
-        
         return [
             CategoryTotal(
-                category_id=cat_id,
-                category_name=category_name_map[cat_id],
-                total_amount=amount
+                category_id=cat.id,
+                category_name=cat.name,
+                total_amount=Decimal(totals.by_category.get(cat.id, 0))
             )
-            for cat_id, amount in category_amounts.items()
+            for cat in categories
         ]
-
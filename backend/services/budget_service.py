@@ -2,7 +2,10 @@ from typing import List, Optional
 from datetime import datetime
 from firebase_admin import firestore
 from .base_service import BaseService
+from .budget_deletion_service import BudgetDeletionService
+from .job_service import DELETE_BUDGET, Job, JobService
 from models import Budget
+from request_cache import cached_async
 
 class BudgetService(BaseService):
     """Service for managing budget operations."""
@@ -54,20 +57,22 @@ class BudgetService(BaseService):
             FirebaseError: If database operation fails
         """
         try:
-            self.logger.info(f"Retrieving budget {budget_id}")
-            doc_ref = self.db.collection(self.collection).document(budget_id)
-            doc = doc_ref.get()
-            
-            if doc.exists:
-                data = doc.to_dict()
-                data['budget_id'] = doc.id
-                return Budget(**data)
-            return None
+            self.logger.debug("Retrieving budget %s", budget_id)
+            # Shared by the sub-requests of a batch
+            return await cached_async(("budget", budget_id), lambda: self._fetch_budget(budget_id))
             
         except Exception as e:
             self.logger.error(f"Error retrieving budget: {str(e)}")
             raise
     
+    async def _fetch_budget(self, budget_id: str) -> Optional[Budget]:
+        doc = self.db.collection(self.collection).document(budget_id).get()
+        if doc.exists:
+            data = doc.to_dict()
+            data['budget_id'] = doc.id
+            return Budget(**data)
+        return None
+
     async def get_user_budgets(self, user_id: str) -> List[Budget]:
         """Retrieve all budgets for a specific user.
         
@@ -137,14 +142,20 @@ class BudgetService(BaseService):
             self.logger.error(f"Error updating budget: {str(e)}")
             raise
     
-    async def delete_budget(self, budget_id: str) -> bool:
+    async def delete_budget(self, budget_id: str, cascade: bool = True) -> Optional[Job]:
         """Delete a budget.
         
+        A cascading delete runs as a background job: the budget's documents
+        are deleted page by page, and the budget itself last.
+        
         Args:
             budget_id: ID of the budget to delete
+            cascade: Also delete accounts, transactions, categories, category
+                groups, payees and recurring transactions of the budget
             
         Returns:
-            bool: True if deletion was successful
+            Optional[Job]: The deletion job when cascading, None once the
+                budget alone was deleted
             
         Raises:
             ValueError: If budget not found
@@ -152,14 +163,21 @@ class BudgetService(BaseService):
         """
         try:
             self.logger.info(f"Deleting budget {budget_id}")
+            deletion_service = BudgetDeletionService(self.db)
             doc_ref = self.db.collection(self.collection).document(budget_id)
             doc = doc_ref.get()
             
-            if not doc.exists:
+            if not doc.exists and not deletion_service.is_pending(budget_id):
                 raise ValueError(f"Budget {budget_id} not found")
             
-            doc_ref.delete()
-            return True
+            if cascade:
+                # An interrupted deletion no longer has its budget, it resumes under the same job key
+                tenant_id = doc.get("user_id") if doc.exists else None
+                return await JobService(self.db).submit(
+                    DELETE_BUDGET, tenant_id, {"budget_id": budget_id}, key=budget_id
+                )
+            self.delete_with_tombstone(doc_ref, doc.to_dict())
+            return None
             
         except Exception as e:
             self.logger.error(f"Error deleting budget: {str(e)}")
@@ -6,6 +6,7 @@ from google.cloud.firestore_v1.base_query import FieldFilter
 from models import CategoryGroup
 
 from .base_service import BaseService
+from .category_tree_service import CategoryTreeService
 from exceptions import (
     ValidationException,
     NotFoundException,
@@ -25,6 +26,7 @@ class CategoryGroupsService(BaseService):
         super().__init__()
         self.db = db
         self.collection = "category_groups"
+        self.tree_service = CategoryTreeService(db)
 
 
     async def create_category_group(self, user_id: str, data: CategoryGroup) -> CategoryGroup:
@@ -50,8 +52,11 @@ class CategoryGroupsService(BaseService):
         data.created_at = now
         data.updated_at = now
 
-        # Create in database using model_dump()
-        doc_ref = await self.db.collection(self.collection).add(data.model_dump(exclude={'id'}))
+        # Create the group and its category tree entry atomically
+        doc_ref = self.db.collection(self.collection).document()
+        self.tree_service.save_group(
+            data.budget_id, doc_ref.id, data.model_dump(exclude={'id'}), create=True
+        )
         data.id = doc_ref.id
 
         return data
@@ -71,7 +76,7 @@ class CategoryGroupsService(BaseService):
             NotFoundException: If the category group doesn't exist
             UnauthorizedException: If the user is not authorized
         """
-        doc = await self.db.collection(self.collection).document(group_id).get()
+        doc = self.db.collection(self.collection).document(group_id).get()
 
         if not doc.exists:
             raise NotFoundException(f"Category group {group_id} not found")
@@ -99,7 +104,7 @@ class CategoryGroupsService(BaseService):
             filter=FieldFilter("user_id", "==", user_id)
         )
         
-        docs = await query.get()
+        docs = query.get()
         category_groups = []
         
         for doc in docs:
@@ -132,14 +137,13 @@ class CategoryGroupsService(BaseService):
         
         # Update fields from input data
         current_group.name = data.name
-        current_group.categories = data.categories
         current_group.updated_at = datetime.utcnow()
         
-        # Update in database
+        # Update the group and its category tree entry atomically
         update_data = current_group.model_dump(
             exclude={'id', 'user_id', 'created_at'}
         )
-        await self.db.collection(self.collection).document(group_id).update(update_data)
+        self.tree_service.save_group(current_group.budget_id, group_id, update_data)
         
         return current_group
 
@@ -156,16 +160,38 @@ class CategoryGroupsService(BaseService):
             UnauthorizedException: If the user is not authorized
         """
         # Verify existence and ownership
-        await self.get_category_group(user_id, group_id)
+        category_group = await self.get_category_group(user_id, group_id)
         
-        # Delete the document
-        await self.db.collection(self.collection).document(group_id).delete()
+        # Delete the document; its categories are moved to ungrouped
+        self.tree_service.delete_group(category_group.budget_id, group_id)
+
+    async def get_category_tree(self, user_id: str, budget_id: str) -> Dict[str, Any]:
+        """
+        Get all category groups of a budget with their categories.
+
+        Args:
+            user_id: ID of the user
+            budget_id: ID of the budget
+
+        Returns:
+            Category tree with ordered groups and categories, and the ungrouped categories
+
+        Raises:
+            UnauthorizedException: If the user is not authorized
+        """
+        budget = self.db.collection("budgets").document(budget_id).get()
+        if not budget.exists:
+            raise NotFoundException(f"Budget {budget_id} not found")
+        if budget.get("user_id") != user_id:
+            raise UnauthorizedException("Not authorized to access this budget")
+
+        return self.tree_service.get_tree(budget_id)
 
     async def add_category_to_group(
         self, user_id: str, group_id: str, category_id: str
     ) -> Dict[str, Any]:
         """
-        Add a category to a category group.
+        Add a category to a category group, moving it out of its current group.
 
         Args:
             user_id: ID of the user
@@ -180,23 +206,23 @@ class CategoryGroupsService(BaseService):
             UnauthorizedException: If the user is not authorized
         """
         category_group = await self.get_category_group(user_id, group_id)
-        
-        if category_id not in category_group["categories"]:
-            category_group["categories"].append(category_id)
-            category_group["updated_at"] = datetime.utcnow()
-            
-            await self.db.collection(self.collection).document(group_id).update({
-                "categories": category_group["categories"],
-                "updated_at": category_group["updated_at"]
-            })
 
-        return category_group
+        self.tree_service.save_category(category_group.budget_id, category_id, {
+            "group_id": group_id,
+            "budget_id": category_group.budget_id,
+            "updated_at": datetime.utcnow()
+        })
+
+        return self._get_tree_group(category_group.budget_id, group_id)
 
     async def remove_category_from_group(
         self, user_id: str, group_id: str, category_id: str
     ) -> Dict[str, Any]:
         """
-        Remove a category from a category group.
+        Remove a category from a category group, keeping the category.
+
+        The category is left without a group and listed under the tree's
+        `ungrouped` categories until it is added to a group again.
 
         Args:
             user_id: ID of the user
@@ -211,15 +237,20 @@ class CategoryGroupsService(BaseService):
             UnauthorizedException: If the user is not authorized
         """
         category_group = await self.get_category_group(user_id, group_id)
-        
-        if category_id in category_group["categories"]:
-            category_group["categories"].remove(category_id)
-            category_group["updated_at"] = datetime.utcnow()
-            
-            await self.db.collection(self.collection).document(group_id).update({
-                "categories": category_group["categories"],
-                "updated_at": category_group["updated_at"]
+
+        group = self._get_tree_group(category_group.budget_id, group_id)
+        if any(category["id"] == category_id for category in group["categories"]):
+            self.tree_service.save_category(category_group.budget_id, category_id, {
+                "group_id": None,
+                "updated_at": datetime.utcnow()
             })
+            group = self._get_tree_group(category_group.budget_id, group_id)
 
-        return category_group
+        return group
 
+    def _get_tree_group(self, budget_id: str, group_id: str) -> Dict[str, Any]:
+        tree = self.tree_service.get_tree(budget_id)
+        for group in tree["groups"]:
+            if group["id"] == group_id:
+                return group
+        raise NotFoundException(f"Category group {group_id} not found")
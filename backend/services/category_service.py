@@ -2,7 +2,9 @@ from datetime import datetime
 from typing import List, Optional
 from firebase_admin import firestore
 from .base_service import BaseService, ServiceException
+from .category_tree_service import CategoryTreeService
 from models import Category
+from sparse_fields import partial_model, stored_fields
 
 class CategoryServiceException(ServiceException):
     """Specific exception class for category-related errors."""
@@ -21,6 +23,7 @@ class CategoryService(BaseService):
         super().__init__()
         self.db = db
         self.collection = "categories"
+        self.tree_service = CategoryTreeService(db)
         
     async def create_category(self, user_id: str, category: Category) -> Category:
         """Create a new budget category.
@@ -33,17 +36,20 @@ class CategoryService(BaseService):
             Category: Newly created category object
         """
         category_dict = category.model_dump(exclude={'id'})
+        budget_id = category.budget_id or self.tree_service.get_budget_id_for_group(category.group_id)
         category_dict.update({
             "user_id": user_id,
+            "budget_id": budget_id,
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow()
         })
         
+        # Create the category and its category tree entry atomically
         doc_ref = self.db.collection(self.collection).document()
-        await doc_ref.set(category)
+        self.tree_service.save_category(budget_id, doc_ref.id, category_dict, create=True)
         
-        category["id"] = doc_ref.id
-        return Category(**category)
+        category_dict["id"] = doc_ref.id
+        return Category(**category_dict)
         
     async def get_category(self, category_id: str, user_id: str) -> Category:
         """Retrieve a specific category by ID.
@@ -59,7 +65,7 @@ class CategoryService(BaseService):
             CategoryNotFoundError: If category doesn't exist or belongs to another user
         """
         doc_ref = self.db.collection(self.collection).document(category_id)
-        category = await doc_ref.get()
+        category = doc_ref.get()
         
         if not category.exists or category.get("user_id") != user_id:
             raise CategoryNotFoundError(f"Category {category_id} not found")
@@ -80,13 +86,38 @@ class CategoryService(BaseService):
         categories = []
         query = self.db.collection(self.collection).where("user_id", "==", user_id)
         
-        async for doc in query.stream():
+        for doc in query.stream():
             category_data = doc.to_dict()
             category_data["id"] = doc.id
             categories.append(Category(**category_data))
             
         return categories
         
+    async def get_categories_for_budget(self, budget_id: str, fields: Optional[List[str]] = None) -> List[Category]:
+        """Retrieve all categories of a budget.
+        
+        Args:
+            budget_id: ID of the budget
+            fields: Optional sparse fieldset from sparse_fields.parse_fields; only
+                these fields are fetched and partial models are returned
+            
+        Returns:
+            List[Category]: List of the budget's categories
+        """
+        categories = []
+        model = Category if fields is None else partial_model(Category, tuple(fields))
+        query = self.db.collection(self.collection).where("budget_id", "==", budget_id)
+        if fields is not None:
+            # Skips the assigned_amounts map, which grows every month
+            query = query.select(stored_fields(fields))
+        
+        for doc in query.stream():
+            category_data = doc.to_dict()
+            category_data["id"] = doc.id
+            categories.append(model(**category_data))
+            
+        return categories
+        
     async def update_category(self, category_id: str, user_id: str, 
                             category: Category) -> Category:
         """Update an existing category.
@@ -102,13 +133,14 @@ class CategoryService(BaseService):
         Raises:
             CategoryNotFoundError: If category doesn't exist or belongs to another user
         """
-        await self.get_category(category_id, user_id)
+        existing = await self.get_category(category_id, user_id)
+        budget_id = existing.budget_id or self.tree_service.get_budget_id_for_group(existing.group_id)
         
-        update_dict = category.model_dump(exclude_unset=True, exclude={'id', 'user_id'})
+        update_dict = category.model_dump(exclude_unset=True, exclude={'id', 'user_id', 'budget_id'})
         update_dict["updated_at"] = datetime.utcnow()
             
-        doc_ref = self.db.collection(self.collection).document(category_id)
-        await doc_ref.update(update_dict)
+        # Update the category and its category tree entry atomically
+        self.tree_service.save_category(budget_id, category_id, update_dict)
         
         return await self.get_category(category_id, user_id)
         
@@ -123,8 +155,9 @@ class CategoryService(BaseService):
             CategoryNotFoundError: If category doesn't exist or belongs to another user
         """
         # Verify category exists and belongs to user
-        await self.get_category(category_id, user_id)
+        existing = await self.get_category(category_id, user_id)
+        budget_id = existing.budget_id or self.tree_service.get_budget_id_for_group(existing.group_id)
         
-        doc_ref = self.db.collection(self.collection).document(category_id)
-        await doc_ref.delete()
+        # Delete the category and its category tree entry atomically
+        self.tree_service.delete_category(budget_id, category_id)
         
@@ -0,0 +1,309 @@
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from firebase_admin import firestore
+from .base_service import BaseService
+from exceptions import NotFoundException
+
+# Category fields copied into the tree. Amounts, targets, notes and audit
+# fields stay in the category documents: assigned_amounts gains a key every
+# month and would push the tree towards the 1 MiB document limit.
+TREE_CATEGORY_FIELDS = ["name", "group_id"]
+
+class CategoryTreeService(BaseService):
+    """Service maintaining one denormalized category tree document per budget.
+
+    The document holds the ordered category groups of a budget, each with its
+    ordered categories, and the categories removed from their group under
+    `ungrouped`, so the whole structure is loaded with a single read.
+    The `category_groups` and `categories` collections remain the source of
+    truth and the tree can always be rebuilt from them.
+    """
+
+    def __init__(self, db: firestore.Client):
+        """Initialize the category tree service.
+
+        Args:
+            db: Firestore client instance
+        """
+        super().__init__()
+        self.db = db
+        self.collection = "category_trees"
+
+    def get_tree(self, budget_id: str) -> Dict[str, Any]:
+        """Load the category tree of a budget, rebuilding it if it is missing.
+
+        Args:
+            budget_id: ID of the budget
+
+        Returns:
+            Dict: Tree with a `groups` list, each group holding its `categories`,
+                and the `ungrouped` categories
+        """
+        try:
+            doc = self.db.collection(self.collection).document(budget_id).get()
+            if doc.exists:
+                return doc.to_dict()
+            self.logger.info(f"No category tree for budget {budget_id}, rebuilding")
+            return self.rebuild_tree(budget_id)
+        except Exception as e:
+            self.logger.error(f"Error getting category tree for budget {budget_id}: {str(e)}")
+            raise
+
+    def rebuild_tree(self, budget_id: str) -> Dict[str, Any]:
+        """Rebuild the tree of a budget from the source collections and store it.
+
+        Args:
+            budget_id: ID of the budget
+
+        Returns:
+            Dict: The rebuilt tree
+        """
+        try:
+            tree = self._build_tree(budget_id)
+            self.db.collection(self.collection).document(budget_id).set(tree)
+            self.logger.info(f"Rebuilt category tree for budget {budget_id}")
+            return tree
+        except Exception as e:
+            self.logger.error(f"Error rebuilding category tree for budget {budget_id}: {str(e)}")
+            raise
+
+    def get_budget_id_for_group(self, group_id: str) -> str:
+        """Resolve the budget a category group belongs to.
+
+        Raises:
+            NotFoundException: If the category group doesn't exist
+        """
+        doc = self.db.collection("category_groups").document(group_id).get()
+        if not doc.exists:
+            raise NotFoundException(f"Category group {group_id} not found")
+        return doc.to_dict()["budget_id"]
+
+    def save_group(
+        self, budget_id: str, group_id: str, group_data: Dict[str, Any], create: bool = False
+    ) -> None:
+        """Write a category group document and its tree entry in one transaction.
+
+        Args:
+            budget_id: ID of the budget the group belongs to
+            group_id: ID of the category group
+            group_data: Fields to write
+            create: Create the document instead of updating the given fields
+        """
+        group_ref = self.db.collection("category_groups").document(group_id)
+
+        def write(transaction):
+            if create:
+                transaction.set(group_ref, group_data)
+            else:
+                transaction.update(group_ref, group_data)
+
+        def mutate(tree):
+            group = self._find_group(tree, group_id)
+            if group is None:
+                tree["groups"].append({"id": group_id, "name": group_data.get("name"), "categories": []})
+            else:
+                group["name"] = group_data.get("name", group["name"])
+
+        self._write_with_tree(budget_id, write, mutate)
+
+    def delete_group(self, budget_id: str, group_id: str) -> None:
+        """Delete a category group document and remove it from the tree.
+
+        The group's categories are kept and moved to `ungrouped`, both in the
+        tree and in their documents.
+        """
+        group_ref = self.db.collection("category_groups").document(group_id)
+
+        def write(transaction):
+            # Read before any write, as transactions require
+            category_refs = [
+                doc.reference for doc in self.db.collection("categories")
+                .where("group_id", "==", group_id)
+                .stream(transaction=transaction)
+            ]
+            transaction.delete(group_ref)
+            transaction.set(*self.tombstone("category_groups", group_id, {"budget_id": budget_id}))
+            for category_ref in category_refs:
+                transaction.update(category_ref, {"group_id": None, "updated_at": datetime.utcnow()})
+
+        def mutate(tree):
+            group = self._find_group(tree, group_id)
+            if group is None:
+                return
+            tree["groups"].remove(group)
+            for category in group["categories"]:
+                category["group_id"] = None
+            tree.setdefault("ungrouped", []).extend(group["categories"])
+
+        self._write_with_tree(budget_id, write, mutate)
+
+    def save_category(
+        self, budget_id: str, category_id: str, category_data: Dict[str, Any], create: bool = False
+    ) -> None:
+        """Write a category document and its tree entry in one transaction.
+
+        If the category's group changed, the entry is moved to the new group,
+        or to `ungrouped` if the group was set to None.
+
+        Args:
+            budget_id: ID of the budget the category belongs to
+            category_id: ID of the category
+            category_data: Fields to write
+            create: Create the document instead of updating the given fields
+        """
+        category_ref = self.db.collection("categories").document(category_id)
+
+        def write(transaction):
+            if create:
+                transaction.set(category_ref, category_data)
+            else:
+                transaction.update(category_ref, category_data)
+
+        def mutate(tree):
+            fields = {
+                field: category_data[field]
+                for field in TREE_CATEGORY_FIELDS if field in category_data
+            }
+            current, existing = self._find_category(tree, category_id)
+            target_group_id = fields.get("group_id", existing and existing.get("group_id"))
+            if target_group_id is None:
+                target = tree.setdefault("ungrouped", [])
+            else:
+                target_group = self._find_group(tree, target_group_id)
+                if target_group is None:
+                    raise NotFoundException(f"Category group {target_group_id} not found")
+                target = target_group["categories"]
+
+            if existing is None:
+                existing = {"id": category_id}
+                target.append(existing)
+            elif current is not target:
+                current.remove(existing)
+                target.append(existing)
+            existing.update(fields)
+
+        self._write_with_tree(budget_id, write, mutate)
+
+    def delete_category(self, budget_id: str, category_id: str) -> None:
+        """Delete a category document and remove it from the tree."""
+        category_ref = self.db.collection("categories").document(category_id)
+
+        def write(transaction):
+            transaction.delete(category_ref)
+            transaction.set(*self.tombstone("categories", category_id, {"budget_id": budget_id}))
+
+        def mutate(tree):
+            self._pop_category(tree, category_id)
+
+        self._write_with_tree(budget_id, write, mutate)
+
+    def _write_with_tree(
+        self,
+        budget_id: str,
+        write: Callable[[Any], None],
+        mutate: Callable[[Dict[str, Any]], None]
+    ) -> None:
+        """Run a source document write and the matching tree update atomically."""
+        tree_ref = self.db.collection(self.collection).document(budget_id)
+        transaction = self.db.transaction()
+
+        @firestore.transactional
+        def update_in_transaction(transaction):
+            snapshot = tree_ref.get(transaction=transaction)
+            tree = snapshot.to_dict() if snapshot.exists else self._build_tree(budget_id, transaction)
+            write(transaction)
+            mutate(tree)
+            self._trim(tree)
+            tree["updated_at"] = datetime.utcnow()
+            transaction.set(tree_ref, tree)
+
+        try:
+            update_in_transaction(transaction)
+        except Exception as e:
+            self.logger.error(f"Error updating category tree for budget {budget_id}: {str(e)}")
+            raise
+
+    def _build_tree(self, budget_id: str, transaction=None) -> Dict[str, Any]:
+        """Build a tree from the category_groups and categories collections."""
+        # Ordered in memory, which needs no (budget_id, created_at) indexes
+        group_docs = self._by_creation(self.db.collection("category_groups")
+            .where("budget_id", "==", budget_id)
+            .stream(transaction=transaction))
+        category_docs = self._by_creation(self.db.collection("categories")
+            .where("budget_id", "==", budget_id)
+            .stream(transaction=transaction))
+
+        groups = []
+        groups_by_id = {}
+        for doc in group_docs:
+            group = {"id": doc.id, "name": doc.get("name"), "categories": []}
+            groups.append(group)
+            groups_by_id[doc.id] = group
+
+        ungrouped = []
+        for doc in category_docs:
+            data = doc.to_dict()
+            category = {"id": doc.id}
+            category.update({field: data.get(field) for field in TREE_CATEGORY_FIELDS})
+            if category["group_id"] is None:
+                categories = ungrouped
+            elif category["group_id"] in groups_by_id:
+                categories = groups_by_id[category["group_id"]]["categories"]
+            else:
+                self.logger.warning(f"Category {doc.id} references unknown group {category['group_id']}")
+                category["group_id"] = None
+                categories = ungrouped
+            categories.append(category)
+
+        return {
+            "budget_id": budget_id,
+            "groups": groups,
+            "ungrouped": ungrouped,
+            "updated_at": datetime.utcnow(),
+        }
+
+    @staticmethod
+    def _by_creation(docs: Iterable[Any]) -> List[Any]:
+        """Snapshots ordered by created_at then ID; ones without created_at go last."""
+        def key(doc):
+            created_at = (doc.to_dict() or {}).get("created_at")
+            return (created_at is None, created_at or 0, doc.id)
+        return sorted(docs, key=key)
+
+    @staticmethod
+    def _trim(tree: Dict[str, Any]) -> None:
+        """Drop category fields that aren't tree fields, e.g. from older trees."""
+        lists = [group["categories"] for group in tree["groups"]] + [tree.setdefault("ungrouped", [])]
+        for categories in lists:
+            for index, category in enumerate(categories):
+                if category.keys() - {"id", *TREE_CATEGORY_FIELDS}:
+                    categories[index] = {
+                        key: value for key, value in category.items()
+                        if key == "id" or key in TREE_CATEGORY_FIELDS
+                    }
+
+    @staticmethod
+    def _find_group(tree: Dict[str, Any], group_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        for group in tree["groups"]:
+            if group["id"] == group_id:
+                return group
+        return None
+
+    @staticmethod
+    def _find_category(
+        tree: Dict[str, Any], category_id: str
+    ) -> Tuple[Optional[List[Dict[str, Any]]], Optional[Dict[str, Any]]]:
+        """The list of categories holding a category, and its entry."""
+        lists = [group["categories"] for group in tree["groups"]] + [tree.setdefault("ungrouped", [])]
+        for categories in lists:
+            for category in categories:
+                if category["id"] == category_id:
+                    return categories, category
+        return None, None
+
+    @classmethod
+    def _pop_category(cls, tree: Dict[str, Any], category_id: str) -> Optional[Dict[str, Any]]:
+        categories, category = cls._find_category(tree, category_id)
+        if category is not None:
+            categories.remove(category)
+        return category
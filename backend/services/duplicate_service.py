@@ -0,0 +1,236 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from firebase_admin import firestore
+from .base_service import BaseService
+from dedupe import DATE_WINDOW_DAYS, DuplicateMatch, FingerprintIndex, build_entries
+from utils import month_bounds
+
+# Fields of a transaction its fingerprints are computed from
+FINGERPRINT_FIELDS = ["date", "amount", "payee", "bank_id"]
+# Shards not rebuilt for this long are rebuilt on their next load, picking up
+# transactions written by code paths that don't maintain the index
+SHARD_MAX_AGE = timedelta(days=1)
+
+
+class _CachedShard:
+    def __init__(self, index: FingerprintIndex, built_at: datetime):
+        self.index = index
+        self.built_at = built_at
+        self.loaded_at = time.monotonic()
+
+
+# Process-wide LRU cache of shards shared by all DuplicateService instances (one per request)
+MAX_CACHED_SHARDS = 4096
+_cache: "OrderedDict[str, _CachedShard]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _month(date: datetime) -> str:
+    return f"{date.year:04d}-{date.month:02d}"
+
+def _utc(value: datetime) -> datetime:
+    """Naive UTC datetime; Firestore returns stored timestamps timezone-aware."""
+    return value.replace(tzinfo=None) if value.tzinfo is None else (value - value.utcoffset()).replace(tzinfo=None)
+
+class DuplicateService(BaseService):
+    """Service detecting transactions that duplicate ones already in an account.
+
+    Each account has a fingerprint index (see dedupe.py), sharded by month:
+    document `{account_id}_{YYYY-MM}` holds the packed index entries of the
+    account's transactions dated in that month and their IDs. A shard is
+    built from the month's transactions with one query the first time it's
+    needed, kept up to date by the writes of TransactionService, dropped
+    when a transaction of its month is updated or deleted, and rebuilt after
+    SHARD_MAX_AGE. Loaded shards are cached in the process for
+    `cache_ttl` seconds, so checking a manually entered transaction
+    usually costs no reads.
+
+    Shards are updated after the transactions they index are written. A
+    transaction written while its shard is rebuilt can be missing from it,
+    which only costs a duplicate flag until the shard is rebuilt.
+    """
+
+    def __init__(self, db: firestore.Client, cache_ttl: float = 60.0):
+        """Initialize the duplicate service.
+
+        Args:
+            db: Firestore client instance
+            cache_ttl: Seconds a loaded shard is used without reading it again
+        """
+        super().__init__()
+        self.db = db
+        self.collection = "duplicate_index"
+        self.cache_ttl = cache_ttl
+
+    def find_duplicates(
+        self,
+        budget_id: str,
+        account_id: str,
+        transactions: Sequence[Dict[str, Any]],
+        ignore_prefix: Optional[str] = None,
+        fresh: bool = False
+    ) -> List[Optional[DuplicateMatch]]:
+        """Match transactions of an account to existing ones they likely duplicate.
+
+        Loads the shards of every month within DATE_WINDOW_DAYS of the
+        transactions, in one round trip, then matches all of them in memory.
+
+        Args:
+            budget_id: ID of the account's budget
+            account_id: ID of the account
+            transactions: Fields of the transactions, at least FINGERPRINT_FIELDS
+            ignore_prefix: Existing transaction IDs starting with this never match
+            fresh: Read the shards even if they are cached, e.g. for imports
+
+        Returns:
+            A DuplicateMatch or None per transaction, in input order
+        """
+        if not transactions:
+            return []
+        try:
+            window = timedelta(days=DATE_WINDOW_DAYS)
+            dates = [_utc(transaction["date"]) for transaction in transactions]
+            index = self.load_index(budget_id, account_id, min(dates) - window, max(dates) + window, fresh)
+            return index.find_duplicates(self._entries(transactions), ignore_prefix)
+        except Exception as e:
+            self.logger.error(f"Error checking duplicates in account {account_id}: {str(e)}")
+            raise
+
+    def load_index(
+        self, budget_id: str, account_id: str, start: datetime, end: datetime, fresh: bool = False
+    ) -> FingerprintIndex:
+        """The index of an account's transactions dated from start to end, by whole months."""
+        months = []
+        month = _month(start)
+        while month <= _month(end):
+            months.append(month)
+            month = _month(month_bounds(month)[1])
+        now = datetime.utcnow()
+        shards: Dict[str, FingerprintIndex] = {}
+        missing = []
+        with _cache_lock:
+            for month in months:
+                shard_id = f"{account_id}_{month}"
+                cached = _cache.get(shard_id)
+                if (cached is not None and not fresh and time.monotonic() - cached.loaded_at < self.cache_ttl
+                        and now - cached.built_at < SHARD_MAX_AGE):
+                    _cache.move_to_end(shard_id)
+                    shards[month] = cached.index
+                else:
+                    missing.append(month)
+
+        if missing:
+            refs = [self.db.collection(self.collection).document(f"{account_id}_{month}") for month in missing]
+            for doc in self.db.get_all(refs):
+                data = doc.to_dict() if doc.exists else None
+                month = doc.id.rsplit("_", 1)[1]
+                if data is not None and now - _utc(data["built_at"]) < SHARD_MAX_AGE:
+                    index = FingerprintIndex.unpack(data["entries"], data["ids"])
+                    self._cache(doc.id, index, _utc(data["built_at"]))
+                else:
+                    index = self._rebuild(budget_id, account_id, month)
+                shards[month] = index
+        return FingerprintIndex.merge(shards[month] for month in months)
+
+    def record(self, budget_id: str, account_id: str, transactions: Iterable[Dict[str, Any]]) -> None:
+        """Add written transactions of an account to the shards of their months.
+
+        Shards that don't exist yet are left to be built from the transactions,
+        which already include these.
+
+        Args:
+            budget_id: ID of the account's budget
+            account_id: ID of the account
+            transactions: Fields of the transactions, with their ID under "id"
+        """
+        by_month: Dict[str, List[Dict[str, Any]]] = {}
+        for transaction in transactions:
+            by_month.setdefault(_month(_utc(transaction["date"])), []).append(transaction)
+        try:
+            for month, added in by_month.items():
+                self._record_in_shard(account_id, month, added)
+        except Exception as e:
+            self.logger.error(f"Error indexing transactions of account {account_id}: {str(e)}")
+            raise
+
+    def invalidate(self, account_id: Optional[str], *dates: Optional[datetime]) -> None:
+        """Drop the shards of an account's months containing the given dates."""
+        if not account_id:
+            return
+        try:
+            for month in {_month(_utc(date)) for date in dates if date}:
+                shard_id = f"{account_id}_{month}"
+                with _cache_lock:
+                    _cache.pop(shard_id, None)
+                self.db.collection(self.collection).document(shard_id).delete()
+        except Exception as e:
+            self.logger.error(f"Error invalidating the duplicate index of account {account_id}: {str(e)}")
+            raise
+
+    def _rebuild(self, budget_id: str, account_id: str, month: str) -> FingerprintIndex:
+        start, end = month_bounds(month)
+        docs = self.db.collection("transactions")\
+            .where("account_id", "==", account_id)\
+            .where("date", ">=", start)\
+            .where("date", "<", end)\
+            .select(FINGERPRINT_FIELDS)\
+            .stream()
+        transactions = []
+        for doc in docs:
+            data = doc.to_dict()
+            data["id"] = doc.id
+            transactions.append(data)
+        index = FingerprintIndex(self._entries(transactions), [transaction["id"] for transaction in transactions])
+        self._save(budget_id, account_id, month, index)
+        return index
+
+    def _record_in_shard(self, account_id: str, month: str, transactions: List[Dict[str, Any]]) -> None:
+        @firestore.transactional
+        def record_in_transaction(transaction, doc_ref):
+            data = doc_ref.get(transaction=transaction).to_dict()
+            if data is None:
+                return None
+            index = FingerprintIndex.unpack(data["entries"], data["ids"])\
+                .add(self._entries(transactions), [t["id"] for t in transactions])
+            transaction.update(doc_ref, {
+                "entries": index.pack(), "ids": index.ids, "updated_at": datetime.utcnow()
+            })
+            return index, _utc(data["built_at"])
+
+        shard_id = f"{account_id}_{month}"
+        updated = record_in_transaction(self.db.transaction(), self.db.collection(self.collection).document(shard_id))
+        if updated is not None:
+            self._cache(shard_id, *updated)
+
+    def _save(self, budget_id: str, account_id: str, month: str, index: FingerprintIndex) -> None:
+        now = datetime.utcnow()
+        shard_id = f"{account_id}_{month}"
+        self.db.collection(self.collection).document(shard_id).set({
+            "budget_id": budget_id,
+            "account_id": account_id,
+            "month": month,
+            "entries": index.pack(),
+            "ids": index.ids,
+            "built_at": now,
+            "updated_at": now,
+        })
+        self._cache(shard_id, index, now)
+
+    @staticmethod
+    def _cache(shard_id: str, index: FingerprintIndex, built_at: datetime) -> None:
+        with _cache_lock:
+            _cache[shard_id] = _CachedShard(index, built_at)
+            _cache.move_to_end(shard_id)
+            while len(_cache) > MAX_CACHED_SHARDS:
+                _cache.popitem(last=False)
+
+    @staticmethod
+    def _entries(transactions: Sequence[Dict[str, Any]]) -> Any:
+        return build_entries(
+            [transaction["date"] for transaction in transactions],
+            [transaction["amount"] for transaction in transactions],
+            [transaction.get("payee") for transaction in transactions],
+            [transaction.get("bank_id") for transaction in transactions],
+        )
@@ -0,0 +1,395 @@
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from firebase_admin import firestore
+from pydantic import BaseModel
+from .base_service import BaseService
+
+JOBS_COLLECTION = "jobs"
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = {SUCCEEDED, FAILED, CANCELLED}
+
+# Job types, each run by the handler of the same name in jobs/handlers.py
+DELETE_BUDGET = "delete_budget"
+REBUILD_AGGREGATES = "rebuild_aggregates"
+GENERATE_RECURRING = "generate_recurring"
+IMPORT_TRANSACTIONS = "import_transactions"
+
+DEFAULT_MAX_ATTEMPTS = 5
+# Retries wait RETRY_BASE_DELAY * 2^(attempt - 1), capped and jittered
+RETRY_BASE_DELAY = timedelta(seconds=5)
+RETRY_MAX_DELAY = timedelta(minutes=10)
+# Finished jobs carry `expires_at` for a Firestore TTL policy
+JOB_RETENTION = timedelta(days=7)
+# Longest error message stored on a job
+MAX_ERROR_LENGTH = 1000
+
+class Job(BaseModel):
+    id: str
+    type: str
+    tenant_id: Optional[str]
+    status: str
+    progress: Dict[str, Any] = {}
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    attempts: int
+    max_attempts: int
+    cancel_requested: bool = False
+    run_at: datetime
+    created_at: datetime
+    updated_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    @classmethod
+    def from_snapshot(cls, doc: Any) -> "Job":
+        return cls.model_validate({**doc.to_dict(), "id": doc.id})
+
+def _utc(value: datetime) -> datetime:
+    """Naive UTC datetime; Firestore returns stored timestamps timezone-aware."""
+    return value.replace(tzinfo=None)
+
+def retry_delay(attempts: int) -> timedelta:
+    """Backoff before the next attempt of a job that failed `attempts` times."""
+    delay = min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+    return delay * random.uniform(0.5, 1.0)
+
+class JobService(BaseService):
+    """Service persisting background jobs and leasing them to workers.
+
+    A job is queued with the parameters of its handler and claimed by a
+    worker, which holds a lease on it: `lease_owner` and `lease_expires_at`.
+    The worker renews the lease while it runs the job, saving its progress.
+    A job whose lease expired, because its worker crashed or lost its
+    connection, can be claimed by any worker and counts as a failed attempt.
+    Claims, renewals and state changes run in transactions, so a job is held
+    by at most one worker at a time. Claiming queries (status, run_at) and
+    (status, lease_expires_at), which need composite indexes.
+    """
+
+    def __init__(self, db: firestore.Client):
+        """Initialize the job service.
+
+        Args:
+            db: Firestore client instance
+        """
+        super().__init__()
+        self.db = db
+        self.collection = JOBS_COLLECTION
+
+    async def submit(
+        self,
+        job_type: str,
+        tenant_id: Optional[str],
+        params: Dict[str, Any],
+        key: Optional[str] = None,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    ) -> Job:
+        """Queue a job.
+
+        Args:
+            job_type: Handler running the job
+            tenant_id: User the job runs for; their jobs share a concurrency limit
+            params: Arguments of the handler, stored on the job
+            key: Makes submission idempotent: while a job of this type and key
+                hasn't finished, submitting it again returns that job
+            max_attempts: Attempts before the job fails
+
+        Returns:
+            Job: The queued job, or the unfinished job with the same key
+        """
+        try:
+            now = datetime.utcnow()
+            data = {
+                "type": job_type,
+                "tenant_id": tenant_id,
+                "params": params,
+                "status": QUEUED,
+                "progress": {},
+                "result": None,
+                "error": None,
+                "attempts": 0,
+                "max_attempts": max_attempts,
+                "cancel_requested": False,
+                "lease_owner": None,
+                "lease_expires_at": None,
+                "run_at": now,
+                "created_at": now,
+                "updated_at": now,
+                "started_at": None,
+                "finished_at": None,
+                "expires_at": None,
+            }
+            collection = self.db.collection(self.collection)
+            if key is None:
+                doc_ref = collection.document()
+                doc_ref.set(data)
+                self.logger.info(f"Queued {job_type} job {doc_ref.id}")
+                return Job.model_validate({**data, "id": doc_ref.id})
+
+            @firestore.transactional
+            def submit_in_transaction(transaction, doc_ref):
+                doc = doc_ref.get(transaction=transaction)
+                if doc.exists and doc.get("status") not in FINISHED_STATUSES:
+                    return Job.from_snapshot(doc)
+                transaction.set(doc_ref, data)
+                return Job.model_validate({**data, "id": doc_ref.id})
+
+            job = submit_in_transaction(self.db.transaction(), collection.document(f"{job_type}:{key}"))
+            self.logger.info(f"Queued {job_type} job {job.id} ({job.status})")
+            return job
+
+        except Exception as e:
+            self.logger.error(f"Error submitting {job_type} job: {str(e)}")
+            raise
+
+    async def get_job(self, job_id: str) -> Optional[Job]:
+        """Retrieve a job by ID, None if it doesn't exist."""
+        try:
+            doc = self.db.collection(self.collection).document(job_id).get()
+            return Job.from_snapshot(doc) if doc.exists else None
+        except Exception as e:
+            self.logger.error(f"Error retrieving job {job_id}: {str(e)}")
+            raise
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a job.
+
+        A queued job is cancelled right away. A running job is flagged, and
+        its worker stops it at its next progress report; what it did so far
+        is kept. Finished jobs are left as they are.
+
+        Returns:
+            Optional[Job]: The job after the change, None if it doesn't exist
+        """
+        try:
+            @firestore.transactional
+            def cancel_in_transaction(transaction, doc_ref):
+                doc = doc_ref.get(transaction=transaction)
+                if not doc.exists:
+                    return None
+                status = doc.get("status")
+                if status in FINISHED_STATUSES:
+                    return Job.from_snapshot(doc)
+                now = datetime.utcnow()
+                if status == QUEUED:
+                    updates = self._finished(CANCELLED, now)
+                else:
+                    updates = {"cancel_requested": True, "updated_at": now}
+                transaction.update(doc_ref, updates)
+                return Job.model_validate({**doc.to_dict(), **updates, "id": doc.id})
+
+            doc_ref = self.db.collection(self.collection).document(job_id)
+            return cancel_in_transaction(self.db.transaction(), doc_ref)
+
+        except Exception as e:
+            self.logger.error(f"Error cancelling job {job_id}: {str(e)}")
+            raise
+
+    def claim(
+        self,
+        worker_id: str,
+        lease: timedelta,
+        limit: int,
+        tenant_limit: int,
+        job_types: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Lease up to `limit` jobs that are due, or whose lease expired.
+
+        Jobs of a tenant already running `tenant_limit` jobs with a live
+        lease are skipped, and picked up once one of those finishes.
+
+        Args:
+            worker_id: Unique ID of the claiming worker
+            lease: How long the worker holds the jobs without renewing
+            limit: Most jobs to claim
+            tenant_limit: Most jobs running at the same time per tenant
+            job_types: Only claim these types, None for all
+
+        Returns:
+            List of the claimed jobs' fields, with their ID under "id"
+        """
+        if limit <= 0:
+            return []
+        now = datetime.utcnow()
+        collection = self.db.collection(self.collection)
+        # Twice the limit, so jobs of busy tenants don't starve the others
+        due = collection.where("status", "==", QUEUED)\
+            .where("run_at", "<=", now)\
+            .order_by("run_at")\
+            .limit(2 * limit)
+        expired = collection.where("status", "==", RUNNING)\
+            .where("lease_expires_at", "<=", now)\
+            .order_by("lease_expires_at")\
+            .limit(2 * limit)
+        candidates = list(due.stream()) + list(expired.stream())
+
+        @firestore.transactional
+        def claim_in_transaction(transaction, doc_ref):
+            doc = doc_ref.get(transaction=transaction)
+            data = doc.to_dict()
+            now = datetime.utcnow()
+            if data is None or not self._claimable(data, now):
+                return None
+            if job_types is not None and data["type"] not in job_types:
+                return None
+            if data["cancel_requested"]:
+                # Its worker died before it could stop the job
+                transaction.update(doc_ref, self._finished(CANCELLED, now))
+                return None
+            running = collection.where("tenant_id", "==", data["tenant_id"])\
+                .where("status", "==", RUNNING)
+            leased = sum(
+                1 for other in transaction.get(running)
+                if other.id != doc.id and _utc(other.get("lease_expires_at")) > now
+            )
+            if leased >= tenant_limit:
+                return None
+
+            updates = {
+                "status": RUNNING,
+                "attempts": data["attempts"] + 1,
+                "lease_owner": worker_id,
+                "lease_expires_at": now + lease,
+                "updated_at": now,
+                "started_at": data.get("started_at") or now,
+            }
+            if updates["attempts"] > data["max_attempts"]:
+                # Its workers kept dying on it
+                updates = self._finished(FAILED, now, error="Lease expired on the last attempt")
+                transaction.update(doc_ref, updates)
+                return None
+            transaction.update(doc_ref, updates)
+            return {**data, **updates, "id": doc.id}
+
+        claimed = []
+        for doc in candidates:
+            if len(claimed) >= limit:
+                break
+            try:
+                job = claim_in_transaction(self.db.transaction(), doc.reference)
+            except Exception as e:
+                # Lost to another worker's claim after retries; try the next one
+                self.logger.warning(f"Could not claim job {doc.id}: {str(e)}")
+                continue
+            if job is not None:
+                claimed.append(job)
+        return claimed
+
+    def renew(
+        self, job_id: str, worker_id: str, lease: timedelta, progress: Optional[Dict[str, Any]]
+    ) -> Optional[Dict[str, Any]]:
+        """Extend a job's lease, saving its progress.
+
+        Args:
+            job_id: ID of the job
+            worker_id: ID of the worker holding the lease
+            lease: New lease duration from now
+            progress: Progress to save, None to keep the saved one
+
+        Returns:
+            The job's fields, None if the worker no longer holds its lease
+        """
+        def update(data: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+            updates = {"lease_expires_at": now + lease, "updated_at": now}
+            if progress is not None:
+                updates["progress"] = progress
+            return updates
+
+        return self._update_leased(job_id, worker_id, update)
+
+    def complete(
+        self, job_id: str, worker_id: str, result: Optional[Dict[str, Any]], progress: Dict[str, Any]
+    ) -> bool:
+        """Mark a leased job succeeded. Returns False if the lease was lost."""
+        return self._update_leased(
+            job_id, worker_id,
+            lambda data, now: self._finished(SUCCEEDED, now, result=result, progress=progress, error=None)
+        ) is not None
+
+    def mark_cancelled(self, job_id: str, worker_id: str, progress: Dict[str, Any]) -> bool:
+        """Mark a leased job cancelled. Returns False if the lease was lost."""
+        return self._update_leased(
+            job_id, worker_id, lambda data, now: self._finished(CANCELLED, now, progress=progress)
+        ) is not None
+
+    def fail(
+        self, job_id: str, worker_id: str, error: str, progress: Dict[str, Any], retry: bool = True
+    ) -> Optional[Dict[str, Any]]:
+        """Record a failed attempt of a leased job.
+
+        The job is queued again after a backoff while it has attempts left
+        and `retry` is set, and fails otherwise. The progress is saved for
+        the next attempt to resume from.
+
+        Returns:
+            The job's fields, None if the lease was lost
+        """
+        error = error[:MAX_ERROR_LENGTH]
+
+        def update(data: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+            if not retry or data["attempts"] >= data["max_attempts"]:
+                return self._finished(FAILED, now, error=error, progress=progress)
+            return {
+                "status": QUEUED,
+                "error": error,
+                "progress": progress,
+                "lease_owner": None,
+                "lease_expires_at": None,
+                "run_at": now + retry_delay(data["attempts"]),
+                "updated_at": now,
+            }
+
+        return self._update_leased(job_id, worker_id, update)
+
+    def release(self, job_id: str, worker_id: str, progress: Dict[str, Any]) -> bool:
+        """Queue a leased job again without counting the attempt, e.g. on shutdown."""
+        def update(data: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+            return {
+                "status": QUEUED,
+                "progress": progress,
+                "attempts": max(0, data["attempts"] - 1),
+                "lease_owner": None,
+                "lease_expires_at": None,
+                "run_at": now,
+                "updated_at": now,
+            }
+
+        return self._update_leased(job_id, worker_id, update) is not None
+
+    def _update_leased(self, job_id: str, worker_id: str, update) -> Optional[Dict[str, Any]]:
+        """Apply update(data, now) to a job if worker_id still holds its lease."""
+        @firestore.transactional
+        def update_in_transaction(transaction, doc_ref):
+            data = doc_ref.get(transaction=transaction).to_dict()
+            if data is None or data["status"] != RUNNING or data["lease_owner"] != worker_id:
+                return None
+            updates = update(data, datetime.utcnow())
+            transaction.update(doc_ref, updates)
+            return {**data, **updates, "id": job_id}
+
+        doc_ref = self.db.collection(self.collection).document(job_id)
+        return update_in_transaction(self.db.transaction(), doc_ref)
+
+    @staticmethod
+    def _claimable(data: Dict[str, Any], now: datetime) -> bool:
+        if data["status"] == QUEUED:
+            return _utc(data["run_at"]) <= now
+        return data["status"] == RUNNING and _utc(data["lease_expires_at"]) <= now
+
+    @staticmethod
+    def _finished(status: str, now: datetime, **fields: Any) -> Dict[str, Any]:
+        return {
+            "status": status,
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "updated_at": now,
+            "finished_at": now,
+            "expires_at": now + JOB_RETENTION,
+            **fields,
+        }
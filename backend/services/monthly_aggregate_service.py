@@ -0,0 +1,186 @@
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+from firebase_admin import firestore
+from .base_service import BaseService
+from .job_service import REBUILD_AGGREGATES, Job, JobService
+from records import RecordTotals, TransactionRecord, TRANSACTION_RECORD_FIELDS, summarize_records_by_month
+from utils import iter_months, month_bounds
+
+# Firestore map keys must be strings, uncategorized totals are stored under this key
+UNCATEGORIZED_KEY = "_uncategorized"
+
+class MonthlyAggregateService(BaseService):
+    """Service persisting per-month, per-category transaction totals of a budget.
+
+    Only closed months are stored, so a stored aggregate stays valid until a
+    transaction dated in that month is written, which invalidates it: the
+    aggregate is replaced by a marker holding `invalidated_at`. Totals of a
+    scan that started before that aren't stored, since the scan may have
+    missed the write.
+    """
+
+    def __init__(self, db: firestore.Client):
+        """Initialize the monthly aggregate service.
+
+        Args:
+            db: Firestore client instance
+        """
+        super().__init__()
+        self.db = db
+        self.collection = "monthly_aggregates"
+
+    def get_aggregates(self, budget_id: str, months: Iterable[str]) -> Dict[str, RecordTotals]:
+        """Fetch the stored aggregates of the given months in one round trip.
+
+        Args:
+            budget_id: ID of the budget
+            months: Months in YYYY-MM format
+
+        Returns:
+            Dict[str, RecordTotals]: Aggregates by month, missing months are omitted
+        """
+        try:
+            refs = [self._ref(budget_id, month) for month in months]
+            aggregates = {}
+            for doc in self.db.get_all(refs):
+                data = doc.to_dict() if doc.exists else None
+                # Invalidated months only hold a marker
+                if data is not None and "income" in data:
+                    aggregates[data["month"]] = RecordTotals(
+                        data["income"],
+                        data["expenses"],
+                        data["income"] - data["expenses"],
+                        {
+                            (None if key == UNCATEGORIZED_KEY else key): amount
+                            for key, amount in data["by_category"].items()
+                        }
+                    )
+            return aggregates
+        except Exception as e:
+            self.logger.error(f"Error getting monthly aggregates for budget {budget_id}: {str(e)}")
+            raise
+
+    def save_aggregates(
+        self, budget_id: str, aggregates: Dict[str, RecordTotals], scanned_at: datetime
+    ) -> List[str]:
+        """Store the aggregates of months that have already ended.
+
+        Args:
+            budget_id: ID of the budget
+            aggregates: Aggregates by month in YYYY-MM format
+            scanned_at: When the scan computing the aggregates started; months
+                invalidated since are skipped
+
+        Returns:
+            List[str]: Months that were stored
+        """
+        @firestore.transactional
+        def save_in_transaction(transaction, refs):
+            saved = []
+            for doc in transaction.get_all(refs):
+                data = doc.to_dict() if doc.exists else {}
+                invalidated_at = data.get("invalidated_at")
+                if invalidated_at is not None and invalidated_at.replace(tzinfo=None) >= scanned_at:
+                    continue
+                month = doc.id.rsplit("_", 1)[1]
+                totals = aggregates[month]
+                transaction.set(doc.reference, {
+                    "budget_id": budget_id,
+                    "month": month,
+                    "income": totals.income,
+                    "expenses": totals.expenses,
+                    "by_category": {
+                        (UNCATEGORIZED_KEY if key is None else key): amount
+                        for key, amount in totals.by_category.items()
+                    },
+                    # Kept so a scan older than the invalidation can't overwrite this one
+                    "invalidated_at": invalidated_at,
+                    "computed_at": now,
+                    "updated_at": now,
+                })
+                saved.append(month)
+            return saved
+
+        try:
+            now = datetime.utcnow()
+            refs = [self._ref(budget_id, month) for month in aggregates if month_bounds(month)[1] <= now]
+            if not refs:
+                return []
+            return save_in_transaction(self.db.transaction(), refs)
+        except Exception as e:
+            self.logger.error(f"Error saving monthly aggregates for budget {budget_id}: {str(e)}")
+            raise
+
+    def invalidate(self, budget_id: str, *dates: datetime) -> None:
+        """Drop the stored aggregates of the months containing the given dates."""
+        try:
+            now = datetime.utcnow()
+            for month in {f"{date.year:04d}-{date.month:02d}" for date in dates if date}:
+                self._ref(budget_id, month).set({
+                    "budget_id": budget_id, "month": month, "invalidated_at": now, "updated_at": now
+                })
+        except Exception as e:
+            self.logger.error(f"Error invalidating monthly aggregates for budget {budget_id}: {str(e)}")
+            raise
+
+    async def submit_rebuild(self, budget_id: str, tenant_id: str, start_month: str, end_month: str) -> Job:
+        """Queue a rebuild of the aggregates of a range of months.
+
+        Returns:
+            Job: The rebuild job, or the one already queued for this budget
+        """
+        months = iter_months(start_month, end_month)
+        if not months:
+            raise ValueError("Start month must not be after end month")
+        return await JobService(self.db).submit(
+            REBUILD_AGGREGATES, tenant_id, {"budget_id": budget_id, "months": months}, key=budget_id
+        )
+
+    def rebuild(
+        self,
+        budget_id: str,
+        months: List[str],
+        progress_callback: Optional[Callable[[str], None]] = None
+    ) -> List[str]:
+        """Recompute the aggregates of the given months from their transactions.
+
+        Aggregates of ended months are stored again and those of other months
+        dropped, one month at a time, so a range of any length runs in
+        bounded memory.
+
+        Args:
+            budget_id: ID of the budget
+            months: Months in YYYY-MM format
+            progress_callback: Receives each month once it's rebuilt
+
+        Returns:
+            List[str]: Months that were stored
+        """
+        try:
+            saved = []
+            for month in months:
+                start, end = month_bounds(month)
+                scanned_at = datetime.utcnow()
+                snapshots = self.db.collection("transactions")\
+                    .where("budget_id", "==", budget_id)\
+                    .where("date", ">=", start)\
+                    .where("date", "<", end)\
+                    .select(TRANSACTION_RECORD_FIELDS)\
+                    .stream()
+                totals = summarize_records_by_month([TransactionRecord.from_snapshot(doc) for doc in snapshots])
+                stored = self.save_aggregates(
+                    budget_id, {month: totals.get(month, RecordTotals(0, 0, 0, {}))}, scanned_at
+                )
+                if end > scanned_at:
+                    # Months that haven't ended aren't stored, drop a stale one
+                    self._ref(budget_id, month).delete()
+                saved += stored
+                if progress_callback:
+                    progress_callback(month)
+            return saved
+        except Exception as e:
+            self.logger.error(f"Error rebuilding monthly aggregates for budget {budget_id}: {str(e)}")
+            raise
+
+    def _ref(self, budget_id: str, month: str):
+        return self.db.collection(self.collection).document(f"{budget_id}_{month}")
@@ -112,9 +112,10 @@ class PayeeService(BaseService):
         """Delete a payee."""
         try:
             doc_ref = self.db.collection(self.collection).document(payee_id)
-            if not doc_ref.get().exists:
+            doc = doc_ref.get()
+            if not doc.exists:
                 raise NotFoundException(f"Payee {payee_id} not found")
-            doc_ref.delete()
+            self.delete_with_tombstone(doc_ref, doc.to_dict())
         except Exception as e:
             self.logger.error(f"Error deleting payee {payee_id}: {str(e)}")
             raise
@@ -1,14 +1,19 @@
+import calendar
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, Dict, Optional
 from google.cloud import firestore
 from models import RecurringTransaction, FrequencyType, Transaction
+from .job_service import GENERATE_RECURRING, Job, JobService
 from .transaction_service import TransactionService
 from firebase_admin import firestore
 
+# Writes per commit when generating transactions, below Firestore's 500
+GENERATION_BATCH_SIZE = 400
+
 
 class RecurringTransactionService(TransactionService):
     def __init__(self, db: firestore.Client):
-        super().__init__()
+        super().__init__(db)
         self.db = db
         self.collection = 'recurring_transactions'
 
@@ -93,16 +98,113 @@ class RecurringTransactionService(TransactionService):
             self.logger.error(f"Error generating transaction for recurring {recurring_id}: {str(e)}")
             raise
 
+    async def submit_generation(self, budget_id: str, tenant_id: str) -> Job:
+        """Queue the generation of the budget's due recurring transactions.
+
+        Returns:
+            Job: The generation job, or the one already queued for this budget
+        """
+        return await JobService(self.db).submit(
+            GENERATE_RECURRING, tenant_id, {"budget_id": budget_id}, key=budget_id
+        )
+
+    def generate_due_transactions(
+        self,
+        budget_id: str,
+        until: Optional[datetime] = None,
+        progress_callback: Optional[Callable[[int], None]] = None
+    ) -> Dict[str, int]:
+        """Create the transactions of every occurrence due by `until`.
+
+        Each occurrence gets the ID `{recurring_id}_{YYYYMMDD}` and is committed
+        together with the recurring transaction's new `next_due_date`, so an
+        interrupted run resumes where it stopped without creating duplicates.
+
+        Args:
+            budget_id: ID of the budget
+            until: Generate occurrences dated up to this time, defaults to now
+            progress_callback: Receives the number of transactions generated so far after each commit
+
+        Returns:
+            Dict: Recurring transactions that were due and transactions generated
+        """
+        try:
+            until = until or datetime.utcnow()
+            docs = self.db.collection(self.collection)\
+                .where("budget_id", "==", budget_id)\
+                .where("next_due_date", "<=", until)\
+                .stream()
+            counts = {"recurring": 0, "generated": 0}
+            for doc in docs:
+                data = doc.to_dict()
+                if data.get("active", True) is False:
+                    continue
+                counts["recurring"] += 1
+                counts["generated"] += self._generate_occurrences(doc.reference, data, until, counts, progress_callback)
+            self.logger.info(f"Generated recurring transactions of budget {budget_id}: {counts}")
+            return counts
+        except Exception as e:
+            self.logger.error(f"Error generating recurring transactions of budget {budget_id}: {str(e)}")
+            raise
+
+    def _generate_occurrences(
+        self,
+        recurring_ref,
+        recurring: Dict,
+        until: datetime,
+        counts: Dict[str, int],
+        progress_callback: Optional[Callable[[int], None]]
+    ) -> int:
+        template = {
+            key: value for key, value in recurring.items()
+            if key not in ("id", "next_due_date", "frequency", "frequency_interval", "active")
+        }
+        interval = recurring.get("frequency_interval", 1)
+        due = recurring["next_due_date"].replace(tzinfo=None)
+        generated = 0
+        batch = self.db.batch()
+        occurrences = []
+        while due <= until:
+            now = datetime.utcnow()
+            transaction_ref = self.db.collection("transactions").document(f"{recurring_ref.id}_{due:%Y%m%d}")
+            occurrence = {
+                **template,
+                "id": transaction_ref.id,
+                "date": due,
+                "recurring_id": recurring_ref.id,
+                "created_at": now,
+                "updated_at": now,
+            }
+            batch.set(transaction_ref, occurrence)
+            occurrences.append(occurrence)
+            due = self.calculate_next_date(due, recurring["frequency"], interval)
+            if len(batch) + 1 >= GENERATION_BATCH_SIZE or due > until:
+                batch.update(recurring_ref, {"next_due_date": due, "updated_at": now})
+                batch.commit()
+                self.aggregate_service.invalidate(recurring["budget_id"], *[o["date"] for o in occurrences])
+                if recurring.get("account_id"):
+                    self.duplicate_service.record(recurring["budget_id"], recurring["account_id"], occurrences)
+                generated += len(occurrences)
+                batch, occurrences = self.db.batch(), []
+                if progress_callback:
+                    progress_callback(counts["generated"] + generated)
+        return generated
+
     def calculate_next_date(self, base_date: datetime, frequency_type: str, interval: int) -> datetime:
-        """Calculate the next occurrence date."""
+        """Calculate the next occurrence date.
+
+        Monthly and yearly occurrences keep the day of the month, clamped to
+        the length of shorter months.
+        """
         if frequency_type == FrequencyType.DAILY.value:
             return base_date + timedelta(days=interval)
         elif frequency_type == FrequencyType.WEEKLY.value:
             return base_date + timedelta(weeks=interval)
         elif frequency_type == FrequencyType.MONTHLY.value:
-            return base_date.replace(month=((base_date.month - 1 + interval) % 12) + 1)
+            year, month = divmod(base_date.month - 1 + interval, 12)
+            return self._with_month(base_date, base_date.year + year, month + 1)
         elif frequency_type == FrequencyType.YEARLY.value:
-            return base_date.replace(year=base_date.year + interval)
+            return self._with_month(base_date, base_date.year + interval, base_date.month)
         else:
             raise ValueError(f"Invalid frequency type: {frequency_type}")
 
@@ -126,3 +228,7 @@ class RecurringTransactionService(TransactionService):
             self.logger.error(f"Error getting due transactions: {str(e)}")
             raise
 
+    @staticmethod
+    def _with_month(base_date: datetime, year: int, month: int) -> datetime:
+        day = min(base_date.day, calendar.monthrange(year, month)[1])
+        return base_date.replace(year=year, month=month, day=day)
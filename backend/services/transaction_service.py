@@ -1,14 +1,38 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, Optional
 from google.cloud import firestore
 import logging
 
-from pydantic import ValidationError
+from pydantic import BaseModel, Field, ValidationError
 from firebase_admin import firestore
 from .base_service import BaseService
+from .job_service import IMPORT_TRANSACTIONS, Job, JobService
 from models import Transaction
+from sparse_fields import partial_model, stored_fields
 from .budget_service import BudgetService
 from .category_service import CategoryService
+from .duplicate_service import DuplicateService
+from .monthly_aggregate_service import MonthlyAggregateService
+
+# Rows an import may carry; they are stored on the job, below Firestore's 1 MiB document limit
+MAX_IMPORT_ROWS = 2000
+# Transactions written per commit by an import
+IMPORT_BATCH_SIZE = 400
+
+class ImportedTransaction(BaseModel):
+    date: datetime
+    amount: int  # Stored in cents
+    payee: Optional[str] = None
+    category_id: Optional[str] = None
+    notes: Optional[str] = None
+    cleared: bool = False
+    bank_id: Optional[str] = None  # The bank's ID of the transaction, if the statement has one
+
+class TransactionImport(BaseModel):
+    account_id: str
+    rows: List[ImportedTransaction] = Field(..., min_length=1, max_length=MAX_IMPORT_ROWS)
+    # Leave out rows already in the account; possible duplicates are imported and flagged either way
+    skip_duplicates: bool = True
 
 class TransactionService(BaseService):
     """Service class for handling transaction operations."""
@@ -27,6 +51,8 @@ class TransactionService(BaseService):
         self.collection = "transactions"
         self.budget_service = budget_service
         self.category_service = category_service
+        self.aggregate_service = MonthlyAggregateService(db)
+        self.duplicate_service = DuplicateService(db)
         
     async def create_transaction(self, transaction: Transaction) -> Transaction:
         """Create a new transaction.
@@ -57,10 +83,18 @@ class TransactionService(BaseService):
             transaction.created_at = datetime.utcnow()
             transaction.updated_at = datetime.utcnow()
             
+            # Flag it if the account already has a transaction it likely duplicates
+            match = self.duplicate_service.find_duplicates(
+                transaction.budget_id, transaction.account_id, [transaction.model_dump()]
+            )[0]
+            transaction.duplicate_of = match.transaction_id if match else None
+
             # Create transaction document
             doc_ref = self.db.collection(self.collection).document()
             transaction.id = doc_ref.id
-            await doc_ref.set(transaction.model_dump())
+            doc_ref.set(transaction.model_dump())
+            self.aggregate_service.invalidate(transaction.budget_id, transaction.date)
+            self.duplicate_service.record(transaction.budget_id, transaction.account_id, [transaction.model_dump()])
             
             return transaction
             
@@ -79,7 +113,7 @@ class TransactionService(BaseService):
         """
         try:
             doc_ref = self.db.collection(self.collection).document(transaction_id)
-            doc = await doc_ref.get()
+            doc = doc_ref.get()
             
             if doc.exists:
                 data = doc.to_dict()
@@ -105,7 +139,7 @@ class TransactionService(BaseService):
         try:
             # Validate if transaction exists
             doc_ref = self.db.collection(self.collection).document(transaction_id)
-            doc = await doc_ref.get()
+            doc = doc_ref.get()
             
             if not doc.exists:
                 return None
@@ -115,7 +149,12 @@ class TransactionService(BaseService):
             transaction.id = transaction_id
 
             # Update document
-            await doc_ref.update(transaction.model_dump(exclude={'id'}))
+            doc_ref.update(transaction.model_dump(exclude={'id'}))
+            self.aggregate_service.invalidate(
+                doc.get('budget_id'), doc.get('date'), transaction.date
+            )
+            self.duplicate_service.invalidate(doc.get('account_id'), doc.get('date'))
+            self.duplicate_service.invalidate(transaction.account_id, transaction.date)
             return transaction
             
         except Exception as e:
@@ -133,12 +172,14 @@ class TransactionService(BaseService):
         """
         try:
             doc_ref = self.db.collection(self.collection).document(transaction_id)
-            doc = await doc_ref.get()
+            doc = doc_ref.get()
             
             if not doc.exists:
                 return False
                 
-            await doc_ref.delete()
+            self.delete_with_tombstone(doc_ref, doc.to_dict())
+            self.aggregate_service.invalidate(doc.get('budget_id'), doc.get('date'))
+            self.duplicate_service.invalidate(doc.get('account_id'), doc.get('date'))
             return True
             
         except Exception as e:
@@ -165,7 +206,7 @@ class TransactionService(BaseService):
                     .where('date', '>=', start_date)
                     .where('date', '<=', end_date))
             
-            docs = await query.get()
+            docs = query.get()
             
             for doc in docs:
                 data = doc.to_dict()
@@ -178,6 +219,64 @@ class TransactionService(BaseService):
             logging.error(f"Error retrieving transactions for budget {budget_id}: {str(e)}")
             raise
             
+    async def get_transactions_for_period(self, budget_id: str,
+                                    start_date: Optional[datetime] = None,
+                                    end_date: Optional[datetime] = None,
+                                    fields: Optional[List[str]] = None) -> List[Transaction]:
+        """Retrieve transactions of a budget in a half-open date range.
+        
+        Args:
+            budget_id: ID of the budget
+            start_date: Optional inclusive start of the range
+            end_date: Optional exclusive end of the range
+            fields: Optional sparse fieldset from sparse_fields.parse_fields; only
+                these fields are fetched and partial models are returned
+            
+        Returns:
+            List[Transaction]: Transactions with start_date <= date < end_date
+        """
+        model = Transaction if fields is None else partial_model(Transaction, tuple(fields))
+        snapshots = await self.get_transaction_snapshots_for_period(
+            budget_id, start_date, end_date,
+            fields=None if fields is None else stored_fields(fields)
+        )
+        transactions = []
+        for doc in snapshots:
+            data = doc.to_dict()
+            data['id'] = doc.id
+            transactions.append(model.model_validate(data))
+        return transactions
+            
+    async def get_transaction_snapshots_for_period(self, budget_id: str,
+                                    start_date: Optional[datetime] = None,
+                                    end_date: Optional[datetime] = None,
+                                    fields: Optional[List[str]] = None) -> list:
+        """Retrieve raw transaction snapshots of a budget in a half-open date range.
+        
+        Args:
+            budget_id: ID of the budget
+            start_date: Optional inclusive start of the range
+            end_date: Optional exclusive end of the range
+            fields: Optional field projection, only these fields are transferred
+            
+        Returns:
+            list: Firestore DocumentSnapshots with start_date <= date < end_date
+        """
+        try:
+            query = self.db.collection(self.collection).where('budget_id', '==', budget_id)
+            if start_date:
+                query = query.where('date', '>=', start_date)
+            if end_date:
+                query = query.where('date', '<', end_date)
+            if fields is not None:
+                query = query.select(fields)
+            
+            return list(query.stream())
+            
+        except Exception as e:
+            logging.error(f"Error retrieving transactions for budget {budget_id}: {str(e)}")
+            raise
+            
     async def get_transactions_by_budget(self, budget_id: str) -> List[Transaction]:
         """Retrieve all transactions for a specific budget.
         
@@ -191,7 +290,7 @@ class TransactionService(BaseService):
             transactions = []
             query = self.db.collection(self.collection).where('budget_id', '==', budget_id)
             
-            docs = await query.get()
+            docs = query.get()
             
             for doc in docs:
                 data = doc.to_dict()
@@ -204,3 +303,92 @@ class TransactionService(BaseService):
             logging.error(f"Error retrieving transactions for budget {budget_id}: {str(e)}")
             raise
 
+    async def submit_import(self, budget_id: str, tenant_id: str, transaction_import: TransactionImport) -> Job:
+        """Queue an import of transactions into an account of the budget.
+
+        Returns:
+            Job: The import job
+        """
+        return await JobService(self.db).submit(IMPORT_TRANSACTIONS, tenant_id, {
+            "budget_id": budget_id,
+            "account_id": transaction_import.account_id,
+            "rows": [row.model_dump() for row in transaction_import.rows],
+            "skip_duplicates": transaction_import.skip_duplicates,
+        })
+
+    def import_transactions(
+        self,
+        budget_id: str,
+        account_id: str,
+        rows: List[Dict[str, Any]],
+        id_prefix: str,
+        start: int = 0,
+        progress_callback: Optional[Callable[[int, Dict[str, int]], None]] = None,
+        skip_duplicates: bool = True,
+        counts: Optional[Dict[str, int]] = None
+    ) -> Dict[str, int]:
+        """Write imported rows as transactions, IMPORT_BATCH_SIZE per commit.
+
+        Row i gets the ID `{id_prefix}_{i}`, so importing the same rows with
+        the same prefix again overwrites them instead of duplicating them.
+        Rows are checked against the account's transactions from before the
+        import: exact duplicates are skipped if `skip_duplicates` is set and
+        possible duplicates are written with `duplicate_of` set.
+
+        Args:
+            budget_id: ID of the budget
+            account_id: ID of the account the rows belong to
+            rows: ImportedTransaction fields of each row
+            id_prefix: Prefix of the transaction IDs, unique per import
+            start: Index of the first row to write, to resume an import
+            progress_callback: Receives the number of rows done and the counts after each commit
+            skip_duplicates: Leave out rows exactly duplicating an existing transaction
+            counts: Counts of the rows before `start`, to resume an import
+
+        Returns:
+            Dict: Rows imported, skipped as duplicates and imported as possible duplicates
+        """
+        try:
+            counts = {"imported": 0, "skipped": 0, "possible_duplicates": 0, **(counts or {})}
+            matches = self.duplicate_service.find_duplicates(
+                budget_id, account_id, rows[start:], ignore_prefix=f"{id_prefix}_", fresh=True
+            )
+            for offset in range(start, len(rows), IMPORT_BATCH_SIZE):
+                batch = self.db.batch()
+                written = []
+                now = datetime.utcnow()
+                for index, row in enumerate(rows[offset:offset + IMPORT_BATCH_SIZE], offset):
+                    match = matches[index - start]
+                    if match is not None and match.exact and skip_duplicates:
+                        counts["skipped"] += 1
+                        continue
+                    doc_ref = self.db.collection(self.collection).document(f"{id_prefix}_{index}")
+                    transaction = Transaction(
+                        id=doc_ref.id,
+                        budget_id=budget_id,
+                        account_id=account_id,
+                        amount=row["amount"],
+                        date=row["date"],
+                        payee=row.get("payee"),
+                        category_id=row.get("category_id"),
+                        cleared=row.get("cleared", False),
+                        notes=row.get("notes"),
+                        bank_id=row.get("bank_id"),
+                        duplicate_of=match.transaction_id if match else None,
+                        created_at=now,
+                        updated_at=now,
+                    )
+                    batch.set(doc_ref, transaction.model_dump())
+                    written.append(transaction.model_dump())
+                    counts["possible_duplicates" if match else "imported"] += 1
+                if written:
+                    batch.commit()
+                    self.aggregate_service.invalidate(budget_id, *[t["date"] for t in written])
+                    self.duplicate_service.record(budget_id, account_id, written)
+                if progress_callback:
+                    progress_callback(min(offset + IMPORT_BATCH_SIZE, len(rows)), counts)
+            self.logger.info(f"Imported transactions into account {account_id}: {counts}")
+            return counts
+        except Exception as e:
+            logging.error(f"Error importing transactions into account {account_id}: {str(e)}")
+            raise
@@ -6,11 +6,16 @@ setup(
     packages=find_packages(),
     install_requires=[
         "fastapi",
-        "uvicorn",
+        "uvicorn[standard]",
+        "gunicorn",
         "firebase-admin",
         "python-jose[cryptography]",
         "python-multipart",
         "pydantic",
+        "orjson",
+        "msgpack",
+        "brotli",
+        "numpy",
     ],
     extras_require={
         "test": [
@@ -19,6 +24,10 @@ setup(
             "httpx",
             "pytest-asyncio",
         ],
+        # zstd compressed backup shards
+        "backup": [
+            "zstandard",
+        ],
     },
     python_requires=">=3.9",
 )
@@ -0,0 +1,54 @@
+"""Sparse fieldsets for list and report routes.
+
+`?fields=id,name` limits the documents a route returns to the listed
+fields. The fields are projected in the Firestore query with `select()`, so
+the others are never transferred, and the documents are validated into a
+partial model holding only those fields. The document ID is always
+included.
+"""
+from functools import lru_cache
+from typing import List, Optional, Tuple, Type
+from pydantic import BaseModel, create_model
+
+FIELDS_DESCRIPTION = "Comma-separated fields to return, e.g. id,name. All fields if omitted."
+
+
+class PartialModel(BaseModel):
+    """Base of the models built by partial_model(), holding a subset of a model's fields."""
+
+
+def parse_fields(fields: Optional[str], model: Type[BaseModel]) -> Optional[List[str]]:
+    """Parse a `fields` query parameter against the fields of model.
+
+    Args:
+        fields: Comma-separated field names, or None for all fields
+        model: Model the fields belong to
+
+    Returns:
+        Optional[List[str]]: "id" followed by the requested fields, or None
+
+    Raises:
+        ValueError: If a field isn't a field of model
+    """
+    if fields is None:
+        return None
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in model.model_fields]
+    if unknown:
+        raise ValueError(f"Unknown {model.__name__} fields: {', '.join(unknown)}")
+    return ["id"] + [field for field in dict.fromkeys(requested) if field != "id"]
+
+
+def stored_fields(fields: List[str]) -> List[str]:
+    """The fields to select() in Firestore; the ID isn't a stored field."""
+    return [field for field in fields if field != "id"]
+
+
+@lru_cache(maxsize=128)
+def partial_model(model: Type[BaseModel], fields: Tuple[str, ...]) -> Type[PartialModel]:
+    """A model with only the given fields of model, keeping their types and defaults."""
+    return create_model(
+        f"Partial{model.__name__}",
+        __base__=PartialModel,
+        **{field: (model.model_fields[field].annotation, model.model_fields[field]) for field in fields}
+    )
@@ -1,46 +1,36 @@
 import asyncio
 import functools
-from typing import Callable, Any
+from datetime import datetime
+from typing import Callable, Any, List, Optional, Tuple
 from fastapi import  Request, status, HTTPException
 from pydantic import validator
 import logging
 from firebase_admin import auth
-
-# Store valid currencies in a separate JSON file
-import json
-
-CURRENCY_FILE = "data/valid_currencies.json"
-
-# Load valid currencies from JSON file
-with open(CURRENCY_FILE, "r") as file:
-    VALID_CURRENCIES = set(json.load(file))
-
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,  # Change to DEBUG for more details
-    format="%(asctime)s - %(levelname)s - %(message)s",
-)
+from config import get_valid_currencies
+from request_cache import cached
 
 logger = logging.getLogger(__name__)  # Use a named logger
 
 
 def debug_request(request: Request):
-    logger.info(f"Request method: {request.method}")
-    logger.info(f"Request URL: {request.url}")
-    logger.info(f"Request Headers: {request.headers}")
-    logger.info(f"Client IP: {request.client.host}")
+    # Headers are left out, they carry the bearer token
+    logger.debug(
+        "Request %s %s",
+        request.method,
+        request.url.path,
+        extra={"client_ip": request.client.host if request.client else None}
+    )
 
     return {"message": "Check server logs for request details"}
 
 def get_token(request: Request):
     token = request.headers.get("Authorization")
     token = token.split("Bearer ")[1] if token else None
-    logger.info(f"Received token: {token}")
     return token
 
 @validator("currency")
 def validate_currency(value):
-    if value not in VALID_CURRENCIES:
+    if value not in get_valid_currencies():
         raise ValueError(f"Invalid currency: {value}. Must be a valid ISO 4217 currency code.")
     return value
 
@@ -51,21 +41,68 @@ def maybe_throw_not_found(ref: Any, error_message: str):
             detail=error_message
         )
     
+def verify_token(token: str) -> dict:
+    """Verify a Firebase ID token, once per request cache scope."""
+    return cached(("id_token", token), lambda: auth.verify_id_token(token))
+
 def assert_user_matches(request: Request, user_id: str):
     token = get_token(request)
-    decoded_token = auth.verify_id_token(token)
+    decoded_token = verify_token(token)
     if decoded_token['uid'] != user_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to access this user's data"
         )
 
+def assert_budget_owner(request: Request, budget: Any, token: Optional[str] = None):
+    if budget is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Budget not found"
+        )
+    token = token or get_token(request)
+    decoded_token = verify_token(token)
+    if decoded_token['uid'] != budget.user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access this budget"
+        )
+
+def parse_month(month: str) -> datetime:
+    try:
+        return datetime.strptime(month, "%Y-%m")
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Invalid month format. Must be YYYY-MM"
+        )
+
+def month_bounds(month: str) -> Tuple[datetime, datetime]:
+    """Return the half-open [start, end) datetimes of a YYYY-MM month."""
+    start = parse_month(month)
+    if start.month == 12:
+        return start, start.replace(year=start.year + 1, month=1)
+    return start, start.replace(month=start.month + 1)
+
+def iter_months(start_month: str, end_month: str) -> List[str]:
+    """List the YYYY-MM months from start_month to end_month inclusive."""
+    current = parse_month(start_month)
+    end = parse_month(end_month)
+    months = []
+    while current <= end:
+        months.append(current.strftime("%Y-%m"))
+        current = month_bounds(months[-1])[1]
+    return months
+
 def handle_exceptions(error_message: str):
     def decorator(func: Callable) -> Callable:
         @functools.wraps(func)
         async def async_wrapper(*args, **kwargs) -> Any:
             try:
                 return await func(*args, **kwargs)
+            except HTTPException:
+                # Already carries the intended status, e.g. 403/404 from assert_budget_owner
+                raise
             except Exception as e:
                 logger.error(f"{error_message}: {str(e)}")
                 raise HTTPException(
@@ -77,6 +114,8 @@ def handle_exceptions(error_message: str):
         def sync_wrapper(*args, **kwargs) -> Any:
             try:
                 return func(*args, **kwargs)
+            except HTTPException:
+                raise
             except Exception as e:
                 logger.error(f"{error_message}: {str(e)}")
                 raise HTTPException(
@@ -0,0 +1,17 @@
+from uvicorn.workers import UvicornWorker as _UvicornWorker
+
+
+class UvicornWorker(_UvicornWorker):
+    """Gunicorn worker running the app on uvicorn with uvloop and httptools.
+
+    The stock worker uses loop="auto" and http="auto", which silently fall
+    back to asyncio and h11 when the C extensions are missing. Pinning them
+    makes a broken install fail at boot instead of serving slower. The
+    lifespan is required, so a worker that can't initialize Firebase exits
+    instead of serving errors.
+    """
+    CONFIG_KWARGS = {
+        "loop": "uvloop",
+        "http": "httptools",
+        "lifespan": "on",
+    }